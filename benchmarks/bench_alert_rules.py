@@ -0,0 +1,113 @@
+"""Micro-benchmark alert rule evaluation as rules x cities grows.
+
+Times AlertEngine.evaluate's Python loop and its NumPy matrix pass on
+synthetic readings for a grid of rule and city counts, with a mix of
+threshold, rate-of-change and sustained rules and some per-city overrides.
+Both paths are first checked to produce the same alerts and state.
+
+    python benchmarks/bench_alert_rules.py --rules 3,30,300 --cities 10,100,1000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'lambda-functions'))
+
+import alert_rules  # noqa: E402
+
+KINDS = ['threshold', 'threshold', 'rate_of_change', 'sustained']
+FIELDS = {'temperature_f': (10, 110), 'wind_speed': (0, 70), 'humidity': (10, 100)}
+
+
+def synthetic_rules(count, cities, seed=0):
+    rng = random.Random(seed)
+    rules = []
+    for index in range(count):
+        kind = KINDS[index % len(KINDS)]
+        field = rng.choice(list(FIELDS))
+        low, high = FIELDS[field]
+        op = rng.choice(['>', '<'])
+        # Near the ends of the range, so (as in real weather) few cells alert
+        edge = rng.uniform(0.9, 1.0) if op == '>' else rng.uniform(0.0, 0.1)
+        if kind == 'rate_of_change':
+            value = (edge - 0.5) * (high - low) / 5
+        else:
+            value = low + edge * (high - low)
+        rule = {'name': f'rule_{index}', 'kind': kind, 'field': field, 'op': op, 'value': value}
+        if kind == 'sustained':
+            rule['duration'] = 3600
+        rule['overrides'] = {rng.choice(cities): value * rng.uniform(0.9, 1.1) for _ in range(3)}
+        rules.append(rule)
+    return rules
+
+
+def synthetic_batches(cities, count, seed=1):
+    """Consecutive runs 30 minutes apart, each field a bounded random walk per city"""
+    rng = random.Random(seed)
+    values = {city: {field: rng.uniform(low + 0.1 * (high - low), high - 0.1 * (high - low))
+                     for field, (low, high) in FIELDS.items()} for city in cities}
+    start = datetime(2026, 1, 1)
+    batches = []
+    for step in range(count):
+        readings = []
+        for city in cities:
+            reading = {'city': city, 'timestamp': start + timedelta(minutes=30 * step)}
+            for field, (low, high) in FIELDS.items():
+                values[city][field] = min(high, max(low, values[city][field] + rng.gauss(0, 0.02 * (high - low))))
+                reading[field] = values[city][field]
+            readings.append(reading)
+        batches.append(readings)
+    return batches
+
+
+def run(engine, batches, use_numpy):
+    alert_rules.NUMPY_MIN_CELLS = 0 if use_numpy else float('inf')
+    state, alerts = {}, []
+    for readings in batches:
+        alerts, new_state = engine.evaluate(readings, state)
+        state.update(new_state)
+    return alerts, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', default='3,30,300')
+    parser.add_argument('--cities', default='10,100,1000')
+    parser.add_argument('--batches', type=int, default=4, help='consecutive collector runs per timing')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if alert_rules.load_numpy() is None:
+        print('numpy not installed; only the Python loop is available')
+
+    default_min_cells = alert_rules.NUMPY_MIN_CELLS
+    print(f'{"rules":>6} {"cities":>7} {"python":>12} {"numpy":>12}   (per batch, ns per rule x city cell)')
+    for rule_count in map(int, args.rules.split(',')):
+        for city_count in map(int, args.cities.split(',')):
+            cities = [f'City {i}' for i in range(city_count)]
+            engine = alert_rules.AlertEngine(synthetic_rules(rule_count, cities))
+            batches = synthetic_batches(cities, args.batches)
+
+            paths = [False] + ([True] if alert_rules.load_numpy() is not None else [])
+            results = [run(engine, batches, use_numpy) for use_numpy in paths]
+            assert all(result == results[0] for result in results), 'python and numpy disagree'
+
+            line = f'{rule_count:>6} {city_count:>7}'
+            for use_numpy in paths:
+                best = float('inf')
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    run(engine, batches, use_numpy)
+                    best = min(best, time.perf_counter() - started)
+                per_cell = best / args.batches / (rule_count * city_count)
+                line += f' {per_cell * 1e9:10.1f}ns'
+            print(line)
+    alert_rules.NUMPY_MIN_CELLS = default_min_cells
+
+
+if __name__ == '__main__':
+    main()
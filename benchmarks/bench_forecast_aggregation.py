@@ -0,0 +1,190 @@
+"""Micro-benchmark the forecast API's daily aggregation.
+
+Compares the original dict-by-dict loop from fetch_weather_forecast with
+forecast_aggregation.py on synthetic 5-day / 3-hour payloads: its pure-Python
+path and its NumPy path one forecast per call, then both over batches of
+--batch-sizes forecasts per call, each with basic and extended (+ext:
+percentiles and dew point) summaries. All of them are first checked against
+the original loop on the fields it produced, and the engines' extended fields
+against each other.
+
+    python benchmarks/bench_forecast_aggregation.py --payloads 200 --repeat 5
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'lambda-functions'))
+
+import forecast_aggregation  # noqa: E402
+
+FORECAST_STEP_SECONDS = 3 * 60 * 60
+CONDITIONS = ['clear sky', 'few clouds', 'scattered clouds', 'light rain', 'overcast clouds']
+
+
+def synthetic_forecast(seed, steps=40):
+    """A payload shaped like /data/2.5/forecast?cnt=40"""
+    rng = random.Random(seed)
+    start = (int(time.time()) // FORECAST_STEP_SECONDS + 1) * FORECAST_STEP_SECONDS
+    items = []
+    for step in range(steps):
+        dt = start + step * FORECAST_STEP_SECONDS
+        temp = round(60 + 15 * rng.random(), 2)
+        items.append({
+            'dt': dt,
+            'dt_txt': datetime.fromtimestamp(dt, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'main': {
+                'temp': temp,
+                'feels_like': temp - 1,
+                'temp_min': temp - 2,
+                'temp_max': temp + 2,
+                'humidity': rng.randint(20, 100),
+                'pressure': rng.randint(990, 1030)
+            },
+            'weather': [{'description': rng.choice(CONDITIONS)}],
+            'wind': {'speed': round(10 * rng.random(), 2)},
+            'pop': round(rng.random(), 2)
+        })
+    return {'list': items, 'city': {'timezone': rng.choice([-18000, 0, 19800, 32400])}}
+
+
+def legacy_summary(data):
+    """The aggregation fetch_weather_forecast used before forecast_aggregation.py"""
+    forecast_list = []
+    for item in data.get('list', []):
+        forecast_list.append({
+            'timestamp': item['dt_txt'],
+            'temperature': item['main']['temp'],
+            'feels_like': item['main']['feels_like'],
+            'temp_min': item['main']['temp_min'],
+            'temp_max': item['main']['temp_max'],
+            'humidity': item['main']['humidity'],
+            'pressure': item['main']['pressure'],
+            'condition': item['weather'][0]['description'],
+            'wind_speed': item['wind']['speed'],
+            'pop': item.get('pop', 0) * 100
+        })
+
+    daily_forecast = {}
+    for item in forecast_list:
+        date = item['timestamp'].split()[0]
+        if date not in daily_forecast:
+            daily_forecast[date] = []
+        daily_forecast[date].append(item)
+
+    daily_summary = []
+    for date, items in sorted(daily_forecast.items()):
+        temps = [i['temperature'] for i in items]
+        daily_summary.append({
+            'date': date,
+            'temp_min': min(temps),
+            'temp_max': max(temps),
+            'temp_avg': sum(temps) / len(temps),
+            'condition': items[len(items)//2]['condition'],
+            'humidity_avg': sum(i['humidity'] for i in items) / len(items),
+            'wind_speed_avg': sum(i['wind_speed'] for i in items) / len(items),
+            'pop_max': max(i['pop'] for i in items)
+        })
+
+    return forecast_list[:24], daily_summary[:5]
+
+
+def columnar_summary(engine, extended=False):
+    def summarize(data):
+        return forecast_aggregation.hourly_forecast(data, 24), engine(data, days=5, extended=extended)
+    return summarize
+
+
+def batched_summary(payloads, extended=False):
+    """numpy-batched: hourly per forecast, daily for all forecasts in one call"""
+    hourly = [forecast_aggregation.hourly_forecast(data, 24) for data in payloads]
+    return list(zip(hourly, forecast_aggregation.daily_summaries_numpy(payloads, days=5, extended=extended)))
+
+
+def check_agreement(payloads, engines):
+    batched = batched_summary(payloads, True) if forecast_aggregation.load_numpy() is not None else None
+    for position, data in enumerate(payloads):
+        expected_hourly, expected_daily = legacy_summary(data)
+        results = {name: summarize(data) for name, summarize in engines.items()}
+        if batched is not None:
+            results['numpy-batched'] = batched[position]
+        for name, (hourly, daily) in results.items():
+            assert hourly == expected_hourly, f'{name}: hourly differs'
+            assert len(daily) == len(expected_daily), f'{name}: day count differs'
+            for got, want in zip(daily, expected_daily):
+                for field, value in want.items():
+                    same = got[field] == value if isinstance(value, str) else math.isclose(got[field], value)
+                    assert same, f'{name}: {field} differs on {want["date"]}: {got[field]!r} != {value!r}'
+
+    # The extended statistics agree between engines
+    if batched is not None:
+        for data, (_, batched_daily) in zip(payloads, batched):
+            python_daily = forecast_aggregation.daily_summary_python(data, days=5, extended=True)
+            for got, want in zip(batched_daily, python_daily):
+                for field, value in want.items():
+                    same = got[field] == value if isinstance(value, str) else math.isclose(got[field], value)
+                    assert same, f'numpy-batched: {field} differs on {want["date"]}: {got[field]!r} != {value!r}'
+
+
+def time_engine(summarize, payloads, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in payloads:
+            summarize(data)
+        best = min(best, time.perf_counter() - start)
+    return best / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payloads', type=int, default=200)
+    parser.add_argument('--steps', type=int, default=40, help='forecast steps per payload')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch-sizes', default='2,5,10,20,50',
+                        help='forecasts per call for the batched engines, comma-separated')
+    args = parser.parse_args()
+
+    payloads = [synthetic_forecast(seed, args.steps) for seed in range(args.payloads)]
+    has_numpy = forecast_aggregation.load_numpy() is not None
+
+    engines = {}
+    for extended in (False, True):
+        suffix = '+ext' if extended else ''
+        engines[f'python{suffix}'] = columnar_summary(forecast_aggregation.daily_summary_python, extended)
+        if has_numpy:
+            engines[f'numpy{suffix}'] = columnar_summary(forecast_aggregation.daily_summary_numpy, extended)
+    if not has_numpy:
+        print('numpy not installed; skipping the NumPy engine')
+
+    check_agreement(payloads, engines)
+
+    baseline = time_engine(legacy_summary, payloads, args.repeat)
+    print(f'{"legacy loop":<22}: {baseline * 1e6:8.1f} us/forecast')
+    for name, summarize in engines.items():
+        elapsed = time_engine(summarize, payloads, args.repeat)
+        print(f'{name:<22}: {elapsed * 1e6:8.1f} us/forecast ({baseline / elapsed:.2f}x legacy)')
+
+    # Batches of n forecasts per call, as fetch_weather_forecasts makes them
+    for n in (int(size) for size in args.batch_sizes.split(',')):
+        batches = [payloads[i:i + n] for i in range(0, len(payloads) - n + 1, n)]
+        for extended in (False, True):
+            suffix = '+ext' if extended else ''
+            candidates = {
+                f'python-batched{suffix}': lambda batch, extended=extended: [
+                    columnar_summary(forecast_aggregation.daily_summary_python, extended)(data) for data in batch]
+            }
+            if has_numpy:
+                candidates[f'numpy-batched{suffix}'] = lambda batch, extended=extended: batched_summary(batch, extended)
+            for name, summarize in candidates.items():
+                elapsed = time_engine(summarize, batches, args.repeat) / n
+                print(f'{name + f" x{n}":<22}: {elapsed * 1e6:8.1f} us/forecast ({baseline / elapsed:.2f}x legacy)')
+
+
+if __name__ == '__main__':
+    main()
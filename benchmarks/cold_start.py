@@ -0,0 +1,130 @@
+"""Profile the cold-start import cost of each Lambda function.
+
+Imports each handler module in a fresh interpreter under `python -X importtime`
+(as Lambda's init phase does), with placeholder settings so nothing connects
+anywhere, and reports the module init time and the top-level imports that
+dominate it. Modules that should stay deferred until first use (boto3, numpy)
+are flagged if an import pulled them in anyway. With --budget-ms the exit
+status is 1 when the median init time of any function exceeds the budget, so
+the script can gate a build.
+
+    python benchmarks/cold_start.py --repeat 5 --top 8
+    python benchmarks/cold_start.py --budget-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+LAMBDA_DIR = ROOT / 'lambda-functions'
+
+FUNCTIONS = {
+    'collector': LAMBDA_DIR / 'weather-data-collector.py',
+    'forecast-api': LAMBDA_DIR / 'weather-forecast-api.py',
+}
+
+# Imported on first use only; a cold start that loads them has regressed
+DEFERRED_MODULES = ('boto3', 'botocore', 'numpy')
+
+PLACEHOLDER_ENV = {
+    'OPENWEATHER_API_KEY': 'bench',
+    'DB_HOST': 'localhost',
+    'DB_NAME': 'bench',
+    'DB_USER': 'bench',
+    'DB_PASSWORD': 'bench',
+    'S3_BUCKET': 'bench',
+    'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:bench',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+}
+
+# Runs in the child: time the handler module's own init, then report what got loaded
+CHILD = """
+import importlib.util, json, sys, time
+sys.path.insert(0, sys.argv[2])
+sys.stderr.write('--- handler init ---\\n')
+sys.stderr.flush()
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('handler', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - started
+print(json.dumps({'init_ms': elapsed * 1000, 'modules': sorted(sys.modules)}))
+"""
+
+
+def parse_importtime(stderr):
+    """{top-level module: cumulative microseconds} imported by the handler, from -X importtime output"""
+    cumulative = {}
+    # Interpreter startup and the child's own imports come before the marker
+    stderr = stderr.split('--- handler init ---\n', 1)[-1]
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented under the module that triggered them
+        if not name[1:].startswith(' '):
+            cumulative[name.strip()] = cumulative.get(name.strip(), 0) + int(cumulative_us)
+    return cumulative
+
+
+def profile(path):
+    env = dict(os.environ)
+    for key, value in PLACEHOLDER_ENV.items():
+        env.setdefault(key, value)
+    # The handler's own settings (RAW_ARCHIVE_DIR, ALERT_OUTBOX, ...) are left as set by the caller
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, str(path), str(path.parent)],
+        capture_output=True, text=True, env=env, cwd=str(path.parent)
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'{path.name} failed to import:\n{result.stderr[-2000:]}')
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(result.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--function', choices=sorted(FUNCTIONS), action='append',
+                        help='profile only this function (repeatable)')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per function')
+    parser.add_argument('--top', type=int, default=8, help='slowest top-level imports to list')
+    parser.add_argument('--budget-ms', type=float, help='fail when median init time exceeds this')
+    args = parser.parse_args()
+
+    over_budget = False
+    for name in args.function or sorted(FUNCTIONS):
+        reports = [profile(FUNCTIONS[name]) for _ in range(args.repeat)]
+        init_ms = [report['init_ms'] for report in reports]
+        median = statistics.median(init_ms)
+        print(f'{name}: init median {median:.1f} ms, min {min(init_ms):.1f} ms, '
+              f'max {max(init_ms):.1f} ms over {args.repeat} cold imports, '
+              f'{len(reports[-1]["modules"])} modules loaded')
+
+        # Median cumulative time per top-level import across runs
+        names = {module for report in reports for module in report['imports']}
+        slowest = sorted(
+            ((statistics.median(report['imports'].get(module, 0) for report in reports), module)
+             for module in names),
+            reverse=True
+        )[:args.top]
+        for cumulative_us, module in slowest:
+            print(f'  {cumulative_us / 1000:8.1f} ms  {module}')
+
+        loaded = [module for module in DEFERRED_MODULES if module in reports[-1]['modules']]
+        if loaded:
+            print(f'  imported at init (should be deferred): {", ".join(loaded)}')
+
+        if args.budget_ms is not None and median > args.budget_ms:
+            print(f'  over budget: {median:.1f} ms > {args.budget_ms:.1f} ms')
+            over_budget = True
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Benchmark the collector's concurrent fetch pipeline against a local stub API.
+
+Runs lambda_handler once serially over 10 cities and once with the thread pool
+over a much larger city list, with S3/RDS writes replaced by no-ops so only the
+HTTP fan-out is measured. With --mode group the pooled run uses the /group
+endpoint after a first run has resolved every city to an ID. --throttle makes
+the stub answer that fraction of requests with 429 + Retry-After to exercise
+the collector's rate limiter and retry scheduler.
+
+    python benchmarks/collector_concurrency.py --cities 1000 --workers 64 --latency 0.2
+    python benchmarks/collector_concurrency.py --cities 1000 --mode group
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+COLLECTOR_PATH = ROOT / 'lambda-functions' / 'weather-data-collector.py'
+
+
+def stub_reading(city_id):
+    return {
+        'id': city_id,
+        'name': f'City {city_id}',
+        'main': {'temp': 70.0, 'feels_like': 69.0, 'humidity': 50, 'pressure': 1012},
+        'wind': {'speed': 5.0},
+        'visibility': 10000,
+        'weather': [{'description': 'clear sky'}],
+        'coord': {'lat': 1.0, 'lon': 2.0}
+    }
+
+
+def make_stub_handler(latency, request_counter, throttle):
+    class StubWeatherHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            request_counter.append(self.path)
+
+            if random.random() < throttle:
+                self.send_response(429)
+                self.send_header('Retry-After', '0.1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+
+            if url.path.endswith('/group'):
+                ids = [int(city_id) for city_id in query['id'][0].split(',')]
+                payload = {'cnt': len(ids), 'list': [stub_reading(city_id) for city_id in ids]}
+            else:
+                payload = stub_reading(int(query.get('q', ['City 0'])[0].split()[-1]))
+
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubWeatherHandler
+
+
+def load_collector(base_url, workers, mode, rate_per_minute):
+    sys.path.insert(0, str(COLLECTOR_PATH.parent))
+    os.environ.update({
+        'COLLECTION_MODE': mode,
+        'OPENWEATHER_API_KEY': 'bench',
+        'OPENWEATHER_BASE_URL': base_url,
+        'COLLECTOR_MAX_WORKERS': str(workers),
+        'OPENWEATHER_RATE_PER_MINUTE': str(rate_per_minute),
+        'OPENWEATHER_BURST': str(max(1, rate_per_minute // 60)),
+        'RETRY_BUDGET': '100000',
+        'DB_HOST': 'localhost',
+        'DB_NAME': 'bench',
+        'DB_USER': 'bench',
+        'DB_PASSWORD': 'bench',
+        'S3_BUCKET': 'bench',
+        'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:bench',
+    })
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    spec = importlib.util.spec_from_file_location('weather_data_collector', COLLECTOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    module.store_raw_data_s3 = lambda run, city, data, fetched_at=None: None
+    module.store_in_rds = lambda readings: []
+    module.send_alerts = lambda alerts, cities: 0
+    module._city_ids = {}
+    module.save_city_ids = lambda: None
+    module.print = lambda *args, **kwargs: None
+    module.instrumentation.metrics.flush_emf = lambda service: None
+    return module
+
+
+def run(collector, cities, workers):
+    collector.CITIES = cities
+    collector.MAX_WORKERS = workers
+    start = time.perf_counter()
+    response = collector.lambda_handler({}, None)
+    elapsed = time.perf_counter() - start
+    results = json.loads(response['body'])['results']
+    ok = sum(1 for r in results if r['status'] == 'success')
+    return elapsed, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cities', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub API latency in seconds')
+    parser.add_argument('--mode', choices=['city', 'group'], default='city')
+    parser.add_argument('--throttle', type=float, default=0.0, help='fraction of stub responses that are 429s')
+    parser.add_argument('--rate', type=int, default=600000, help='client rate limit in requests per minute')
+    args = parser.parse_args()
+
+    requests_seen = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_stub_handler(args.latency, requests_seen, args.throttle))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    collector = load_collector(base_url, args.workers, args.mode, args.rate)
+    cities = [f'City {i}' for i in range(args.cities)]
+
+    serial_time, serial_ok = run(collector, cities[:10], 1)
+    if args.mode == 'group':
+        # First run resolves every city to an ID by name
+        run(collector, cities, args.workers)
+    del requests_seen[:]
+    pooled_time, pooled_ok = run(collector, cities, args.workers)
+
+    print(f'serial   : {serial_ok:5d} cities in {serial_time:7.2f}s')
+    print(f'pooled   : {pooled_ok:5d} cities in {pooled_time:7.2f}s ({args.workers} workers, '
+          f'{args.mode} mode, {len(requests_seen)} API requests)')
+    print(f'speedup  : {args.cities / pooled_time / (10 / serial_time):.1f}x cities/sec')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
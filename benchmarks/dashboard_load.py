@@ -0,0 +1,205 @@
+"""Load-test the dashboard's sync (Flask) and async (ASGI) serving modes.
+
+Clients hammering /api/forecast/<city> (proxied to a stub Lambda that answers
+after --forecast-latency seconds) run alongside clients polling /api/latest,
+against each mode in turn:
+
+- sync:  app.py on a WSGI server with a fixed pool of --threads worker
+         threads, like gunicorn's threaded workers
+- async: asgi.py under uvicorn
+
+Each server runs in its own subprocess. Needs a Postgres with the weather
+schema in DB_HOST/DB_NAME/DB_USER/DB_PASSWORD (for example after
+`python lambda-functions/schema_migrations.py migrate`) and, for the async
+mode, uvicorn plus the packages listed in flask-app/asgi.py.
+
+    python benchmarks/dashboard_load.py --duration 20 --forecast-clients 32 --latest-clients 8
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import urllib3
+
+ROOT = Path(__file__).resolve().parent.parent
+FLASK_APP_DIR = ROOT / 'flask-app'
+
+
+def make_lambda_handler(latency):
+    class StubLambdaHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            city = self.path.rsplit('/', 1)[-1].split('?')[0]
+            body = json.dumps({'city': city, 'hourly': [], 'daily': []}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubLambdaHandler
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI server handling requests on a fixed number of threads"""
+
+    threads = 8
+
+    def server_activate(self):
+        super().server_activate()
+        self.pool = ThreadPoolExecutor(max_workers=self.threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(mode, port, threads):
+    sys.path.insert(0, str(FLASK_APP_DIR))
+    os.chdir(FLASK_APP_DIR)
+
+    if mode == 'sync':
+        import app
+        PooledWSGIServer.threads = threads
+        make_server('127.0.0.1', port, app.app, server_class=PooledWSGIServer,
+                    handler_class=QuietHandler).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run('asgi:app', host='127.0.0.1', port=port, log_level='warning')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(http, base_url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if http.request('GET', f'{base_url}/health', timeout=2.0, retries=False).status == 200:
+                return
+        except urllib3.exceptions.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'server at {base_url} did not become ready')
+
+
+def client_loop(http, url, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            response = http.request('GET', url, timeout=60.0, retries=False)
+            ok = response.status == 200
+        except urllib3.exceptions.HTTPError:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(url)
+
+
+def summarize(name, latencies, errors, duration):
+    if not latencies:
+        return f'  {name:<9} no successful requests ({len(errors)} errors)'
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f'  {name:<9} {len(latencies) / duration:8.1f} req/s  p50 {statistics.median(ordered) * 1000:7.1f} ms  '
+            f'p95 {p95 * 1000:7.1f} ms  max {ordered[-1] * 1000:7.1f} ms  ({len(errors)} errors)')
+
+
+def run_mode(mode, args, lambda_url):
+    port = free_port()
+    env = dict(os.environ, FORECAST_API_URL=lambda_url, FORECAST_MODE='proxy')
+    server = subprocess.Popen(
+        [sys.executable, __file__, '--serve', mode, '--port', str(port), '--threads', str(args.threads)],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    http = urllib3.PoolManager(maxsize=args.forecast_clients + args.latest_clients)
+
+    try:
+        wait_until_ready(http, base_url)
+        http.request('GET', f'{base_url}/api/latest', timeout=30.0)  # warm the latest cache
+
+        results = {'forecast': ([], []), 'latest': ([], [])}
+        deadline = time.monotonic() + args.duration
+        workers = []
+        for i in range(args.forecast_clients):
+            workers.append(threading.Thread(target=client_loop, args=(
+                http, f'{base_url}/api/forecast/City{i}', deadline, *results['forecast'])))
+        for _ in range(args.latest_clients):
+            workers.append(threading.Thread(target=client_loop, args=(
+                http, f'{base_url}/api/latest', deadline, *results['latest'])))
+
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+
+        label = f'{args.threads} threads' if mode == 'sync' else 'uvicorn'
+        print(f'{mode} ({label}):')
+        for name, (latencies, errors) in results.items():
+            print(summarize(name, latencies, errors, elapsed))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load per mode')
+    parser.add_argument('--forecast-clients', type=int, default=32)
+    parser.add_argument('--latest-clients', type=int, default=8)
+    parser.add_argument('--forecast-latency', type=float, default=2.0, help='stub Lambda latency in seconds')
+    parser.add_argument('--threads', type=int, default=8, help='worker threads for the sync server')
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.threads)
+        return
+
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), make_lambda_handler(args.forecast_latency))
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    lambda_url = f'http://127.0.0.1:{stub.server_address[1]}/default/weather-forecast-api'
+
+    for mode in args.modes.split(','):
+        run_mode(mode, args, lambda_url)
+
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
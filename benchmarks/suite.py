@@ -0,0 +1,458 @@
+"""End-to-end benchmark suite against local stand-ins for every external service.
+
+Runs the real code paths in one process:
+
+- collector        the collector's lambda_handler over --cities cities
+- forecast-cold    the forecast Lambda's handler for one city, cache cleared first
+- forecast-warm    the same with the forecast cache warm
+- forecast-batch   one ?cities= request for --batch-size cities, cache cleared first
+- api-latest, api-trends, api-map, api-alerts
+                   the dashboard's routes through Flask's test client, with
+                   its caches warm as they are in production
+
+OpenWeatherMap is a stub HTTP server answering after --api-latency seconds,
+S3 and SNS are in-memory clients, and Postgres is a real database (DB_HOST,
+DB_NAME, DB_USER, DB_PASSWORD) that the suite migrates and seeds with
+--history-days of readings every --interval-minutes for --cities synthetic
+"Bench City N" cities. The bench cities' rows are deleted afterwards unless
+--keep-data is given; other data in the database is left alone.
+
+Each scenario reports throughput and p50/p95/p99 latency. --save writes the
+results as JSON, and --baseline compares against a saved run, exiting with 1
+when any scenario's p95 is more than --max-regression slower.
+
+    python benchmarks/suite.py --cities 200 --history-days 30 --iterations 200
+    python benchmarks/suite.py --save baseline.json
+    python benchmarks/suite.py --baseline baseline.json --max-regression 0.2
+"""
+import argparse
+import importlib.util
+import io
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+LAMBDA_DIR = ROOT / 'lambda-functions'
+FLASK_APP_DIR = ROOT / 'flask-app'
+
+CITY_PREFIX = 'Bench City'
+SCENARIOS = ('collector', 'forecast-cold', 'forecast-warm', 'forecast-batch',
+             'api-latest', 'api-trends', 'api-map', 'api-alerts')
+
+
+def bench_cities(count):
+    """(name, OpenWeatherMap id, lat, lon) for count cities spread over the globe"""
+    return [(f'{CITY_PREFIX} {i}', 900000 + i,
+             round(-60 + (i * 37) % 120 + 0.5, 4), round(-180 + (i * 73) % 360 + 0.5, 4))
+            for i in range(count)]
+
+
+def temperature(index, hours):
+    """Deterministic temperature with a daily cycle; a few cities run hot enough to alert"""
+    return round(35 + (index * 37) % 65 + 8 * math.sin(hours / 24 * 2 * math.pi), 2)
+
+
+def current_weather(city, now):
+    name, city_id, lat, lon = city
+    index = city_id - 900000
+    temp = temperature(index, now / 3600)
+    return {
+        'id': city_id,
+        'name': name,
+        'dt': int(now),
+        'main': {'temp': temp, 'feels_like': temp - 2, 'humidity': 40 + index % 50, 'pressure': 1000 + index % 30},
+        'wind': {'speed': 3 + index % 20},
+        'visibility': 10000,
+        'weather': [{'description': 'clear sky'}],
+        'coord': {'lat': lat, 'lon': lon}
+    }
+
+
+def forecast(lat, lon, now, steps=40):
+    """A payload shaped like /data/2.5/forecast?cnt=40"""
+    start = int(now) // 10800 * 10800 + 10800
+    entries = []
+    for step in range(steps):
+        dt = start + step * 10800
+        temp = 60 + 15 * math.sin((dt / 3600 + lon / 15) / 24 * 2 * math.pi) - abs(lat) / 4
+        entries.append({
+            'dt': dt,
+            'dt_txt': datetime.utcfromtimestamp(dt).strftime('%Y-%m-%d %H:%M:%S'),
+            'main': {'temp': round(temp, 2), 'feels_like': round(temp - 2, 2), 'temp_min': round(temp - 1, 2),
+                     'temp_max': round(temp + 1, 2), 'humidity': 60, 'pressure': 1013},
+            'weather': [{'main': 'Clear', 'description': 'clear sky', 'icon': '01d'}],
+            'wind': {'speed': 5.0},
+            'pop': 0.1
+        })
+    return {'cnt': steps, 'list': entries, 'city': {'coord': {'lat': lat, 'lon': lon}, 'timezone': 0}}
+
+
+def make_weather_handler(cities, latency):
+    by_name = {city[0]: city for city in cities}
+    by_id = {city[1]: city for city in cities}
+
+    class StubOpenWeatherHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            now = time.time()
+
+            if url.path.endswith('/weather') and query.get('q') in by_name:
+                payload = current_weather(by_name[query['q']], now)
+            elif url.path.endswith('/group'):
+                found = [by_id[int(city_id)] for city_id in query['id'].split(',') if int(city_id) in by_id]
+                payload = {'cnt': len(found), 'list': [current_weather(city, now) for city in found]}
+            elif url.path.endswith('/forecast'):
+                payload = forecast(float(query['lat']), float(query['lon']), now)
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubOpenWeatherHandler
+
+
+class NoSuchKey(Exception):
+    def __init__(self, key):
+        super().__init__(f'NoSuchKey: {key}')
+        self.response = {'Error': {'Code': 'NoSuchKey'}}
+
+
+class MemoryS3:
+    """The subset of the boto3 S3 client the collector and raw_archive use"""
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        body = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        with self._lock:
+            self.objects[(Bucket, Key)] = body
+
+    def get_object(self, Bucket, Key, Range=None):
+        with self._lock:
+            if (Bucket, Key) not in self.objects:
+                raise NoSuchKey(Key)
+            body = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = Range[len('bytes='):].split('-')
+            body = body[int(start):int(end) + 1]
+        return {'Body': io.BytesIO(body)}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket, Prefix=''):
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        yield {'Contents': [{'Key': key} for key in keys]}
+
+
+class MemorySNS:
+    """publish_batch that accepts every entry"""
+
+    def __init__(self):
+        self.batches = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.batches.append((TopicArn, PublishBatchRequestEntries))
+        return {'Successful': [{'Id': entry['Id']} for entry in PublishBatchRequestEntries], 'Failed': []}
+
+
+def connect():
+    import psycopg2
+    return psycopg2.connect(host=os.environ['DB_HOST'], database=os.environ['DB_NAME'],
+                            user=os.environ['DB_USER'], password=os.environ['DB_PASSWORD'])
+
+
+def seed(cities, history_days, interval_minutes):
+    """Migrate, then replace the bench cities' history and latest readings. Returns rows written"""
+    import schema_migrations
+    from psycopg2.extras import execute_values
+    from city_names import normalize_city_key
+    from readings import READING_COLUMNS
+
+    cleanup()
+    now = datetime.now().replace(second=0, microsecond=0)
+    start = now - timedelta(days=history_days)
+    conn = connect()
+    try:
+        schema_migrations.migrate(conn)
+        cursor = conn.cursor()
+        schema_migrations.create_partitions(cursor, first_month=start.date().replace(day=1))
+
+        steps = int(history_days * 24 * 60 / interval_minutes)
+        latest = []
+        for name, city_id, lat, lon in cities:
+            index = city_id - 900000
+            rows = []
+            for step in range(steps):
+                at = start + timedelta(minutes=step * interval_minutes)
+                temp = temperature(index, (at - datetime(1970, 1, 1)).total_seconds() / 3600)
+                rows.append((normalize_city_key(name), name, at, temp, temp - 2, 40 + index % 50,
+                             1000 + index % 30, 3 + index % 20, 10000, 'clear sky', lat, lon))
+            latest.append(rows[-1])
+            execute_values(cursor, f"""
+                INSERT INTO weather_readings (city_key, {', '.join(READING_COLUMNS)}) VALUES %s
+            """, rows, page_size=1000)
+
+        execute_values(cursor, f"""
+            INSERT INTO latest_weather (city_key, {', '.join(READING_COLUMNS)}) VALUES %s
+        """, latest, page_size=1000)
+        conn.commit()
+        cursor.execute("ANALYZE weather_readings")
+        conn.commit()
+        return steps * len(cities)
+    finally:
+        conn.close()
+
+
+def cleanup():
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        pattern = f'{CITY_PREFIX.lower()} %'
+        for table in ('weather_readings', 'latest_weather', 'alert_state', 'alert_notifications'):
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f"DELETE FROM {table} WHERE city_key LIKE %s", (pattern,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of sorted values"""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def run_scenario(call, iterations, warmup, clients):
+    """Time `iterations` calls of call(i) over `clients` threads; call returns False on failure"""
+    for i in range(warmup):
+        call(i)
+
+    latencies = []
+    errors = []  # repr of each exception, or None for a call that returned False
+    counter = iter(range(iterations))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                ok, error = call(i), None
+            except Exception as e:
+                ok, error = False, repr(e)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(error)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    result = {'iterations': iterations, 'clients': clients, 'errors': len(errors),
+              'first_error': next((error for error in errors if error), None),
+              'throughput': len(ordered) / wall if wall else 0.0}
+    if ordered:
+        result.update({f'p{q}_ms': percentile(ordered, q) * 1000 for q in (50, 95, 99)})
+        result['max_ms'] = ordered[-1] * 1000
+    return result
+
+
+def build_scenarios(args, cities, collector, forecast_api, dashboard):
+    names = [city[0] for city in cities]
+    client = dashboard.app.test_client()
+
+    def clear_forecast_cache():
+        with forecast_api._forecast_cache_lock:
+            forecast_api._forecast_cache.clear()
+
+    def ok(response):
+        return response.get('statusCode') == 200
+
+    def collector_run(i):
+        body = json.loads(collector.lambda_handler({}, None)['body'])
+        return all(result['status'] == 'success' for result in body['results'])
+
+    def forecast_cold(i):
+        clear_forecast_cache()
+        return ok(forecast_api.lambda_handler({'pathParameters': {'city': names[i % len(names)]}}, None))
+
+    def forecast_warm(i):
+        return ok(forecast_api.lambda_handler({'pathParameters': {'city': names[i % len(names)]}}, None))
+
+    def forecast_batch(i):
+        clear_forecast_cache()
+        first = i * args.batch_size % len(names)
+        batch = (names[first:] + names[:first])[:args.batch_size]
+        return ok(forecast_api.lambda_handler({'queryStringParameters': {'cities': ','.join(batch)}}, None))
+
+    def route(path):
+        return lambda i: client.get(path(i)).status_code == 200
+
+    return {
+        'collector': (collector_run, args.collector_runs, 1),
+        'forecast-cold': (forecast_cold, args.iterations, args.clients),
+        'forecast-warm': (forecast_warm, args.iterations, args.clients),
+        'forecast-batch': (forecast_batch, max(1, args.iterations // args.batch_size), 1),
+        'api-latest': (route(lambda i: '/api/latest'), args.iterations, args.clients),
+        'api-trends': (route(lambda i: f'/api/trends/{names[i % len(names)]}?range={args.trend_range}'),
+                       args.iterations, args.clients),
+        'api-map': (route(lambda i: '/api/map'), args.iterations, args.clients),
+        'api-alerts': (route(lambda i: '/api/alerts'), args.iterations, args.clients),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Scenarios whose p95 regressed beyond max_regression, as printable lines"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name, {}).get('p95_ms')
+        after = result.get('p95_ms')
+        if before and after and after > before * (1 + max_regression):
+            regressions.append(f'{name}: p95 {before:.1f} ms -> {after:.1f} ms (+{(after / before - 1) * 100:.0f}%)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--cities', type=int, default=100, help='synthetic cities')
+    parser.add_argument('--history-days', type=float, default=30, help='days of seeded readings per city')
+    parser.add_argument('--interval-minutes', type=int, default=60, help='spacing of seeded readings')
+    parser.add_argument('--iterations', type=int, default=100, help='timed calls per scenario')
+    parser.add_argument('--collector-runs', type=int, default=5, help='timed collector invocations')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed calls before each scenario')
+    parser.add_argument('--clients', type=int, default=1, help='concurrent callers for forecast and api scenarios')
+    parser.add_argument('--batch-size', type=int, default=20, help='cities per forecast-batch request')
+    parser.add_argument('--trend-range', default='7d')
+    parser.add_argument('--api-latency', type=float, default=0.02, help='stub OpenWeatherMap latency in seconds')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='allowed p95 slowdown vs --baseline')
+    parser.add_argument('--keep-data', action='store_true', help="don't delete the bench cities' rows afterwards")
+    args = parser.parse_args()
+
+    selected = args.scenarios.split(',')
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    cities = bench_cities(args.cities)
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), make_weather_handler(cities, args.api_latency))
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        'OPENWEATHER_API_KEY': 'bench',
+        'OPENWEATHER_BASE_URL': f'http://127.0.0.1:{stub.server_address[1]}',
+        'OPENWEATHER_RATE_PER_MINUTE': '6000000',
+        'OPENWEATHER_BURST': '100000',
+        'RETRY_BUDGET': '1000',
+        'FORECAST_CACHE_BACKEND': 'memory',
+        'FORECAST_BATCH_MAX_CITIES': str(max(50, args.batch_size)),
+        'FORECAST_MODE': 'proxy',
+        'S3_BUCKET': 'bench',
+        'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:bench',
+    })
+    for key in ('DB_HOST', 'DB_NAME', 'DB_USER', 'DB_PASSWORD'):
+        if key not in os.environ:
+            parser.error(f'{key} must point at a Postgres database the suite may write to')
+    # Resolved before the chdir below
+    args.save = args.save and os.path.abspath(args.save)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    sys.path.insert(0, str(LAMBDA_DIR))
+    sys.path.insert(0, str(FLASK_APP_DIR))
+    os.chdir(FLASK_APP_DIR)
+
+    started = time.perf_counter()
+    rows = seed(cities, args.history_days, args.interval_minutes)
+    print(f'Seeded {rows} readings for {len(cities)} cities in {time.perf_counter() - started:.1f}s')
+
+    # Handlers log a line per city and per request; keep that off the terminal
+    quiet = open(os.devnull, 'w')
+    try:
+        with redirect_stdout(quiet):
+            collector = load_module('weather_data_collector', LAMBDA_DIR / 'weather-data-collector.py')
+            collector.CITIES = [city[0] for city in cities]
+            collector._aws_clients.update({'s3': MemoryS3(), 'sns': MemorySNS()})
+            forecast_api = load_module('weather_forecast_api', LAMBDA_DIR / 'weather-forecast-api.py')
+            import app as dashboard
+
+        scenarios = build_scenarios(args, cities, collector, forecast_api, dashboard)
+        results = {}
+        print(f'{"scenario":<15} {"calls":>6} {"errors":>6} {"calls/s":>9} {"p50":>9} {"p95":>9} {"p99":>9}')
+        for name in selected:
+            call, iterations, clients = scenarios[name]
+            with redirect_stdout(quiet):
+                result = run_scenario(call, iterations, min(args.warmup, iterations), clients)
+            results[name] = result
+            if 'p50_ms' in result:
+                print(f'{name:<15} {iterations:>6} {result["errors"]:>6} {result["throughput"]:>9.1f} '
+                      f'{result["p50_ms"]:>7.1f}ms {result["p95_ms"]:>7.1f}ms {result["p99_ms"]:>7.1f}ms')
+            else:
+                print(f'{name:<15} {iterations:>6} {result["errors"]:>6}   no successful calls')
+            if result['first_error']:
+                print(f'  first error: {result["first_error"]}')
+    finally:
+        quiet.close()
+        stub.shutdown()
+        if not args.keep_data:
+            cleanup()
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f)['results'], args.max_regression)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Compare the dashboard's trends encodings by size and encode time.
+
+Builds synthetic TRENDS_QUERY rows (one per bucket) and encodes them as the
+original JSON shape with the stdlib encoder and with orjson, then as the
+columnar JSON and MessagePack payloads, each uncompressed, gzipped and
+brotli-compressed at the levels wire_format.py uses. No database needed.
+
+    python benchmarks/wire_format.py --points 2000 --repeat 20
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'flask-app'))
+os.chdir(ROOT / 'flask-app')
+
+import app as dashboard  # noqa: E402
+import wire_format  # noqa: E402
+
+BUCKET_SECONDS = 3600
+
+
+def synthetic_rows(points, seed=0):
+    """Hourly buckets of min/avg/max temperature and humidity with a daily cycle"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(points):
+        temp = 60 + 12 * math.sin(i / 24 * 2 * math.pi) + rng.uniform(-2, 2)
+        humidity = 55 + 20 * math.cos(i / 24 * 2 * math.pi) + rng.uniform(-5, 5)
+        rows.append((start + timedelta(seconds=i * BUCKET_SECONDS),
+                     temp - rng.uniform(0, 3), temp, temp + rng.uniform(0, 3),
+                     humidity - rng.uniform(0, 5), humidity, humidity + rng.uniform(0, 5)))
+    return rows
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=2000, help='buckets in the series')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.points)
+    payload = dashboard.trends_payload('1y', '1h', rows)
+    columnar = dashboard.columnar_trends_payload('1y', '1h', BUCKET_SECONDS, rows)
+
+    encoders = {
+        'json (stdlib)': lambda: json.dumps(payload, sort_keys=True).encode('utf-8'),
+        'columnar json': lambda: wire_format.encode(columnar, 'columnar', dashboard.app.json.dumps)[0]
+    }
+    if wire_format.orjson is not None:
+        orjson_provider = wire_format.OrjsonProvider(dashboard.app)
+        encoders['json (orjson)'] = lambda: orjson_provider.dumps(payload).encode('utf-8')
+    if wire_format.msgpack is not None:
+        encoders['msgpack'] = lambda: wire_format.encode(columnar, 'msgpack', dashboard.app.json.dumps)[0]
+
+    compressors = {'gzip': lambda body: gzip.compress(body, wire_format.GZIP_LEVEL)}
+    if wire_format.brotli is not None:
+        compressors['br'] = lambda body: wire_format.brotli.compress(body, quality=wire_format.BROTLI_QUALITY)
+
+    print(f'{args.points} buckets; sizes in bytes, times best of {args.repeat}')
+    for name, encoder in encoders.items():
+        body = encoder()
+        line = f'  {name:<14} {len(body):>8} B  encode {best_time(encoder, args.repeat) * 1000:6.2f} ms'
+        for method, compressor in compressors.items():
+            compressed = compressor(body)
+            elapsed = best_time(lambda: compressor(body), args.repeat)
+            line += f'  | {method} {len(compressed):>7} B {elapsed * 1000:6.2f} ms'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,50 @@
-from flask import Flask, render_template, jsonify, send_file
-import psycopg2
+from flask import Flask, Response, g, render_template, jsonify, request
 from datetime import datetime, timedelta
 import folium
 from folium import plugins
 import os
+import re
+import gzip
+import importlib.util
+import sys
+import threading
+import time
 import urllib3
-import json
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 import pytz
+from db_pool import ConnectionPool
+from cache import RefreshingCache
+from live_updates import QueueSubscriber, UpdateBroadcaster, format_event
+import wire_format
+
+# Helpers shared with the Lambda functions
+LAMBDA_FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-functions')
+sys.path.append(LAMBDA_FUNCTIONS_DIR)
+from city_names import normalize_city_key
+from readings import READING_COLUMNS, WEATHER_UPDATES_CHANNEL
+import alert_rules
+import instrumentation
 
 app = Flask(__name__)
+if wire_format.orjson is not None:
+    app.json = wire_format.OrjsonProvider(app)
 
 # Initialize urllib3
 http = urllib3.PoolManager()
 
+# API Gateway endpoint of the weather-forecast-api Lambda
+FORECAST_API_URL = os.environ.get(
+    'FORECAST_API_URL',
+    'https://ery3vytcl2.execute-api.us-east-1.amazonaws.com/default/weather-forecast-api'
+)
+
 # Database Configuration
 DB_CONFIG = {
-    'host': 'weather-db.c8dk46wws5y8.us-east-1.rds.amazonaws.com',
-    'database': 'weatherdb',
-    'user': 'postgres',
-    'password': 'Santander1210'
+    'host': os.environ.get('DB_HOST', 'weather-db.c8dk46wws5y8.us-east-1.rds.amazonaws.com'),
+    'database': os.environ.get('DB_NAME', 'weatherdb'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'Santander1210')
 }
 
 CITY_TIMEZONES = {
@@ -36,20 +61,45 @@ CITY_TIMEZONES = {
     'Sao Paulo': 'America/Sao_Paulo'
 }
 
-def get_db_connection():
-    """Create database connection"""
-    return psycopg2.connect(**DB_CONFIG)
+# Process-wide pool so requests reuse connections instead of handshaking with RDS each time
+db_pool = ConnectionPool(
+    DB_CONFIG,
+    min_size=int(os.environ.get('DB_POOL_MIN_SIZE', '1')),
+    max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    healthcheck_idle=float(os.environ.get('DB_POOL_HEALTHCHECK_IDLE', '30'))
+)
+
+# FORECAST_MODE=local runs the forecast Lambda's code in this process, sharing
+# its forecast cache and coordinate index across requests and borrowing
+# connections from db_pool; the default 'proxy' relays to FORECAST_API_URL.
+FORECAST_MODE = os.environ.get('FORECAST_MODE', 'proxy')
+
+def load_forecast_api():
+    path = os.path.join(LAMBDA_FUNCTIONS_DIR, 'weather-forecast-api.py')
+    spec = importlib.util.spec_from_file_location('weather_forecast_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.db_connection = db_pool.connection
+    return module
+
+forecast_api = load_forecast_api() if FORECAST_MODE == 'local' else None
+
+def get_city_timezone(city):
+    """Get the IANA timezone name for a city, or None if unknown"""
+    # Normalize city name
+    city_normalized = city.replace('ÃƒÂ£', 'ã').replace('Ã£', 'ã')
+    return CITY_TIMEZONES.get(city_normalized)
 
 def get_local_time(city):
     """Get current local time for a city"""
     try:
-        # Normalize city name
-        city_normalized = city.replace('ÃƒÂ£', 'ã').replace('Ã£', 'ã')
-        
-        timezone_str = CITY_TIMEZONES.get(city_normalized)
+        timezone_str = get_city_timezone(city)
         
         if not timezone_str:
-            print(f"No timezone found for city: {city} (normalized: {city_normalized})")
+            # Runs for every unknown city on every /api/latest response
+            if instrumentation.log_enabled('DEBUG'):
+                print(f"No timezone found for city: {city}")
             return "N/A"
         
         local_tz = pytz.timezone(timezone_str)
@@ -66,84 +116,73 @@ def get_local_time(city):
         return "N/A"
 
 
+# latest_weather holds one row per normalized city, maintained by the collector.
+# Keep the São Paulo display fix for rows written before the encoding cleanup
+LATEST_WEATHER_QUERY = """
+    SELECT 
+        CASE 
+            WHEN city LIKE '%o Paulo%' THEN 'São Paulo'
+            ELSE city 
+        END as normalized_city,
+        timestamp,
+        temperature_f,
+        feels_like,
+        humidity,
+        pressure,
+        wind_speed,
+        visibility,
+        condition,
+        latitude,
+        longitude
+    FROM latest_weather
+    ORDER BY normalized_city
+"""
+
+def latest_reading(row):
+    """API shape of one LATEST_WEATHER_QUERY row"""
+    city = row[0]
+    timestamp = row[1]
+
+    return {
+        'city': city,
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else '',
+        'timezone': get_city_timezone(city),
+        'temperature': row[2],
+        'feels_like': row[3] if row[3] else row[2],
+        'humidity': row[4],
+        'pressure': row[5] if row[5] else 0,
+        'wind_speed': row[6],
+        'visibility': row[7] if row[7] else 0,
+        'condition': row[8],
+        'latitude': row[9] if row[9] else 0,
+        'longitude': row[10] if row[10] else 0
+    }
+
+def query_latest_weather():
+    """Query the latest reading for every city (cached by latest_cache)"""
+    with db_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(LATEST_WEATHER_QUERY)
+            rows = cursor.fetchall()
+
+    return [latest_reading(row) for row in rows]
+
+# Readings only change when the collector runs, so serve them from memory and
+# refresh in the background instead of re-running the window query per poll
+latest_cache = RefreshingCache(
+    query_latest_weather,
+    ttl=float(os.environ.get('LATEST_CACHE_TTL', '60')),
+    stale_ttl=float(os.environ.get('LATEST_CACHE_STALE_TTL', '600')),
+    name='latest'
+)
+
+def with_local_times(readings):
+    """Stamp cached readings with the current local time, which must not be cached"""
+    return [dict(reading, local_time=get_local_time(reading['city'])) for reading in readings]
+
 def get_latest_weather():
     """Get latest weather data for all cities"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Fix duplicate São Paulo by normalizing city names
-    query = """
-        WITH normalized_cities AS (
-            SELECT 
-                CASE 
-                    WHEN city LIKE '%o Paulo%' THEN 'São Paulo'
-                    ELSE city 
-                END as normalized_city,
-                timestamp,
-                temperature_f,
-                feels_like,
-                humidity,
-                pressure,
-                wind_speed,
-                visibility,
-                condition,
-                latitude,
-                longitude,
-                ROW_NUMBER() OVER (
-                    PARTITION BY CASE 
-                        WHEN city LIKE '%o Paulo%' THEN 'São Paulo'
-                        ELSE city 
-                    END 
-                    ORDER BY timestamp DESC
-                ) as rn
-            FROM weather_readings
-        )
-        SELECT 
-            normalized_city,
-            timestamp,
-            temperature_f,
-            feels_like,
-            humidity,
-            pressure,
-            wind_speed,
-            visibility,
-            condition,
-            latitude,
-            longitude
-        FROM normalized_cities
-        WHERE rn = 1
-        ORDER BY normalized_city
-    """
-
-    cursor.execute(query)
-    rows = cursor.fetchall()
-
-    data = []
-    for row in rows:
-        city = row[0]
-        timestamp = row[1]
-        
-        # Get local time for this city
-        local_time = get_local_time(city)
-        
-        data.append({
-            'city': city,
-            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else '',
-            'local_time': local_time,  # This is the actual local time
-            'temperature': row[2],
-            'feels_like': row[3] if row[3] else row[2],
-            'humidity': row[4],
-            'pressure': row[5] if row[5] else 0,
-            'wind_speed': row[6],
-            'visibility': row[7] if row[7] else 0,
-            'condition': row[8],
-            'latitude': row[9] if row[9] else 0,
-            'longitude': row[10] if row[10] else 0
-        })
-
-    cursor.close()
-    conn.close()
-    return data
+    return with_local_times(latest_cache.get().value)
 
 # Routes
 @app.route('/')
@@ -151,132 +190,395 @@ def index():
     """Main dashboard page"""
     return render_template('index.html')
 
+def negotiated_response(value, fmt):
+    """Response with value encoded in the format picked by wire_format.negotiate"""
+    if fmt == 'json':
+        response = jsonify(value)
+    else:
+        body, mimetype = wire_format.encode(value, fmt, app.json.dumps)
+        response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter() if instrumentation.metrics.sampled() else None
+
+# Registered before compress_response, so it runs after it and the timing includes
+# compression. Streamed responses are timed to their first byte.
+@app.after_request
+def record_request_timing(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        instrumentation.metrics.observe(
+            'http_request', time.perf_counter() - started,
+            error=response.status_code >= 500,
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=str(response.status_code)
+        )
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli buffered API responses; streams and pre-compressed bodies pass through"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in wire_format.COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body, encoding = wire_format.compress(
+        response.get_data(), response.mimetype, request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
 @app.route('/api/latest')
 def get_latest_readings():
-    """Get latest readings for all cities"""
+    """Get latest readings for all cities (?format=json|columnar|msgpack, or by Accept)"""
     try:
-        return jsonify(get_latest_weather())
+        try:
+            fmt = wire_format.negotiate(request.headers.get('Accept'), request.args.get('format'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        entry = latest_cache.get()
+        readings = with_local_times(entry.value)
+
+        # The ETag covers the readings only; the dashboard renders local time
+        # from each city's timezone, so a 304 never shows a stale clock
+        response = negotiated_response(readings if fmt == 'json' else wire_format.columns(readings), fmt)
+        response.set_etag(entry.etag if fmt == 'json' else f'{entry.etag}-{fmt}', weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# /api/stream pushes changed readings to open dashboards. The collector NOTIFYs
+# WEATHER_UPDATES_CHANNEL after each run; LIVE_UPDATES_SOURCE=poll reloads on
+# LIVE_UPDATES_POLL_INTERVAL instead, for databases where LISTEN isn't possible.
+# Each stream holds a worker thread here, so serve many tabs from asgi.py.
+LIVE_UPDATES_HEARTBEAT = float(os.environ.get('LIVE_UPDATES_HEARTBEAT', '15'))
+LIVE_UPDATES_MAX_PENDING = int(os.environ.get('LIVE_UPDATES_MAX_PENDING', '20'))
+LIVE_UPDATES_RETRY_MS = 5000
+
+live_updates = UpdateBroadcaster(
+    latest_cache,
+    DB_CONFIG,
+    WEATHER_UPDATES_CHANNEL,
+    source=os.environ.get('LIVE_UPDATES_SOURCE', 'listen'),
+    poll_interval=float(os.environ.get('LIVE_UPDATES_POLL_INTERVAL', '60'))
+)
+
+def stream_preamble():
+    """First bytes of every stream: reconnect delay plus the ETag of the readings the client should hold"""
+    return (f"retry: {LIVE_UPDATES_RETRY_MS}\n\n" +
+            format_event('hello', {'etag': latest_cache.get().etag}, app.json.dumps))
+
+def stream_event(event):
+    """Encode a broadcaster event, or a keepalive comment for None"""
+    if event is None:
+        return ": keepalive\n\n"
+    name, data = event
+    if name == 'readings':
+        data = dict(data, changed=with_local_times(data['changed']))
+    return format_event(name, data, app.json.dumps)
+
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+@app.route('/api/stream')
+def stream_latest_readings():
+    """Server-sent events carrying only the cities whose reading changed"""
+    def events():
+        subscriber = QueueSubscriber(LIVE_UPDATES_MAX_PENDING)
+        live_updates.subscribe(subscriber.deliver)
+        try:
+            yield stream_preamble()
+            while True:
+                yield stream_event(subscriber.get(LIVE_UPDATES_HEARTBEAT))
+        finally:
+            live_updates.unsubscribe(subscriber.deliver)
+
+    return Response(events(), mimetype='text/event-stream', headers=STREAM_HEADERS)
+
+def stream_forecast_api(url, timeout):
+    """Relay a forecast Lambda response; successful bodies are streamed through unparsed"""
+    response = http.request('GET', url, timeout=timeout, preload_content=False)
+    if instrumentation.log_enabled('DEBUG'):
+        print(f"Lambda response status: {response.status}")
+
+    if response.status != 200:
+        try:
+            error_body = response.data.decode('utf-8') if response.data else 'No error body'
+        finally:
+            response.release_conn()
+        print(f"Lambda error: {error_body}")
+        return jsonify({
+            'error': f'Lambda API returned status {response.status}',
+            'details': error_body
+        }), response.status
+
+    def body():
+        try:
+            yield from response.stream(64 * 1024)
+        finally:
+            response.release_conn()
+
+    return Response(body(), status=200,
+                    content_type=response.headers.get('Content-Type', 'application/json'))
+
+def forecast_response(forecast_data):
+    """Response for a forecast computed in-process, mirroring the Lambda's status codes"""
+    if 'error' in forecast_data:
+        print(f"Error in forecast: {forecast_data['error']}")
+        return jsonify(forecast_data), 500
+    return jsonify(forecast_data)
+
 @app.route('/api/forecast/<city>')
 def get_forecast(city):
-    """Proxy to Lambda function for weather forecast - FIXED CORS"""
+    """Weather forecast for one city, computed in-process or proxied to the Lambda"""
     try:
         # Normalize city name for São Paulo
         city_normalized = city.replace('ÃƒÂ£', 'ã').replace('Ã£', 'ã')
-        
+
+        if forecast_api:
+            return forecast_response(forecast_api.fetch_weather_forecast(
+                forecast_api.normalize_city_name(city_normalized), **forecast_api.forecast_options(request.args)))
+
         # Use path parameter format that Lambda expects
-        LAMBDA_FORECAST_URL = f'https://ery3vytcl2.execute-api.us-east-1.amazonaws.com/default/weather-forecast-api/{city_normalized}'
-        
-        print(f"Requesting forecast for {city_normalized} from: {LAMBDA_FORECAST_URL}")
-        
-        response = http.request('GET', LAMBDA_FORECAST_URL, timeout=15.0)
-        
-        print(f"Lambda response status: {response.status}")
-        
-        if response.status != 200:
-            error_body = response.data.decode('utf-8') if response.data else 'No error body'
-            print(f"Lambda error: {error_body}")
-            return jsonify({
-                'error': f'Lambda API returned status {response.status}',
-                'details': error_body
-            }), response.status
-        
-        data = json.loads(response.data.decode('utf-8'))
-        return jsonify(data)
-        
+        LAMBDA_FORECAST_URL = f'{FORECAST_API_URL}/{city_normalized}'
+        options = forecast_option_params(request.args)
+        if options:
+            LAMBDA_FORECAST_URL += f'?{urlencode(options)}'
+
+        if instrumentation.log_enabled('INFO'):
+            print(f"Requesting forecast for {city_normalized} from: {LAMBDA_FORECAST_URL}")
+
+        return stream_forecast_api(LAMBDA_FORECAST_URL, timeout=15.0)
+
     except urllib3.exceptions.TimeoutError:
         return jsonify({'error': 'Request timeout - Lambda did not respond in time'}), 504
-    except json.JSONDecodeError as e:
-        return jsonify({'error': f'Failed to parse Lambda response: {str(e)}'}), 500
     except Exception as e:
         print(f"Forecast error: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/trends/<city>')
-def get_city_trends(city):
-    """Get 7-day temperature and humidity trends for a city"""
+def requested_forecast_cities(args):
+    """Cities named by ?cities=London,Paris; raises ValueError when there are none or too many"""
+    cities = [city.strip().replace('ÃƒÂ£', 'ã').replace('Ã£', 'ã')
+              for city in args.get('cities', '').split(',') if city.strip()]
+    if not cities:
+        raise ValueError('cities parameter required, e.g. ?cities=London,Paris')
+
+    if forecast_api:
+        cities = list(dict.fromkeys(forecast_api.normalize_city_name(city) for city in cities))
+        if len(cities) > forecast_api.FORECAST_BATCH_MAX_CITIES:
+            raise ValueError(f'At most {forecast_api.FORECAST_BATCH_MAX_CITIES} cities per request')
+    return cities
+
+def forecast_option_params(args):
+    """The forecast options (?days=, ?stats=) in args, to forward to the Lambda"""
+    return {name: args[name] for name in ('days', 'stats') if args.get(name)}
+
+def batch_forecast_url(cities, args):
+    params = {'cities': ','.join(cities), **forecast_option_params(args)}
+    return f'{FORECAST_API_URL}?{urlencode(params)}'
+
+@app.route('/api/forecast')
+def get_forecasts():
+    """Forecasts for several cities (?cities=London,Paris) in one call"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        try:
+            cities = requested_forecast_cities(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        # Normalize city name
-        city_normalized = city.replace('ÃƒÂ£', 'ã').replace('Ã£', 'ã')
+        if forecast_api:
+            return forecast_response(forecast_api.fetch_weather_forecasts(
+                cities, **forecast_api.forecast_options(request.args)))
 
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        query = """
-            SELECT
-                timestamp,
-                temperature_f,
-                humidity
-            FROM weather_readings
-            WHERE (city = %s OR city LIKE %s) AND timestamp > %s
-            ORDER BY timestamp ASC
-        """
-        cursor.execute(query, (city_normalized, f'%{city_normalized.split()[0]}%', seven_days_ago))
-        rows = cursor.fetchall()
+        if instrumentation.log_enabled('INFO'):
+            print(f"Requesting forecasts for {len(cities)} cities")
+        return stream_forecast_api(batch_forecast_url(cities, request.args), timeout=30.0)
 
-        data = {
-            'labels': [row[0].strftime('%m/%d %H:%M') for row in rows],
-            'temperature': [row[1] for row in rows],
-            'humidity': [row[2] for row in rows]
-        }
+    except urllib3.exceptions.TimeoutError:
+        return jsonify({'error': 'Request timeout - Lambda did not respond in time'}), 504
+    except Exception as e:
+        print(f"Forecast error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        cursor.close()
-        conn.close()
-        return jsonify(data)
+DURATION_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+TREND_BUCKETS = ['5m', '15m', '30m', '1h', '3h', '6h', '12h', '1d', '1w']
+TRENDS_TARGET_POINTS = int(os.environ.get('TRENDS_TARGET_POINTS', '500'))
+TRENDS_MAX_POINTS = int(os.environ.get('TRENDS_MAX_POINTS', '2000'))
+
+def parse_duration(value):
+    """Parse durations like '15m', '1h', '7d' or '1y' into seconds"""
+    match = re.fullmatch(r'(\d+)([mhdwy])', value.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid duration '{value}' (use e.g. 15m, 1h, 7d, 1y)")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+def choose_trend_bucket(range_seconds):
+    """Smallest standard bucket that keeps the series under TRENDS_TARGET_POINTS"""
+    for bucket in TREND_BUCKETS:
+        if range_seconds / parse_duration(bucket) <= TRENDS_TARGET_POINTS:
+            return bucket
+    return TREND_BUCKETS[-1]
+
+# Bucketed history for one city. Placeholders are filled per driver:
+# %(name)s for psycopg2 here, $n for asyncpg in asgi.py
+TRENDS_QUERY = """
+    SELECT
+        to_timestamp(floor(extract(epoch FROM timestamp) / {bucket}) * {bucket})
+            AT TIME ZONE 'UTC' AS bucket_start,
+        MIN(temperature_f),
+        AVG(temperature_f),
+        MAX(temperature_f),
+        MIN(humidity),
+        AVG(humidity),
+        MAX(humidity)
+    FROM weather_readings
+    WHERE city_key = {city_key} AND timestamp > {since}
+    GROUP BY bucket_start
+    ORDER BY bucket_start ASC
+"""
+
+def parse_trend_params(args):
+    """(range name, range seconds, bucket name, bucket seconds) from query args; raises ValueError"""
+    range_name = args.get('range', '7d')
+    range_seconds = parse_duration(range_name)
+    bucket_name = args.get('bucket') or choose_trend_bucket(range_seconds)
+    bucket_seconds = parse_duration(bucket_name)
+
+    if range_seconds / bucket_seconds > TRENDS_MAX_POINTS:
+        raise ValueError(f'range {range_name} with bucket {bucket_name} exceeds {TRENDS_MAX_POINTS} points')
+    return range_name, range_seconds, bucket_name, bucket_seconds
+
+# Series in trends payloads and their TRENDS_QUERY column
+TREND_SERIES = {
+    'temperature': 2,
+    'temperature_min': 1,
+    'temperature_max': 3,
+    'humidity': 5,
+    'humidity_min': 4,
+    'humidity_max': 6
+}
+# Trend values are rounded to hundredths, so the columnar form sends value * 100
+TRENDS_SCALE = 100
+
+def trend_series(rows):
+    return {
+        name: [round(float(row[index]), 2) if row[index] is not None else None for row in rows]
+        for name, index in TREND_SERIES.items()
+    }
+
+def trends_payload(range_name, bucket_name, rows):
+    """API shape of TRENDS_QUERY rows"""
+    return {
+        'range': range_name,
+        'bucket': bucket_name,
+        'labels': [row[0].strftime('%m/%d %H:%M') for row in rows],
+        **trend_series(rows)
+    }
+
+def columnar_trends_payload(range_name, bucket_name, bucket_seconds, rows):
+    """Compact trends: bucket i starts at start + time[i] * step (UTC epoch seconds), and
+
+    time and every series are delta-encoded integers (series in 1/scale units)
+    instead of one formatted label and float per bucket.
+    """
+    start = wire_format.epoch_seconds(rows[0][0]) if rows else 0
+    payload = {
+        'range': range_name,
+        'bucket': bucket_name,
+        'start': start,
+        'step': bucket_seconds,
+        'scale': TRENDS_SCALE,
+        'time': wire_format.delta_encode(
+            [(wire_format.epoch_seconds(row[0]) - start) // bucket_seconds for row in rows])
+    }
+    for name, values in trend_series(rows).items():
+        payload[name] = wire_format.delta_encode(values, TRENDS_SCALE)
+    return payload
+
+@app.route('/api/trends/<city>')
+def get_city_trends(city):
+    """Get bucketed temperature and humidity trends for a city.
+
+    Query parameters: range (default 7d) and bucket (default chosen to keep
+    the series around TRENDS_TARGET_POINTS points), e.g. ?range=30d&bucket=1h.
+    temperature/humidity hold bucket averages; *_min/*_max the extremes.
+    format (or the Accept header) selects json, columnar or msgpack.
+    """
+    try:
+        try:
+            range_name, range_seconds, bucket_name, bucket_seconds = parse_trend_params(request.args)
+            fmt = wire_format.negotiate(request.headers.get('Accept'), request.args.get('format'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        since = datetime.now() - timedelta(seconds=range_seconds)
+        query = TRENDS_QUERY.format(bucket='%(bucket)s', city_key='%(city_key)s', since='%(since)s')
+        with db_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, {
+                    'bucket': bucket_seconds,
+                    'city_key': normalize_city_key(city),
+                    'since': since
+                })
+                rows = cursor.fetchall()
+
+        if fmt == 'json':
+            return negotiated_response(trends_payload(range_name, bucket_name, rows), fmt)
+        return negotiated_response(columnar_trends_payload(range_name, bucket_name, bucket_seconds, rows), fmt)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# The collector evaluates the same rules as readings arrive and keeps their
+# history in alert_state; evaluating latest_weather against that state gives
+# the alerts active right now, including rate and sustained rules
+alert_engine = alert_rules.AlertEngine(alert_rules.rules_from_env())
+
+ALERTS_QUERY = f"""
+    SELECT
+        CASE
+            WHEN l.city LIKE '%o Paulo%' THEN 'São Paulo'
+            ELSE l.city
+        END as normalized_city,
+        {', '.join(f'l.{column}' for column in READING_COLUMNS[1:])},
+        s.state
+    FROM latest_weather l
+    LEFT JOIN alert_state s ON s.city_key = l.city_key
+"""
+
+def query_active_alerts():
+    """Evaluate the alert rules over every city's latest reading (cached by alerts_cache)"""
+    with db_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(ALERTS_QUERY)
+            rows = cursor.fetchall()
+
+    readings = [dict(zip(READING_COLUMNS, row[:-1])) for row in rows]
+    state = {normalize_city_key(row[0]): row[-1] for row in rows if row[-1]}
+    alerts, _ = alert_engine.evaluate(readings, state)
+    return alerts
+
+alerts_cache = RefreshingCache(
+    query_active_alerts,
+    ttl=latest_cache.ttl,
+    stale_ttl=latest_cache.stale_ttl,
+    name='alerts'
+)
+
 @app.route('/api/alerts')
 def get_active_alerts():
-    """Generate simple weather alerts"""
+    """Weather alerts currently active under the shared alert rules"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        query = """
-            WITH normalized_cities AS (
-                SELECT 
-                    CASE 
-                        WHEN city LIKE '%o Paulo%' THEN 'São Paulo'
-                        ELSE city 
-                    END as normalized_city,
-                    temperature_f,
-                    wind_speed,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY CASE 
-                            WHEN city LIKE '%o Paulo%' THEN 'São Paulo'
-                            ELSE city 
-                        END 
-                        ORDER BY timestamp DESC
-                    ) as rn
-                FROM weather_readings
-            )
-            SELECT normalized_city, temperature_f, wind_speed
-            FROM normalized_cities
-            WHERE rn = 1
-        """
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-        alerts = []
-        for city, temp, wind in rows:
-            if temp > 95:
-                alerts.append({'type': 'heat', 'city': city, 'message': f'🔥 Heat Alert: {temp}°F'})
-            if temp < 20:
-                alerts.append({'type': 'cold', 'city': city, 'message': f'❄️ Cold Alert: {temp}°F'})
-            if wind > 50:
-                alerts.append({'type': 'wind', 'city': city, 'message': f'💨 High Wind Alert: {wind} mph'})
-
-        cursor.close()
-        conn.close()
-        return jsonify(alerts)
-
+        return jsonify(alerts_cache.get().value)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -300,77 +602,114 @@ def get_weather_icon(condition):
     """Return emoji icon for weather condition"""
     return WEATHER_ICONS.get(condition.lower(), '🌡️')
 
-@app.route('/api/map')
-def get_weather_map():
-    """Generate and serve the Folium weather map"""
-    try:
-        weather_data = get_latest_weather()
-
-        m = folium.Map(
-            location=[20, 0],
-            zoom_start=2,
-            tiles='cartodbpositron',
-            max_bounds=True
-        )
-
-        for city_data in weather_data:
-            city = city_data['city']
-            lat, lon = city_data['latitude'], city_data['longitude']
-            
-            if not lat or not lon or lat == 0 or lon == 0:
+def build_weather_map(weather_data):
+    """Build the Folium weather map for a list of latest readings"""
+    m = folium.Map(
+        location=[20, 0],
+        zoom_start=2,
+        tiles='cartodbpositron',
+        max_bounds=True
+    )
+
+    for city_data in weather_data:
+        city = city_data['city']
+        lat, lon = city_data['latitude'], city_data['longitude']
+        
+        if not lat or not lon or lat == 0 or lon == 0:
+            if instrumentation.log_enabled('DEBUG'):
                 print(f"Skipping {city} - no coordinates")
-                continue
-
-            temp = round(city_data['temperature'])
-            condition = city_data['condition']
-            humidity = city_data['humidity']
-            wind_speed = city_data['wind_speed']
-            feels_like = round(city_data['feels_like'])
-            pressure = city_data['pressure']
-            icon_emoji = get_weather_icon(condition)
-
-            popup_html = f"""
-            <div style="font-family: 'Inter', Arial, sans-serif; min-width: 200px;">
-                <h3 style="margin: 0 0 10px 0; font-size: 1.3em; color: #1d1d1f;">
-                    {icon_emoji} {city}
-                </h3>
-                <div style="font-size: 2.5em; font-weight: 300; margin: 10px 0; color: #0071e3;">
-                    {temp}°F
-                </div>
-                <div style="color: #86868b; margin-bottom: 12px; text-transform: capitalize;">
-                    {condition}
-                </div>
-                <div style="border-top: 1px solid #e5e5e7; padding-top: 10px; font-size: 0.9em;">
-                    <div><strong>Feels like:</strong> {feels_like}°F</div>
-                    <div><strong>Humidity:</strong> {humidity}%</div>
-                    <div><strong>Wind:</strong> {wind_speed} mph</div>
-                    <div><strong>Pressure:</strong> {pressure}</div>
-                </div>
+            continue
+
+        temp = round(city_data['temperature'])
+        condition = city_data['condition']
+        humidity = city_data['humidity']
+        wind_speed = city_data['wind_speed']
+        feels_like = round(city_data['feels_like'])
+        pressure = city_data['pressure']
+        icon_emoji = get_weather_icon(condition)
+
+        popup_html = f"""
+        <div style="font-family: 'Inter', Arial, sans-serif; min-width: 200px;">
+            <h3 style="margin: 0 0 10px 0; font-size: 1.3em; color: #1d1d1f;">
+                {icon_emoji} {city}
+            </h3>
+            <div style="font-size: 2.5em; font-weight: 300; margin: 10px 0; color: #0071e3;">
+                {temp}°F
+            </div>
+            <div style="color: #86868b; margin-bottom: 12px; text-transform: capitalize;">
+                {condition}
             </div>
-            """
-
-            icon_html = f'<div style="font-size: 32px; text-align: center;">{icon_emoji}</div>'
-            icon = folium.DivIcon(html=icon_html)
-
-            folium.Marker(
-                location=[lat, lon],
-                popup=folium.Popup(popup_html, max_width=250),
-                tooltip=f"{city}: {temp}°F",
-                icon=icon
-            ).add_to(m)
-
-        plugins.Fullscreen(
-            position='topright',
-            title='Fullscreen',
-            title_cancel='Exit fullscreen',
-            force_separate_button=True
+            <div style="border-top: 1px solid #e5e5e7; padding-top: 10px; font-size: 0.9em;">
+                <div><strong>Feels like:</strong> {feels_like}°F</div>
+                <div><strong>Humidity:</strong> {humidity}%</div>
+                <div><strong>Wind:</strong> {wind_speed} mph</div>
+                <div><strong>Pressure:</strong> {pressure}</div>
+            </div>
+        </div>
+        """
+
+        icon_html = f'<div style="font-size: 32px; text-align: center;">{icon_emoji}</div>'
+        icon = folium.DivIcon(html=icon_html)
+
+        folium.Marker(
+            location=[lat, lon],
+            popup=folium.Popup(popup_html, max_width=250),
+            tooltip=f"{city}: {temp}°F",
+            icon=icon
         ).add_to(m)
 
-        os.makedirs('static', exist_ok=True)
-        map_path = 'static/weather_map.html'
-        m.save(map_path)
+    plugins.Fullscreen(
+        position='topright',
+        title='Fullscreen',
+        title_cancel='Exit fullscreen',
+        force_separate_button=True
+    ).add_to(m)
+
+    return m
+
+# The rendered map only changes when the latest readings do, so keep one
+# rendering in memory keyed by the readings' ETag instead of re-rendering and
+# rewriting static/weather_map.html on every request
+_map_lock = threading.Lock()
+_rendered_map = None  # (fingerprint, {Content-Encoding or None: body})
+
+def get_rendered_map():
+    """Return (fingerprint, bodies by encoding), re-rendering only when the data changed"""
+    global _rendered_map
+
+    entry = latest_cache.get()
+    rendered = _rendered_map
+    if rendered and rendered[0] == entry.etag:
+        return rendered
+
+    with _map_lock:
+        rendered = _rendered_map
+        if rendered and rendered[0] == entry.etag:
+            return rendered
+
+        html = build_weather_map(entry.value).get_root().render().encode('utf-8')
+        bodies = {None: html, 'gzip': gzip.compress(html)}
+        if wire_format.brotli is not None:
+            # Compressed once per data change, so it can afford maximum quality
+            bodies['br'] = wire_format.brotli.compress(html)
+        _rendered_map = (entry.etag, bodies)
+        return _rendered_map
+
+@app.route('/api/map')
+def get_weather_map():
+    """Serve the Folium weather map from memory"""
+    try:
+        fingerprint, bodies = get_rendered_map()
+
+        encoding = wire_format.choose_encoding(request.headers.get('Accept-Encoding'))
+        response = Response(bodies[encoding], mimetype='text/html')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
 
-        return send_file(map_path, mimetype='text/html')
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(fingerprint, weak=True)
+        return response.make_conditional(request)
 
     except Exception as e:
         print(f"Map error: {str(e)}")
@@ -378,9 +717,38 @@ def get_weather_map():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def health_status():
+    return {
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'db_pool': db_pool.stats(),
+        'latest_cache': latest_cache.stats(),
+        'alerts_cache': alerts_cache.stats(),
+        'live_updates': live_updates.stats(),
+        'forecast_mode': FORECAST_MODE,
+        'forecast_cache': dict(forecast_api.forecast_cache_stats) if forecast_api else None
+    }
+
 @app.route('/health')
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify(health_status())
+
+def health_gauges(status, prefix='weather'):
+    """Numeric health_status() fields as untyped Prometheus samples, e.g. weather_db_pool_checkouts"""
+    lines = []
+    for section, values in status.items():
+        if not isinstance(values, dict):
+            continue
+        for name, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"{prefix}_{section}_{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Span timings (every route, forecast and coordinate lookups) plus pool and cache stats"""
+    body = instrumentation.metrics.prometheus_text() + health_gauges(health_status())
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,304 @@
+"""ASGI entry point serving the dashboard's I/O-bound endpoints asynchronously.
+
+/api/latest and /api/trends query Postgres through an asyncpg pool and the
+forecast routes call the Lambda through httpx, so a slow forecast waits on the
+event loop instead of holding a worker thread that /api/latest and /api/map
+need. Open /api/stream connections likewise wait on the loop. Every other
+route is the Flask app from app.py, run on a bounded thread pool through a
+WSGI adapter.
+
+Needs starlette, uvicorn, asyncpg, httpx and a2wsgi:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import asyncpg
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as dashboard
+import instrumentation
+import wire_format
+from cache import AsyncRefreshingCache
+from live_updates import AsyncQueueSubscriber
+from city_names import normalize_city_key
+
+# Threads for the Flask routes mounted under the async ones
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', '10'))
+FORECAST_HTTP_MAX_CONNECTIONS = int(os.environ.get('FORECAST_HTTP_MAX_CONNECTIONS', '100'))
+
+_db = None
+_db_lock = asyncio.Lock()
+http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=FORECAST_HTTP_MAX_CONNECTIONS))
+
+
+async def get_db():
+    """asyncpg pool sized like the sync one, opened on first use rather than at startup"""
+    global _db
+
+    if _db is None:
+        async with _db_lock:
+            if _db is None:
+                _db = await asyncpg.create_pool(
+                    host=dashboard.DB_CONFIG['host'],
+                    database=dashboard.DB_CONFIG['database'],
+                    user=dashboard.DB_CONFIG['user'],
+                    password=dashboard.DB_CONFIG['password'],
+                    min_size=dashboard.db_pool.min_size,
+                    max_size=dashboard.db_pool.max_size,
+                    timeout=dashboard.db_pool.timeout
+                )
+    return _db
+
+
+async def query_latest_weather():
+    db = await get_db()
+    return [dashboard.latest_reading(row) for row in await db.fetch(dashboard.LATEST_WEATHER_QUERY)]
+
+latest_cache = AsyncRefreshingCache(
+    query_latest_weather,
+    ttl=dashboard.latest_cache.ttl,
+    stale_ttl=dashboard.latest_cache.stale_ttl,
+    name='latest'
+)
+
+
+def json_response(value, status_code=200, headers=None):
+    """JSON encoded by the Flask app's provider, so both serving modes return the same bytes"""
+    return Response(dashboard.app.json.dumps(value), status_code, headers, media_type='application/json')
+
+
+def negotiated_response(request, value, fmt, headers=None):
+    """Counterpart of app.negotiated_response, compressed the way app.compress_response does"""
+    body, mimetype = wire_format.encode(value, fmt, dashboard.app.json.dumps)
+    body, encoding = wire_format.compress(body, mimetype, request.headers.get('accept-encoding'))
+    headers = dict(headers or {}, Vary='Accept, Accept-Encoding')
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, 200, headers, media_type=mimetype)
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag value"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag.removeprefix('W/').strip('"') == etag for tag in tags)
+
+
+async def get_latest_readings(request):
+    try:
+        fmt = wire_format.negotiate(request.headers.get('accept'), request.query_params.get('format'))
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    try:
+        entry = await latest_cache.get()
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+    etag = entry.etag if fmt == 'json' else f'{entry.etag}-{fmt}'
+    headers = {'ETag': f'W/"{etag}"', 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+
+    readings = dashboard.with_local_times(entry.value)
+    return negotiated_response(request, readings if fmt == 'json' else wire_format.columns(readings), fmt, headers)
+
+
+async def get_city_trends(request):
+    try:
+        range_name, range_seconds, bucket_name, bucket_seconds = dashboard.parse_trend_params(request.query_params)
+        fmt = wire_format.negotiate(request.headers.get('accept'), request.query_params.get('format'))
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    try:
+        db = await get_db()
+        rows = await db.fetch(
+            dashboard.TRENDS_QUERY.format(bucket='$1::integer', city_key='$2', since='$3'),
+            bucket_seconds,
+            normalize_city_key(request.path_params['city']),
+            datetime.now() - timedelta(seconds=range_seconds)
+        )
+        if fmt == 'json':
+            return negotiated_response(request, dashboard.trends_payload(range_name, bucket_name, rows), fmt)
+        return negotiated_response(
+            request, dashboard.columnar_trends_payload(range_name, bucket_name, bucket_seconds, rows), fmt)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+async def stream_forecast_api(url, timeout):
+    """Async counterpart of app.stream_forecast_api"""
+    try:
+        upstream = await http_client.send(http_client.build_request('GET', url, timeout=timeout), stream=True)
+    except httpx.TimeoutException:
+        return json_response({'error': 'Request timeout - Lambda did not respond in time'}, 504)
+    if instrumentation.log_enabled('DEBUG'):
+        print(f"Lambda response status: {upstream.status_code}")
+
+    if upstream.status_code != 200:
+        try:
+            error_body = (await upstream.aread()).decode('utf-8') or 'No error body'
+        finally:
+            await upstream.aclose()
+        print(f"Lambda error: {error_body}")
+        return json_response({
+            'error': f'Lambda API returned status {upstream.status_code}',
+            'details': error_body
+        }, upstream.status_code)
+
+    return StreamingResponse(
+        upstream.aiter_bytes(),
+        media_type=upstream.headers.get('content-type', 'application/json'),
+        background=BackgroundTask(upstream.aclose)
+    )
+
+
+def forecast_json(forecast_data):
+    if 'error' in forecast_data:
+        print(f"Error in forecast: {forecast_data['error']}")
+        return json_response(forecast_data, 500)
+    return json_response(forecast_data)
+
+
+async def get_forecast(request):
+    city_normalized = request.path_params['city'].replace('ÃƒÂ£', 'ã').replace('Ã£', 'ã')
+
+    try:
+        forecast_api = dashboard.forecast_api
+        if forecast_api:
+            # The in-process forecast code is synchronous; keep it off the event loop
+            return forecast_json(await run_in_threadpool(
+                forecast_api.fetch_weather_forecast,
+                forecast_api.normalize_city_name(city_normalized),
+                **forecast_api.forecast_options(request.query_params)
+            ))
+
+        url = f'{dashboard.FORECAST_API_URL}/{city_normalized}'
+        options = dashboard.forecast_option_params(request.query_params)
+        if options:
+            url += f'?{urlencode(options)}'
+        if instrumentation.log_enabled('INFO'):
+            print(f"Requesting forecast for {city_normalized} from: {url}")
+        return await stream_forecast_api(url, timeout=15.0)
+
+    except Exception as e:
+        print(f"Forecast error: {str(e)}")
+        return json_response({'error': str(e)}, 500)
+
+
+async def get_forecasts(request):
+    try:
+        cities = dashboard.requested_forecast_cities(request.query_params)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    try:
+        forecast_api = dashboard.forecast_api
+        if forecast_api:
+            return forecast_json(await run_in_threadpool(
+                forecast_api.fetch_weather_forecasts,
+                cities,
+                **forecast_api.forecast_options(request.query_params)
+            ))
+
+        if instrumentation.log_enabled('INFO'):
+            print(f"Requesting forecasts for {len(cities)} cities")
+        return await stream_forecast_api(dashboard.batch_forecast_url(cities, request.query_params), timeout=30.0)
+
+    except Exception as e:
+        print(f"Forecast error: {str(e)}")
+        return json_response({'error': str(e)}, 500)
+
+
+async def stream_latest_readings(request):
+    """Async /api/stream: an open stream costs a queue, not a worker thread"""
+    subscriber = AsyncQueueSubscriber(asyncio.get_running_loop(), dashboard.LIVE_UPDATES_MAX_PENDING)
+
+    async def events():
+        dashboard.live_updates.subscribe(subscriber.deliver)
+        try:
+            yield await run_in_threadpool(dashboard.stream_preamble)
+            while True:
+                yield dashboard.stream_event(await subscriber.get(dashboard.LIVE_UPDATES_HEARTBEAT))
+        finally:
+            dashboard.live_updates.unsubscribe(subscriber.deliver)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers=dashboard.STREAM_HEADERS)
+
+
+async def health_check(request):
+    status = await run_in_threadpool(dashboard.health_status)
+    status['async_latest_cache'] = latest_cache.stats()
+    status['async_db_pool'] = {
+        'size': _db.get_size(),
+        'idle': _db.get_idle_size(),
+        'max_size': _db.get_max_size()
+    } if _db is not None else None
+    return json_response(status)
+
+
+def timed_route(path, endpoint):
+    """Route recording the http_request span app.py's request hooks record for Flask routes"""
+    rule = path.replace('{', '<').replace('}', '>')
+
+    async def timed_endpoint(request):
+        started = time.perf_counter() if instrumentation.metrics.sampled() else None
+        status = 500
+        try:
+            response = await endpoint(request)
+            status = response.status_code
+            return response
+        finally:
+            if started is not None:
+                instrumentation.metrics.observe(
+                    'http_request', time.perf_counter() - started, error=status >= 500,
+                    route=rule, method=request.method, status=str(status))
+
+    return Route(path, timed_endpoint)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    loop = asyncio.get_running_loop()
+
+    def invalidate_latest(event):
+        # New readings landed: drop this app's cached copy too
+        loop.call_soon_threadsafe(latest_cache.invalidate)
+
+    dashboard.live_updates.subscribe(invalidate_latest)
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        if _db is not None:
+            await _db.close()
+
+
+app = Starlette(
+    routes=[
+        timed_route('/api/latest', get_latest_readings),
+        timed_route('/api/trends/{city}', get_city_trends),
+        timed_route('/api/forecast/{city}', get_forecast),
+        timed_route('/api/forecast', get_forecasts),
+        timed_route('/api/stream', stream_latest_readings),
+        timed_route('/health', health_check),
+        Mount('/', WSGIMiddleware(dashboard.app, workers=WSGI_THREADS))
+    ],
+    lifespan=lifespan
+)
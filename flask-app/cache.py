@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+
+class CacheEntry:
+    """A cached value plus the ETag clients can revalidate it with"""
+
+    def __init__(self, value, etag, loaded_at, expires_at):
+        self.value = value
+        self.etag = etag
+        self.loaded_at = loaded_at
+        self.expires_at = expires_at
+
+
+class _Flight:
+    """One in-progress load that concurrent callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+def make_etag(value):
+    """Stable content hash of a JSON-serialisable value"""
+    payload = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+class RefreshingCache:
+    """In-process TTL cache with stale-while-revalidate and single-flight loading.
+
+    Fresh entries are served directly. Entries past their TTL but within
+    `stale_ttl` are served immediately while one background thread reloads
+    them. Misses block, but concurrent misses for a key share one loader call.
+    """
+
+    def __init__(self, loader, ttl=60.0, stale_ttl=600.0, name='cache'):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._errors = 0
+
+    def get(self, *key):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry and now < entry.expires_at:
+                self._hits += 1
+                return entry
+
+            if entry and now < entry.expires_at + self.stale_ttl:
+                self._stale_hits += 1
+                if key not in self._flights:
+                    self._flights[key] = _Flight()
+                    threading.Thread(target=self._load, args=(key,), daemon=True).start()
+                return entry
+
+            self._misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            return self._load(key, raise_errors=True)
+
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.entry
+
+    def _load(self, key, raise_errors=False):
+        with self._lock:
+            flight = self._flights[key]
+
+        try:
+            value = self.loader(*key)
+            loaded_at = time.monotonic()
+            entry = CacheEntry(value, make_etag(value), loaded_at, loaded_at + self.ttl)
+
+            with self._lock:
+                self._entries[key] = entry
+                self._loads += 1
+            flight.entry = entry
+            return entry
+
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            flight.error = e
+            if raise_errors:
+                raise
+            print(f"Background refresh failed for {self.name}{list(key)}: {str(e)}")
+
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, *key):
+        """Drop one key, or every key when called without arguments"""
+        with self._lock:
+            if key:
+                self._entries.pop(key, None)
+            else:
+                self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'stale_hits': self._stale_hits,
+                'misses': self._misses,
+                'loads': self._loads,
+                'errors': self._errors
+            }
+
+
+class AsyncRefreshingCache:
+    """asyncio counterpart of RefreshingCache for the ASGI app, with an async loader.
+
+    Same freshness rules: fresh entries are served directly, stale ones are
+    served while a background task reloads them, and concurrent misses for a
+    key await a single loader call. Only touched from the event loop, so it
+    needs no locks.
+    """
+
+    def __init__(self, loader, ttl=60.0, stale_ttl=600.0, name='cache'):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+
+        self._entries = {}
+        self._flights = {}
+        self._tasks = set()
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._errors = 0
+
+    async def get(self, *key):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+
+        if entry and now < entry.expires_at:
+            self._hits += 1
+            return entry
+
+        if entry and now < entry.expires_at + self.stale_ttl:
+            self._stale_hits += 1
+            if key not in self._flights:
+                self._start_load(key, background=True)
+            return entry
+
+        self._misses += 1
+        flight = self._flights.get(key) or self._start_load(key)
+        return await asyncio.shield(flight)
+
+    def _start_load(self, key, background=False):
+        flight = asyncio.ensure_future(self._load(key))
+        self._flights[key] = flight
+        self._tasks.add(flight)
+
+        def done(task):
+            self._tasks.discard(task)
+            # Reading the exception also stops asyncio warning about it when nobody awaited
+            error = None if task.cancelled() else task.exception()
+            if error is not None and background:
+                print(f"Background refresh failed for {self.name}{list(key)}: {str(error)}")
+
+        flight.add_done_callback(done)
+        return flight
+
+    async def _load(self, key):
+        try:
+            value = await self.loader(*key)
+            loaded_at = time.monotonic()
+            entry = CacheEntry(value, make_etag(value), loaded_at, loaded_at + self.ttl)
+            self._entries[key] = entry
+            self._loads += 1
+            return entry
+
+        except Exception:
+            self._errors += 1
+            raise
+
+        finally:
+            self._flights.pop(key, None)
+
+    def invalidate(self, *key):
+        """Drop one key, or every key when called without arguments"""
+        if key:
+            self._entries.pop(key, None)
+        else:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self._hits,
+            'stale_hits': self._stale_hits,
+            'misses': self._misses,
+            'loads': self._loads,
+            'errors': self._errors
+        }
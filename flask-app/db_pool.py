@@ -0,0 +1,180 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe Postgres connection pool shared by every request in the process"""
+
+    def __init__(self, db_config, min_size=1, max_size=10, timeout=10.0, healthcheck_idle=30.0):
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+
+        self._lock = threading.Condition()
+        self._idle = []  # (connection, returned_at)
+        self._size = 0
+        self._warmed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.db_config)
+        # The dashboard only reads, so skip the implicit BEGIN on every query
+        conn.autocommit = True
+        return conn
+
+    def _warm(self):
+        """Open min_size connections on first use rather than at import time"""
+        self._warmed = True
+        while self._size < self.min_size:
+            self._size += 1
+            try:
+                self._idle.append((self._connect(), time.monotonic()))
+            except Exception:
+                self._size -= 1
+                raise
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+
+        if time.monotonic() - returned_at < self.healthcheck_idle:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        """Check out a healthy connection, blocking up to `timeout` seconds if the pool is full"""
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            conn = None
+            with self._lock:
+                if not self._warmed:
+                    self._warm()
+
+                while not self._idle and self._size >= self.max_size:
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f'No database connection available after {self.timeout}s')
+                    waited = True
+                    self._lock.wait(remaining)
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+                break
+
+            # Health check runs outside the lock so a slow SELECT 1 doesn't stall other requests
+            if self._is_healthy(conn, returned_at):
+                break
+
+            with self._lock:
+                self._size -= 1
+                self._discard(conn)
+                self._lock.notify()
+
+        with self._lock:
+            self._record_checkout(started, waited)
+        return conn
+
+    def _record_checkout(self, started, waited):
+        self._checkouts += 1
+        if waited:
+            wait_time = time.monotonic() - started
+            self._waits += 1
+            self._wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+
+    def putconn(self, conn, broken=False):
+        """Return a connection to the pool, dropping it if it is broken"""
+        if not broken and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        with self._lock:
+            if broken or conn.closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that always hands the connection back, even on exceptions"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def closeall(self):
+        with self._lock:
+            for conn, _ in self._idle:
+                self._size -= 1
+                self._discard(conn)
+            self._idle = []
+            self._warmed = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self._size,
+                'in_use': self._size - len(self._idle),
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': round(self._wait_time, 4),
+                'wait_time_max': round(self._max_wait_time, 4),
+                'timeouts': self._timeouts,
+                'discarded': self._discarded
+            }
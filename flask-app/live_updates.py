@@ -0,0 +1,235 @@
+"""Push changed latest readings to every open dashboard.
+
+One background thread per process notices new data and diffs the latest
+readings against the previous snapshot, so each subscriber (one per open
+/api/stream connection) only receives the cities whose reading changed. The
+thread LISTENs on the channel the collector NOTIFYs after storing a run; with
+source='poll', or while LISTEN is unavailable, it reloads on an interval
+instead. Either way it is one query per process rather than one per tab.
+"""
+import asyncio
+import os
+import queue
+import select
+import threading
+
+import psycopg2
+
+
+class QueueSubscriber:
+    """Events for one streaming client, consumed from a request thread.
+
+    A client that falls more than max_pending events behind has its backlog
+    replaced by a single 'resync' event telling it to refetch everything.
+    """
+
+    def __init__(self, max_pending=20):
+        self._queue = queue.Queue(max_pending)
+
+    def deliver(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._drain()
+            self._queue.put_nowait(('resync', {}))
+
+    def _drain(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get(self, timeout):
+        """Next event, or None after timeout seconds without one"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncQueueSubscriber:
+    """QueueSubscriber for a client served on an asyncio event loop"""
+
+    def __init__(self, loop, max_pending=20):
+        self._loop = loop
+        self._queue = asyncio.Queue(max_pending)
+
+    def deliver(self, event):
+        # Called from the broadcaster thread; asyncio.Queue belongs to the loop
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(('resync', {}))
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class UpdateBroadcaster:
+    """Fans out ('readings', {'etag', 'changed', 'removed'}) events when `cache` changes.
+
+    `cache` is the RefreshingCache holding the latest readings (a list of
+    dicts keyed by 'city'); refreshing through it also updates what
+    /api/latest and /api/map serve. The watcher thread starts with the first
+    subscriber and stops, closing its LISTEN connection, when the last one
+    leaves; the next subscriber starts a new one.
+    """
+
+    def __init__(self, cache, db_config, channel, source='listen', poll_interval=60.0):
+        self.cache = cache
+        self.db_config = db_config
+        self.channel = channel
+        self.source = source
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._stop = None
+        self._wake_write = None
+        self._snapshot = None
+
+        self._listening = False
+        self._notifications = 0
+        self._refreshes = 0
+        self._events = 0
+        self._errors = 0
+
+    def subscribe(self, deliver):
+        """Register deliver(event); it runs on the watcher thread and must not block"""
+        with self._lock:
+            self._subscribers.add(deliver)
+            if self._thread is None:
+                # Closing the pipe's write end wakes the watcher out of select()
+                wake_read, self._wake_write = os.pipe()
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop, wake_read),
+                                                name='live-updates', daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, deliver):
+        with self._lock:
+            self._subscribers.discard(deliver)
+            if not self._subscribers and self._thread is not None:
+                self._stop.set()
+                os.close(self._wake_write)
+                self._thread = self._stop = self._wake_write = None
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._events += 1
+        for deliver in subscribers:
+            try:
+                deliver(event)
+            except Exception as e:
+                print(f"Dropping live-update subscriber: {str(e)}")
+                self.unsubscribe(deliver)
+
+    def refresh(self):
+        """Reload the readings and publish whatever changed since the last snapshot"""
+        self.cache.invalidate()
+        readings = self.cache.get()
+        with self._lock:
+            self._refreshes += 1
+
+        current = {reading['city']: reading for reading in readings.value}
+        previous = self._snapshot
+        self._snapshot = current
+        if previous is None:
+            return
+
+        changed = [reading for city, reading in current.items() if previous.get(city) != reading]
+        removed = [city for city in previous if city not in current]
+        if changed or removed:
+            self.publish(('readings', {'etag': readings.etag, 'changed': changed, 'removed': removed}))
+
+    def _safe_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            print(f"Live-update refresh failed: {str(e)}")
+
+    def _run(self, stop, wake):
+        """Watcher thread; returns once `stop` is set, which also makes `wake` readable"""
+        try:
+            # Baseline on what clients have already been served, so anything that
+            # landed before the first subscriber is pushed by the first refresh
+            try:
+                self._snapshot = {reading['city']: reading for reading in self.cache.get().value}
+            except Exception as e:
+                print(f"Live-update baseline failed: {str(e)}")
+            self._safe_refresh()
+
+            while not stop.is_set():
+                if self.source == 'listen':
+                    try:
+                        self._listen(stop, wake)
+                    except Exception as e:
+                        with self._lock:
+                            self._errors += 1
+                        print(f"LISTEN {self.channel} failed, polling until it reconnects: {str(e)}")
+                # Poll mode, or the LISTEN connection dropped: reload on the interval
+                select.select([wake], [], [], self.poll_interval)
+                if not stop.is_set():
+                    self._safe_refresh()
+        finally:
+            os.close(wake)
+
+    def _listen(self, stop, wake):
+        if stop.is_set():
+            return
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            self._listening = True
+            # Catch up on anything stored while we weren't listening
+            self._safe_refresh()
+
+            while True:
+                # The timeout doubles as a periodic resync in case a NOTIFY is missed
+                ready = select.select([conn, wake], [], [], self.poll_interval)[0]
+                if stop.is_set():
+                    return
+                if ready:
+                    conn.poll()
+                    if not conn.notifies:
+                        continue
+                    with self._lock:
+                        self._notifications += len(conn.notifies)
+                    conn.notifies.clear()
+                self._safe_refresh()
+        finally:
+            self._listening = False
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'source': self.source,
+                'watching': self._thread is not None,
+                'listening': self._listening,
+                'subscribers': len(self._subscribers),
+                'notifications': self._notifications,
+                'refreshes': self._refreshes,
+                'events': self._events,
+                'errors': self._errors
+            }
+
+
+def format_event(name, data, dumps):
+    """One server-sent event; `dumps` serializes data to a single line of JSON"""
+    return f"event: {name}\ndata: {dumps(data)}\n\n"
@@ -1,5 +1,10 @@
 let weatherChart = null;
 let currentWeatherData = [];
+let currentEtag = null;
+let pollTimer = null;
+
+// Fallback refresh while the live-update stream is unavailable
+const POLL_INTERVAL = 10 * 60 * 1000;
 
 const weatherIcons = {
     'clear sky': '☀️',
@@ -22,6 +27,19 @@ function getWeatherIcon(condition) {
     return weatherIcons[condition.toLowerCase()] || '🌡️';
 }
 
+function formatLocalTime(weather) {
+    if (!weather.timezone) return weather.local_time;
+    try {
+        return new Date().toLocaleTimeString('en-US', {
+            timeZone: weather.timezone,
+            hour: '2-digit',
+            minute: '2-digit'
+        });
+    } catch (error) {
+        return weather.local_time;
+    }
+}
+
 function getWeatherClass(condition) {
     const cond = condition.toLowerCase();
     if (cond.includes('clear')) return 'clear-sky';
@@ -177,71 +195,120 @@ async function loadWeatherData() {
             return;
         }
 
-        currentWeatherData = data;
+        currentEtag = parseEtag(response.headers.get('ETag'));
+        renderWeatherData(data);
 
-        const insights = generateInsights(data);
-        displayInsights(insights);
+    } catch (error) {
+        console.error('Error:', error);
+        document.getElementById('weatherCards').innerHTML =
+            '<div class="loading">⚠️ Error loading data</div>';
+    }
+}
 
-        // FIXED: Use local_time from API instead of timestamp
-        const cardsHTML = data.map(w => `
-            <div class="weather-card ${getWeatherClass(w.condition)}">
-                <div class="card-header">
-                    <div class="city-info">
-                        <div class="city-name">${w.city}</div>
-                        <div class="local-time">${w.local_time}</div>
-                    </div>
+function parseEtag(header) {
+    return header ? header.replace(/^W\//, '').replace(/"/g, '') : null;
+}
+
+function renderCitySelect(select, placeholder, data) {
+    const selected = select.value;
+    select.innerHTML = `<option value="">${placeholder}</option>` +
+        data.map(w => `<option value="${w.city}">${w.city}</option>`).join('');
+    select.value = selected;
+}
+
+function renderWeatherData(data) {
+    currentWeatherData = data;
+
+    const insights = generateInsights(data);
+    displayInsights(insights);
+
+    // FIXED: Use local_time from API instead of timestamp
+    const cardsHTML = data.map(w => `
+        <div class="weather-card ${getWeatherClass(w.condition)}">
+            <div class="card-header">
+                <div class="city-info">
+                    <div class="city-name">${w.city}</div>
+                    <div class="local-time">${formatLocalTime(w)}</div>
+                </div>
+            </div>
+            <div class="temperature-display">
+                <div class="temperature">${Math.round(w.temperature)}°</div>
+                <div class="feels-like">Feels like ${Math.round(w.feels_like || w.temperature)}°</div>
+                <div class="condition">${w.condition}</div>
+            </div>
+            <div class="weather-details">
+                <div class="detail-item">
+                    <span class="detail-label">Humidity</span>
+                    <span class="detail-value">${w.humidity}%</span>
                 </div>
-                <div class="temperature-display">
-                    <div class="temperature">${Math.round(w.temperature)}°</div>
-                    <div class="feels-like">Feels like ${Math.round(w.feels_like || w.temperature)}°</div>
-                    <div class="condition">${w.condition}</div>
+                <div class="detail-item">
+                    <span class="detail-label">Wind</span>
+                    <span class="detail-value">${w.wind_speed} mph</span>
                 </div>
-                <div class="weather-details">
-                    <div class="detail-item">
-                        <span class="detail-label">Humidity</span>
-                        <span class="detail-value">${w.humidity}%</span>
-                    </div>
-                    <div class="detail-item">
-                        <span class="detail-label">Wind</span>
-                        <span class="detail-value">${w.wind_speed} mph</span>
-                    </div>
+            </div>
+            <div class="extra-details">
+                <div class="detail-item">
+                    <span class="detail-label">Pressure</span>
+                    <span class="detail-value">${w.pressure || 'N/A'}</span>
                 </div>
-                <div class="extra-details">
-                    <div class="detail-item">
-                        <span class="detail-label">Pressure</span>
-                        <span class="detail-value">${w.pressure || 'N/A'}</span>
-                    </div>
-                    <div class="detail-item">
-                        <span class="detail-label">Visibility</span>
-                        <span class="detail-value">${w.visibility ? (w.visibility / 1000).toFixed(1) + ' km' : 'N/A'}</span>
-                    </div>
+                <div class="detail-item">
+                    <span class="detail-label">Visibility</span>
+                    <span class="detail-value">${w.visibility ? (w.visibility / 1000).toFixed(1) + ' km' : 'N/A'}</span>
                 </div>
             </div>
-        `).join('');
+        </div>
+    `).join('');
 
-        document.getElementById('weatherCards').innerHTML = cardsHTML;
+    document.getElementById('weatherCards').innerHTML = cardsHTML;
 
-        const select = document.getElementById('citySelect');
-        const forecastSelect = document.getElementById('forecastCitySelect');
-        const cityOptions = '<option value="">Select a city</option>' +
-            data.map(w => `<option value="${w.city}">${w.city}</option>`).join('');
-        
-        select.innerHTML = cityOptions;
-        forecastSelect.innerHTML = '<option value="">Choose a city</option>' +
-            data.map(w => `<option value="${w.city}">${w.city}</option>`).join('');
+    renderCitySelect(document.getElementById('citySelect'), 'Select a city', data);
+    renderCitySelect(document.getElementById('forecastCitySelect'), 'Choose a city', data);
 
-        document.getElementById('lastUpdate').textContent = new Date().toLocaleString();
+    document.getElementById('lastUpdate').textContent = new Date().toLocaleString();
 
-        const mapIframe = document.getElementById('weatherMap');
-        mapIframe.src = mapIframe.src;
+    const mapIframe = document.getElementById('weatherMap');
+    mapIframe.src = mapIframe.src;
+}
 
-    } catch (error) {
-        console.error('Error:', error);
-        document.getElementById('weatherCards').innerHTML =
-            '<div class="loading">⚠️ Error loading data</div>';
+// Merge a pushed delta (only the cities whose reading changed) into the page
+function applyReadingsDelta(delta) {
+    const byCity = new Map(currentWeatherData.map(w => [w.city, w]));
+    delta.removed.forEach(city => byCity.delete(city));
+    delta.changed.forEach(w => byCity.set(w.city, w));
+
+    currentEtag = delta.etag;
+    renderWeatherData([...byCity.values()].sort((a, b) => a.city.localeCompare(b.city)));
+}
+
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(loadWeatherData, POLL_INTERVAL);
     }
 }
 
+function startLiveUpdates() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const source = new EventSource('/api/stream');
+
+    source.addEventListener('hello', (e) => {
+        // Readings changed between our fetch and the stream opening
+        if (JSON.parse(e.data).etag !== currentEtag) loadWeatherData();
+    });
+    source.addEventListener('readings', (e) => applyReadingsDelta(JSON.parse(e.data)));
+    source.addEventListener('resync', () => loadWeatherData());
+
+    // EventSource reconnects by itself; poll meanwhile so the page never goes stale
+    source.onopen = () => {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    };
+    source.onerror = startPolling;
+}
+
 // FIXED: Use Flask proxy instead of calling Lambda directly
 async function loadForecast(city) {
     if (!city) {
@@ -320,6 +387,32 @@ function updateChartTheme() {
     weatherChart.update();
 }
 
+const COLUMNAR_JSON = 'application/vnd.weather.columnar+json';
+const TREND_SERIES = ['temperature', 'temperature_min', 'temperature_max', 'humidity', 'humidity_min', 'humidity_max'];
+
+function undelta(values, scale = 1) {
+    let previous = 0;
+    return values.map(v => v === null ? null : (previous += v) / scale);
+}
+
+// Expand a columnar trends payload into the plain JSON shape (UTC 'MM/DD HH:mm' labels)
+function decodeColumnarTrends(payload) {
+    const pad = (n) => String(n).padStart(2, '0');
+    const data = {
+        range: payload.range,
+        bucket: payload.bucket,
+        labels: undelta(payload.time).map(offset => {
+            const date = new Date((payload.start + offset * payload.step) * 1000);
+            return `${pad(date.getUTCMonth() + 1)}/${pad(date.getUTCDate())} ` +
+                `${pad(date.getUTCHours())}:${pad(date.getUTCMinutes())}`;
+        })
+    };
+    TREND_SERIES.forEach(name => {
+        data[name] = undelta(payload[name], payload.scale);
+    });
+    return data;
+}
+
 async function loadTrends(city) {
     if (!city) {
         if (weatherChart) {
@@ -330,8 +423,15 @@ async function loadTrends(city) {
     }
 
     try {
-        const response = await fetch(`/api/trends/${encodeURIComponent(city)}`);
-        const data = await response.json();
+        const rangeSelect = document.getElementById('dateRangeSelect');
+        const rangeDays = rangeSelect ? parseInt(rangeSelect.value) : 7;
+        const response = await fetch(`/api/trends/${encodeURIComponent(city)}?range=${rangeDays}d`, {
+            headers: { 'Accept': `${COLUMNAR_JSON}, application/json;q=0.9` }
+        });
+        const payload = await response.json();
+        const data = (response.headers.get('Content-Type') || '').startsWith(COLUMNAR_JSON)
+            ? decodeColumnarTrends(payload)
+            : payload;
 
         if (data.error) {
             console.error('Error loading trends:', data.error);
@@ -576,7 +676,7 @@ async function loadTrends(city) {
 function initApp() {
     initThemeToggle();
     createAnimatedBackground();
-    loadWeatherData();
+    loadWeatherData().then(startLiveUpdates);
 
     document.getElementById('citySelect').addEventListener('change', (e) => {
         loadTrends(e.target.value);
@@ -595,8 +695,6 @@ function initApp() {
     document.getElementById('forecastCitySelect').addEventListener('change', (e) => {
         loadForecast(e.target.value);
     });
-
-    setInterval(loadWeatherData, 10 * 60 * 1000);
 }
 
 document.addEventListener('DOMContentLoaded', initApp);
@@ -0,0 +1,148 @@
+"""Response encodings: a faster JSON provider, compact columnar payloads and compression.
+
+Clients pick a representation with the Accept header or ?format=:
+
+- json      application/json, the original row-per-object shape
+- columnar  application/vnd.weather.columnar+json, one array per field with
+            integer time offsets and delta-encoded series
+- msgpack   application/msgpack, the columnar payload as MessagePack
+
+orjson, brotli and msgpack are optional. Without them the app keeps Flask's
+stdlib JSON encoder, compresses with gzip only and doesn't offer msgpack.
+"""
+import calendar
+import gzip
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import Accept, MIMEAccept
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.weather.columnar+json'
+MSGPACK = 'application/msgpack'
+FORMATS = {'json': JSON, 'columnar': COLUMNAR_JSON, 'msgpack': MSGPACK}
+
+# Bodies below this many bytes aren't worth compressing
+COMPRESS_MIN_SIZE = 512
+COMPRESSIBLE_TYPES = {JSON, COLUMNAR_JSON, MSGPACK}
+GZIP_LEVEL = 6
+# Brotli's default (11) is meant for static assets; 5 compresses dynamic
+# responses about as well as gzip -9 in a fraction of the time
+BROTLI_QUALITY = 5
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Keeps the default provider's sorted keys and its fallbacks for dates,
+    decimals and dataclasses, but writes UTF-8 instead of \\u escapes.
+    """
+
+    def _encode(self, obj, indent=False):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self._encode(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def negotiate(accept, requested=None):
+    """'json', 'columnar' or 'msgpack' from ?format= or else the Accept header; raises ValueError"""
+    if requested:
+        if requested not in FORMATS or (requested == 'msgpack' and msgpack is None):
+            raise ValueError(f"Unsupported format '{requested}' (use {', '.join(offered_formats())})")
+        return requested
+
+    offered = [FORMATS[name] for name in offered_formats()]
+    best = parse_accept_header(accept, MIMEAccept).best_match(offered, default=JSON)
+    return next(name for name, mimetype in FORMATS.items() if mimetype == best)
+
+
+def offered_formats():
+    return ['json', 'columnar'] + (['msgpack'] if msgpack is not None else [])
+
+
+def encode(value, fmt, dumps):
+    """(body bytes, mimetype) of value in the negotiated format; `dumps` serializes JSON"""
+    if fmt == 'msgpack':
+        return msgpack.packb(value), MSGPACK
+    return dumps(value).encode('utf-8'), FORMATS[fmt]
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header"""
+    accepted = parse_accept_header(accept_encoding, Accept)
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress(body, mimetype, accept_encoding):
+    """(body, Content-Encoding or None): compresses worthwhile bodies the client accepts"""
+    if mimetype not in COMPRESSIBLE_TYPES or len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), encoding
+    if encoding == 'gzip':
+        return gzip.compress(body, GZIP_LEVEL), encoding
+    return body, None
+
+
+def epoch_seconds(timestamp):
+    """Unix time of a naive UTC datetime"""
+    return calendar.timegm(timestamp.timetuple())
+
+
+def delta_encode(values, scale=1):
+    """round(value * scale) as differences from the previous non-null value; nulls stay null.
+
+    Slowly changing series become runs of small integers, which are shorter
+    as text and compress far better than the floats they replace.
+    """
+    encoded = []
+    previous = 0
+    for value in values:
+        if value is None:
+            encoded.append(None)
+            continue
+        scaled = round(value * scale)
+        encoded.append(scaled - previous)
+        previous = scaled
+    return encoded
+
+
+def columns(rows):
+    """Columnar form of a list of same-shaped dicts: {'count': n, field: [values]}"""
+    fields = sorted({field for row in rows for field in row})
+    result = {field: [row.get(field) for row in rows] for field in fields}
+    result['count'] = len(rows)
+    return result
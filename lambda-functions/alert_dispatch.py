@@ -0,0 +1,251 @@
+"""Deduplicated, coalesced alert notifications.
+
+AlertDispatcher decides which active alerts (from alert_rules.py) need a
+notification, using a per city+type record in alert_notifications:
+
+- an alert that is already notified and still active stays quiet (or is
+  repeated every remind_after seconds, when set)
+- an alert counts as cleared only after clear_after seconds without firing,
+  so a value hovering around a threshold doesn't re-alert every run
+- the same city+type is notified at most once per cooldown seconds; an
+  episode that starts inside the cooldown stays pending and is notified once
+  the cooldown has passed, if it is still firing
+
+Due alerts are routed to topics (every route whose types/cities match),
+coalesced into messages of at most max_message_bytes, and sent with SNS
+publish_batch, up to 10 messages or 256 KB per call. Records of alerts whose
+messages failed are left unchanged, so those alerts are retried on the next
+run. LocalPublisher stands in for SNS in tests and offline runs.
+"""
+import json
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+from alert_rules import notification_text
+from city_names import normalize_city_key
+
+# SNS publish_batch limits
+SNS_BATCH_MAX_ENTRIES = 10
+SNS_BATCH_MAX_BYTES = 256 * 1024
+
+MESSAGE_HEADER = "⚠️ WEATHER ALERTS ⚠️\n\n"
+MESSAGE_SUBJECT = 'Weather Alert Notification'
+
+
+class SnsPublisher:
+    """Publishes through an SNS client's publish_batch"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def publish_batch(self, topic, entries):
+        """Send up to SNS_BATCH_MAX_ENTRIES {'Id', 'Subject', 'Message'} entries; returns the failed Ids"""
+        response = self.client.publish_batch(TopicArn=topic, PublishBatchRequestEntries=entries)
+        for failure in response.get('Failed', []):
+            print(f"SNS rejected alert message {failure['Id']}: {failure.get('Code')} {failure.get('Message')}")
+        return {failure['Id'] for failure in response.get('Failed', [])}
+
+
+class LocalPublisher:
+    """Stand-in for SNS that keeps every batch in memory and optionally appends it to an NDJSON file"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.batches = []
+
+    def publish_batch(self, topic, entries):
+        self.batches.append((topic, entries))
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'topic': topic, 'entries': entries}, ensure_ascii=False) + '\n')
+        return set()
+
+
+def load_routes(source, default_topic):
+    """Routes from ALERT_ROUTES-style JSON, or one catch-all route to default_topic.
+
+    Each route is {"topic": arn, "types": [...], "cities": [...]}; a missing
+    types or cities list matches everything.
+    """
+    routes = json.loads(source) if source else [{'topic': default_topic}]
+    for route in routes:
+        if not route.get('topic'):
+            raise ValueError(f"Alert route without a topic: {route!r}")
+    return [{
+        'topic': route['topic'],
+        'types': set(route['types']) if route.get('types') else None,
+        'cities': {normalize_city_key(city) for city in route['cities']} if route.get('cities') else None
+    } for route in routes]
+
+
+def chunk_lines(lines, max_bytes):
+    """Split lines into chunks whose message (MESSAGE_HEADER + lines) fits in max_bytes of UTF-8"""
+    chunks, chunk = [], []
+    size = len(MESSAGE_HEADER.encode('utf-8'))
+    for line in lines:
+        line_size = len(line.encode('utf-8')) + 1
+        if chunk and size + line_size > max_bytes:
+            chunks.append(chunk)
+            chunk, size = [], len(MESSAGE_HEADER.encode('utf-8'))
+        chunk.append(line)
+        size += line_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def pack_batches(entries):
+    """Group entries into publish_batch calls within SNS's entry and size limits"""
+    batch, size = [], 0
+    for entry in entries:
+        entry_size = len(entry['Message'].encode('utf-8')) + len(entry['Subject'].encode('utf-8'))
+        if batch and (len(batch) == SNS_BATCH_MAX_ENTRIES or size + entry_size > SNS_BATCH_MAX_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(entry)
+        size += entry_size
+    if batch:
+        yield batch
+
+
+class AlertDispatcher:
+    """Notifies each city+type once per episode, coalescing what's due into few publish_batch calls"""
+
+    def __init__(self, publisher, routes, cooldown=21600, clear_after=3600, remind_after=0,
+                 max_message_bytes=SNS_BATCH_MAX_BYTES // SNS_BATCH_MAX_ENTRIES):
+        self.publisher = publisher
+        self.routes = routes
+        self.cooldown = timedelta(seconds=cooldown)
+        self.clear_after = timedelta(seconds=clear_after)
+        self.remind_after = timedelta(seconds=remind_after) if remind_after else None
+        self.max_message_bytes = max_message_bytes
+
+    def dispatch(self, conn, alerts, city_keys, now=None):
+        """Notify what's due among `alerts`, the active alerts for the cities in city_keys.
+
+        Commits the updated notification records. Returns counts of alerts
+        notified and suppressed and of messages and publish_batch calls sent.
+        """
+        now = now or datetime.now()
+        cursor = conn.cursor()
+        try:
+            records = self._load(cursor, city_keys)
+            due, updates, suppressed = self._plan(alerts, records, now)
+            failed, messages, calls = self._publish(due)
+
+            for alert in due:
+                key = (alert['city_key'], alert['type'])
+                if key in failed:
+                    # Leave the record as it was so the next run tries again
+                    updates.pop(key, None)
+                else:
+                    updates[key] = dict(updates[key], notified_at=now)
+
+            self._save(cursor, updates)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        return {
+            'notified': len(due) - len(failed),
+            'suppressed': suppressed,
+            'messages': messages,
+            'publish_calls': calls
+        }
+
+    def _load(self, cursor, city_keys):
+        cursor.execute("""
+            SELECT city_key, alert_type, active, notified_at, last_seen
+            FROM alert_notifications
+            WHERE city_key = ANY(%s)
+            FOR UPDATE
+        """, (list(city_keys),))
+        return {(row[0], row[1]): {'active': row[2], 'notified_at': row[3], 'last_seen': row[4]}
+                for row in cursor.fetchall()}
+
+    def _plan(self, alerts, records, now):
+        due, updates, suppressed = [], {}, 0
+        firing = set()
+
+        for alert in alerts:
+            key = (alert['city_key'], alert['type'])
+            if key in firing:
+                continue
+            firing.add(key)
+            record = records.get(key)
+            notified_at = record['notified_at'] if record else None
+            active = bool(record and record['active'])
+
+            if active:
+                notify = (self.remind_after is not None and notified_at is not None
+                          and now - notified_at >= self.remind_after)
+            else:
+                notify = notified_at is None or now - notified_at >= self.cooldown
+
+            # An episode becomes active once notified; one held back by the
+            # cooldown stays pending so the cooldown is checked again next run
+            updates[key] = {'active': active or notify, 'notified_at': notified_at, 'last_seen': now}
+
+            if notify:
+                due.append(alert)
+            else:
+                suppressed += 1
+
+        # Hysteresis: an episode ends only after clear_after without firing
+        for key, record in records.items():
+            if key not in firing and record['active'] and now - record['last_seen'] >= self.clear_after:
+                updates[key] = dict(record, active=False)
+
+        return due, updates, suppressed
+
+    def _publish(self, due):
+        """Returns (keys of alerts with a failed message, messages sent, publish_batch calls)"""
+        by_topic = {}
+        for alert in due:
+            for route in self.routes:
+                if ((route['types'] is None or alert['type'] in route['types']) and
+                        (route['cities'] is None or alert['city_key'] in route['cities'])):
+                    by_topic.setdefault(route['topic'], []).append(alert)
+
+        failed, messages, calls = set(), 0, 0
+        for topic, topic_alerts in by_topic.items():
+            # One message per chunk of lines; remember which alerts each one carries
+            entries, carried = [], {}
+            lines = [notification_text(alert) for alert in topic_alerts]
+            position = 0
+            for index, chunk in enumerate(chunk_lines(lines, self.max_message_bytes)):
+                entry_id = f"alerts-{index}"
+                entries.append({'Id': entry_id, 'Subject': MESSAGE_SUBJECT, 'Message': MESSAGE_HEADER + '\n'.join(chunk)})
+                carried[entry_id] = topic_alerts[position:position + len(chunk)]
+                position += len(chunk)
+
+            for batch in pack_batches(entries):
+                try:
+                    failed_ids = self.publisher.publish_batch(topic, batch)
+                except Exception as e:
+                    print(f"Error publishing alerts to {topic}: {str(e)}")
+                    failed_ids = {entry['Id'] for entry in batch}
+                calls += 1
+                messages += len(batch) - len(failed_ids)
+                for entry_id in failed_ids:
+                    failed.update((alert['city_key'], alert['type']) for alert in carried[entry_id])
+
+        return failed, messages, calls
+
+    def _save(self, cursor, updates):
+        if not updates:
+            return
+        execute_values(cursor, """
+            INSERT INTO alert_notifications (city_key, alert_type, active, notified_at, last_seen)
+            VALUES %s
+            ON CONFLICT (city_key, alert_type) DO UPDATE SET
+                active = EXCLUDED.active,
+                notified_at = EXCLUDED.notified_at,
+                last_seen = EXCLUDED.last_seen
+        """, [(key[0], key[1], record['active'], record['notified_at'], record['last_seen'])
+              for key, record in updates.items()],
+            page_size=len(updates))
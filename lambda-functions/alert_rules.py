@@ -0,0 +1,358 @@
+"""Declarative weather alert rules, compiled once and evaluated over whole batches.
+
+Every rule compares one reading field against a value, optionally overridden
+per city (an override of null turns the rule off for that city):
+
+- threshold       the field itself, e.g. temperature_f > 95
+- rate_of_change  the field's change per hour since the city's previous
+                  reading, e.g. temperature_f < -10 (a fast drop); readings
+                  more than max_gap seconds apart (default 3h) don't count
+- sustained       a threshold that has held for at least `duration` seconds
+
+The collector and the dashboard build an AlertEngine from the same rules
+(DEFAULT_RULES, or ALERT_RULES: a JSON list or the path of a JSON file).
+With NumPy installed, a batch is evaluated as one rules x cities matrix, so
+the cost per cell stays flat as rules and cities grow; small batches, and
+every batch when NumPy is missing, go through an equivalent Python loop.
+
+Rate and sustained rules need history, kept per city in alert_state: the
+last reading the rules saw, the one before it, and since when each sustained
+condition has held. Evaluating a reading already in the state gives the same
+result as when it was first applied, so the dashboard can evaluate the
+latest readings against the state the collector stored.
+"""
+import calendar
+import json
+import math
+import operator
+import os
+
+from psycopg2.extras import execute_values
+
+from city_names import normalize_city_key
+from optional_numpy import load_numpy
+
+OPS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+KINDS = ('threshold', 'rate_of_change', 'sustained')
+DEFAULT_MAX_GAP = 3 * 3600
+
+# Smallest rules x cities batch where the NumPy pass beats the Python loop
+# (see benchmarks/bench_alert_rules.py)
+NUMPY_MIN_CELLS = 256
+
+DEFAULT_RULES = [
+    {'name': 'heat', 'kind': 'threshold', 'field': 'temperature_f', 'op': '>', 'value': 95,
+     'icon': '🔥', 'title': 'Heat Alert', 'unit': '°F'},
+    {'name': 'cold', 'kind': 'threshold', 'field': 'temperature_f', 'op': '<', 'value': 20,
+     'icon': '❄️', 'title': 'Cold Alert', 'unit': '°F'},
+    {'name': 'wind', 'kind': 'threshold', 'field': 'wind_speed', 'op': '>', 'value': 50,
+     'icon': '💨', 'title': 'High Wind Alert', 'unit': ' mph'},
+]
+
+
+def load_rules(source=None):
+    """Rules from a JSON list, a path to a JSON file, or DEFAULT_RULES when source is empty"""
+    if not source:
+        return DEFAULT_RULES
+    if source.lstrip().startswith('['):
+        return json.loads(source)
+    with open(source, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def rules_from_env():
+    return load_rules(os.environ.get('ALERT_RULES'))
+
+
+def _validate(rule):
+    name = rule.get('name')
+    if not name:
+        raise ValueError(f"Alert rule without a name: {rule!r}")
+    if rule.get('kind', 'threshold') not in KINDS:
+        raise ValueError(f"Alert rule {name}: kind must be one of {', '.join(KINDS)}")
+    if rule.get('op') not in OPS:
+        raise ValueError(f"Alert rule {name}: op must be one of {', '.join(OPS)}")
+    if not rule.get('field') or not isinstance(rule.get('value'), (int, float)):
+        raise ValueError(f"Alert rule {name}: needs a field and a numeric value")
+    if rule.get('kind') == 'sustained' and not rule.get('duration'):
+        raise ValueError(f"Alert rule {name}: sustained rules need a duration in seconds")
+
+    return dict({
+        'kind': 'threshold',
+        'icon': '⚠️',
+        'title': name.replace('_', ' ').title(),
+        'unit': '',
+        'duration': 0,
+        'max_gap': DEFAULT_MAX_GAP,
+        'overrides': {}
+    }, **rule)
+
+
+def epoch_seconds(timestamp):
+    """Unix time of a naive UTC datetime, as the collector stores them"""
+    return calendar.timegm(timestamp.timetuple()) + timestamp.microsecond / 1e6
+
+
+def alert_message(alert):
+    """Dashboard wording, e.g. '🔥 Heat Alert: 97.3°F'"""
+    return f"{alert['icon']} {alert['title']}: {alert['value']}{alert['unit']}"
+
+
+def notification_text(alert):
+    """Notification wording, e.g. '🔥 HEAT ALERT: Dubai - 97.3°F'"""
+    return f"{alert['icon']} {alert['title'].upper()}: {alert['city']} - {alert['value']}{alert['unit']}"
+
+
+class AlertEngine:
+    """A compiled rule set; evaluate() runs every rule over a batch of readings"""
+
+    def __init__(self, rules):
+        self.rules = [_validate(rule) for rule in rules]
+        names = [rule['name'] for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Alert rule names must be unique")
+
+        self.rule_index = {name: index for index, name in enumerate(names)}
+        self.fields = sorted({rule['field'] for rule in self.rules})
+        field_index = {field: index for index, field in enumerate(self.fields)}
+
+        # Per-rule columns, in rule order
+        self.rule_fields = [field_index[rule['field']] for rule in self.rules]
+        self.values = [float(rule['value']) for rule in self.rules]
+        self.ops = [rule['op'] for rule in self.rules]
+        self.is_rate = [rule['kind'] == 'rate_of_change' for rule in self.rules]
+        self.is_sustained = [rule['kind'] == 'sustained' for rule in self.rules]
+        self.durations = [float(rule['duration']) for rule in self.rules]
+        self.max_gaps = [float(rule['max_gap']) for rule in self.rules]
+        self.has_sustained = any(self.is_sustained)
+
+        # city_key -> [(rule index, value or NaN to disable)]
+        self.overrides = {}
+        for index, rule in enumerate(self.rules):
+            for city, value in rule['overrides'].items():
+                self.overrides.setdefault(normalize_city_key(city), []).append(
+                    (index, math.nan if value is None else float(value)))
+
+        self._np_compiled = False
+
+    def _compile_numpy(self):
+        np = load_numpy()
+        self._np_fields = np.array(self.rule_fields, dtype=np.int64)
+        self._np_values = np.array(self.values, dtype=np.float64)
+        self._np_ops = {op: np.array([rule_op == op for rule_op in self.ops]) for op in set(self.ops)}
+        self._np_rate = np.array(self.is_rate)
+        self._np_sustained = np.array(self.is_sustained)
+        self._np_durations = np.array(self.durations, dtype=np.float64)
+        self._np_max_gaps = np.array(self.max_gaps, dtype=np.float64)
+        self._np_compiled = True
+
+    def evaluate(self, readings, state=None):
+        """Alerts for a batch of readings, plus the state to store for those cities.
+
+        readings are weather_readings-shaped dicts (city, timestamp and the
+        rule fields); state maps city_key to what a previous evaluate()
+        returned. Readings older than their city's state are skipped. Returns
+        (alerts ordered by city then rule, {city_key: new state}).
+        """
+        batch = self._prepare(readings, state or {})
+        if not batch['cities']:
+            return [], {}
+
+        cells = len(self.rules) * len(batch['cities'])
+        if cells >= NUMPY_MIN_CELLS and load_numpy() is not None:
+            active, since = self._evaluate_numpy(batch)
+        else:
+            active, since = self._evaluate_python(batch)
+        return self._alerts(batch, active), self._new_state(batch, since)
+
+    def _prepare(self, readings, state):
+        cities, now, current, previous, previous_at, since = [], [], [], [], [], []
+        for reading in readings:
+            key = normalize_city_key(reading['city'])
+            at = epoch_seconds(reading['timestamp'])
+            stored = state.get(key)
+
+            if stored is None:
+                base = None
+            elif at == stored['timestamp']:
+                # Already applied: compare against the reading before it
+                base = stored.get('prior')
+            elif at > stored['timestamp']:
+                base = {'timestamp': stored['timestamp'], 'values': stored['values']}
+            else:
+                continue
+
+            column = len(cities)
+            cities.append((key, reading, stored))
+            now.append(at)
+            current.append([_number(reading.get(field)) for field in self.fields])
+            previous.append([_number(base['values'].get(field)) if base else math.nan for field in self.fields])
+            previous_at.append(base['timestamp'] if base else math.nan)
+            if stored:
+                for name, started in stored.get('since', {}).items():
+                    if name in self.rule_index:
+                        since.append((self.rule_index[name], column, started))
+
+        return {
+            'cities': cities,
+            'now': now,
+            'current': current,
+            'previous': previous,
+            'previous_at': previous_at,
+            'since': since
+        }
+
+    def _evaluate_numpy(self, batch):
+        """(active (rule, column, observed) cells, sustained since cells) as one matrix pass"""
+        np = load_numpy()
+        if not self._np_compiled:
+            self._compile_numpy()
+        columns = len(batch['cities'])
+        now = np.array(batch['now'])
+        current = np.array(batch['current']).T  # fields x cities
+        previous = np.array(batch['previous']).T
+        elapsed = now - np.array(batch['previous_at'])
+
+        observed = current[self._np_fields]  # rules x cities
+        if self._np_rate.any():
+            rates = (current - previous)[self._np_fields] / (elapsed / 3600)
+            rates[:, ~(elapsed > 0)] = np.nan
+            rates[elapsed[None, :] > self._np_max_gaps[:, None]] = np.nan
+            observed = np.where(self._np_rate[:, None], rates, observed)
+
+        thresholds = np.repeat(self._np_values[:, None], columns, axis=1)
+        for column, (key, _, _) in enumerate(batch['cities']):
+            for rule, value in self.overrides.get(key, ()):
+                thresholds[rule, column] = value
+
+        # NaN on either side (missing field, no history, disabled) never matches
+        condition = np.zeros(observed.shape, dtype=bool)
+        for op, rows in self._np_ops.items():
+            condition[rows] = OPS[op](observed[rows], thresholds[rows])
+
+        active = condition
+        since_cells = []
+        if self.has_sustained:
+            since = np.full(observed.shape, np.nan)
+            for rule, column, started in batch['since']:
+                since[rule, column] = started
+            since = np.where(condition, np.where(np.isnan(since), now[None, :], since), np.nan)
+            since[~self._np_sustained] = np.nan
+            held = (now[None, :] - since) >= self._np_durations[:, None]
+            active = np.where(self._np_sustained[:, None], condition & held, condition)
+            rules, cols = np.nonzero(~np.isnan(since))
+            since_cells = list(zip(rules.tolist(), cols.tolist(), since[rules, cols].tolist()))
+
+        cols, rules = np.nonzero(active.T)
+        active_cells = list(zip(rules.tolist(), cols.tolist(), observed[rules, cols].tolist()))
+        return active_cells, since_cells
+
+    def _evaluate_python(self, batch):
+        stored_since = {(rule, column): started for rule, column, started in batch['since']}
+        active_cells, since_cells = [], []
+
+        for column, (key, _, _) in enumerate(batch['cities']):
+            now = batch['now'][column]
+            elapsed = now - batch['previous_at'][column]
+            overrides = dict(self.overrides.get(key, ()))
+
+            for rule, field in enumerate(self.rule_fields):
+                observed = batch['current'][column][field]
+                if self.is_rate[rule]:
+                    if elapsed > 0 and elapsed <= self.max_gaps[rule]:
+                        observed = (observed - batch['previous'][column][field]) / (elapsed / 3600)
+                    else:
+                        observed = math.nan
+
+                threshold = overrides.get(rule, self.values[rule])
+                condition = OPS[self.ops[rule]](observed, threshold)
+
+                if self.is_sustained[rule]:
+                    if not condition:
+                        continue
+                    started = stored_since.get((rule, column), now)
+                    since_cells.append((rule, column, started))
+                    condition = now - started >= self.durations[rule]
+
+                if condition:
+                    active_cells.append((rule, column, observed))
+
+        return active_cells, since_cells
+
+    def _alerts(self, batch, active):
+        alerts = []
+        for rule_index, column, observed in active:
+            rule = self.rules[rule_index]
+            key, reading, _ = batch['cities'][column]
+            alert = {
+                'type': rule['name'],
+                'city': reading['city'],
+                'city_key': key,
+                'value': round(observed, 2),
+                'icon': rule['icon'],
+                'title': rule['title'],
+                'unit': rule['unit']
+            }
+            alert['message'] = alert_message(alert)
+            alerts.append(alert)
+        return alerts
+
+    def _new_state(self, batch, since):
+        since_by_column = {}
+        for rule, column, started in since:
+            since_by_column.setdefault(column, {})[self.rules[rule]['name']] = started
+
+        state = {}
+        for column, (key, _, stored) in enumerate(batch['cities']):
+            now = batch['now'][column]
+            if stored and stored['timestamp'] == now:
+                prior = stored.get('prior')
+            elif stored:
+                prior = {'timestamp': stored['timestamp'], 'values': stored['values']}
+            else:
+                prior = None
+
+            values = {field: value for field, value in zip(self.fields, batch['current'][column])
+                      if not math.isnan(value)}
+            state[key] = {
+                'timestamp': now,
+                'values': values,
+                'prior': prior,
+                'since': since_by_column.get(column, {})
+            }
+        return state
+
+
+def _number(value):
+    return math.nan if value is None else float(value)
+
+
+def load_state(cursor, city_keys, lock=False):
+    """Stored alert state for city_keys; lock=True holds the rows until commit"""
+    cursor.execute(
+        "SELECT city_key, state FROM alert_state WHERE city_key = ANY(%s)" + (" FOR UPDATE" if lock else ""),
+        (list(city_keys),)
+    )
+    return {key: state for key, state in cursor.fetchall()}
+
+
+def save_state(cursor, state):
+    if not state:
+        return
+    execute_values(cursor, """
+        INSERT INTO alert_state (city_key, state, updated_at)
+        VALUES %s
+        ON CONFLICT (city_key) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+    """, [(key, json.dumps(city_state)) for key, city_state in state.items()],
+        template="(%s, %s::jsonb, NOW())", page_size=len(state))
+
+
+def evaluate_and_store(cursor, engine, readings):
+    """Evaluate readings against their cities' stored state and save the new state.
+
+    Runs inside the caller's transaction so alert state moves with the readings.
+    """
+    state = load_state(cursor, {normalize_city_key(reading['city']) for reading in readings}, lock=True)
+    alerts, new_state = engine.evaluate(readings, state)
+    save_state(cursor, new_state)
+    return alerts
@@ -0,0 +1,9 @@
+import unicodedata
+
+
+def normalize_city_key(city):
+    """Case/accent-insensitive key so 'São Paulo', 'Sao Paulo' and mojibake variants collide"""
+    city = city.replace('ÃƒÂ£', 'ã').replace('Ã£', 'ã')
+    decomposed = unicodedata.normalize('NFKD', city)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.lower().split())
@@ -0,0 +1,269 @@
+"""Hourly and daily summaries of an OpenWeatherMap 5-day / 3-hour forecast.
+
+A forecast is summarized in one pass that fills a bucket per day, so the
+basic statistics (min/max/avg temperature, humidity, wind, rain chance) cost
+no more than the loop they replaced. Temperature percentiles and dew point are
+only computed when asked for with extended=True. For extended summaries of
+large batches, NumPy aggregates every forecast in one vectorized pass; below
+NUMPY_MIN_BATCH, and for basic summaries at any size, its per-call overhead
+loses to the plain loop (see benchmarks/bench_forecast_aggregation.py).
+
+Days are UTC calendar days (the dates in `dt_txt`) by default, or the city's
+local days when local_days=True, using the `city.timezone` offset upstream
+returns with every forecast.
+"""
+import math
+from datetime import date
+
+from optional_numpy import load_numpy
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Numeric columns pulled out of each forecast step, in array column order
+COLUMNS = ('dt', 'temperature', 'humidity', 'wind_speed', 'pop')
+DT, TEMPERATURE, HUMIDITY, WIND_SPEED, POP = range(len(COLUMNS))
+
+# Daily temperature percentiles reported as temp_p<q>
+PERCENTILES = (10, 90)
+
+# Smallest batch where the NumPy pass beats the pure-Python one on extended
+# summaries (see benchmarks/bench_forecast_aggregation.py); it never does on basic ones
+NUMPY_MIN_BATCH = 20
+
+# Magnus dew point coefficients (°C)
+MAGNUS_B = 17.62
+MAGNUS_C = 243.12
+
+# (offset, scale) taking each unit system's temperature to °C
+CELSIUS_OFFSETS = {'imperial': (32, 5 / 9), 'standard': (273.15, 1), 'metric': (0, 1)}
+
+
+def hourly_forecast(data, count=24):
+    """The first `count` forecast steps in the dashboard's hourly shape"""
+    return [{
+        'timestamp': item['dt_txt'],
+        'temperature': item['main']['temp'],
+        'feels_like': item['main']['feels_like'],
+        'temp_min': item['main']['temp_min'],
+        'temp_max': item['main']['temp_max'],
+        'humidity': item['main']['humidity'],
+        'pressure': item['main']['pressure'],
+        'condition': item['weather'][0]['description'],
+        'wind_speed': item['wind']['speed'],
+        'pop': item.get('pop', 0) * 100
+    } for item in data.get('list', [])[:count]]
+
+
+def _parse_rows(data):
+    """One pass over the upstream list: numeric rows plus the condition per step"""
+    rows = []
+    conditions = []
+    for item in data.get('list', []):
+        main = item['main']
+        rows.append((item['dt'], main['temp'], main['humidity'], item['wind']['speed'], item.get('pop', 0) * 100))
+        conditions.append(item['weather'][0]['description'])
+    return rows, conditions
+
+
+def _day_offset(data, local_days):
+    return data.get('city', {}).get('timezone', 0) if local_days else 0
+
+
+def _to_celsius(temp, units):
+    if units == 'imperial':
+        return (temp - 32) * 5 / 9
+    if units == 'standard':
+        return temp - 273.15
+    return temp
+
+
+def _from_celsius(temp, units):
+    if units == 'imperial':
+        return temp * 9 / 5 + 32
+    if units == 'standard':
+        return temp + 273.15
+    return temp
+
+
+def _grouped_percentiles(values, starts, counts, percentiles):
+    """Linear-interpolated percentiles of each group, for all groups at once.
+
+    Each group is laid out as one row padded with +inf (at most 8 steps per
+    day), sorted along the row, and the two neighbours of every percentile
+    position are gathered by index.
+    """
+    np = load_numpy()
+    group = np.repeat(np.arange(len(starts)), counts)
+    padded = np.full((len(starts), counts.max()), np.inf)
+    padded[group, np.arange(len(values)) - starts[group]] = values
+    padded.sort(axis=1)
+
+    rows = np.arange(len(starts))
+    result = []
+    for q in percentiles:
+        position = (counts - 1) * (q / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+        low, high = padded[rows, lower], padded[rows, upper]
+        result.append(low + (high - low) * (position - lower))
+    return result
+
+
+def daily_summaries_numpy(payloads, days=5, local_days=False, units='imperial', extended=False):
+    """daily_summary for many forecasts in one vectorized pass, grouped by (forecast, day)"""
+    np = load_numpy()
+    rows, conditions, owner, offsets = [], [], [], []
+    for index, data in enumerate(payloads):
+        payload_rows, payload_conditions = _parse_rows(data)
+        rows.extend(payload_rows)
+        conditions.extend(payload_conditions)
+        owner.extend([index] * len(payload_rows))
+        offsets.append(_day_offset(data, local_days))
+
+    summaries = [[] for _ in payloads]
+    if not rows:
+        return summaries
+
+    values = np.array(rows, dtype=np.float64)
+    owner = np.array(owner, dtype=np.int64)
+    order = np.lexsort((values[:, DT], owner))
+    values, owner = values[order], owner[order]
+    conditions = [conditions[i] for i in order.tolist()]
+
+    day = (values[:, DT].astype(np.int64) + np.array(offsets, dtype=np.int64)[owner]) // SECONDS_PER_DAY
+    boundary = np.flatnonzero((np.diff(owner) != 0) | (np.diff(day) != 0)) + 1
+    starts = np.concatenate(([0], boundary))
+    counts = np.diff(np.append(starts, len(day)))
+
+    temperature = values[:, TEMPERATURE]
+    humidity = values[:, HUMIDITY]
+
+    columns = {
+        'date': day[starts].astype('datetime64[D]').astype(str).tolist(),
+        'temp_min': np.minimum.reduceat(temperature, starts).tolist(),
+        'temp_max': np.maximum.reduceat(temperature, starts).tolist(),
+        'temp_avg': (np.add.reduceat(temperature, starts) / counts).tolist(),
+        'condition': [conditions[i] for i in (starts + counts // 2).tolist()],
+        'humidity_avg': (np.add.reduceat(humidity, starts) / counts).tolist(),
+        'wind_speed_avg': (np.add.reduceat(values[:, WIND_SPEED], starts) / counts).tolist(),
+        'pop_max': np.maximum.reduceat(values[:, POP], starts).tolist()
+    }
+    if extended:
+        for q, column in zip(PERCENTILES, _grouped_percentiles(temperature, starts, counts, PERCENTILES)):
+            columns[f'temp_p{q}'] = column.tolist()
+        celsius = _to_celsius(temperature, units)
+        gamma = np.log(np.clip(humidity, 1, 100) / 100) + MAGNUS_B * celsius / (MAGNUS_C + celsius)
+        dew_point = _from_celsius(MAGNUS_C * gamma / (MAGNUS_B - gamma), units)
+        columns['dew_point_avg'] = (np.add.reduceat(dew_point, starts) / counts).tolist()
+
+    for index, day_summary in zip(owner[starts].tolist(), zip(*columns.values())):
+        if len(summaries[index]) < days:
+            summaries[index].append(dict(zip(columns, day_summary)))
+    return summaries
+
+
+def daily_summary_numpy(data, days=5, local_days=False, units='imperial', extended=False):
+    return daily_summaries_numpy([data], days=days, local_days=local_days, units=units, extended=extended)[0]
+
+
+def _percentile(values, q):
+    """Linear-interpolated percentile of sorted values (NumPy's default method)"""
+    position = (len(values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _dew_point_avg(temps, humidities, units):
+    """Mean Magnus dew point of paired readings, in `units`"""
+    # Going back from °C is affine, so it is applied once to the mean
+    shift, scale = CELSIUS_OFFSETS.get(units, (0, 1))
+    log = math.log
+    total = 0.0
+    for temp, humidity in zip(temps, humidities):
+        celsius = (temp - shift) * scale
+        humidity = 1 if humidity < 1 else 100 if humidity > 100 else humidity
+        gamma = log(humidity / 100) + MAGNUS_B * celsius / (MAGNUS_C + celsius)
+        total += MAGNUS_C * gamma / (MAGNUS_B - gamma)
+    return _from_celsius(total / len(temps), units)
+
+
+def _fill_buckets(items, offset):
+    """{day number: (temps, humidities, wind speeds, pops, conditions)} in one pass over the steps.
+
+    Returns None when the steps aren't in time order, which upstream never
+    sends but the median-step condition depends on.
+    """
+    buckets = {}
+    last_dt = None
+    for item in items:
+        dt = item['dt']
+        if last_dt is not None and dt < last_dt:
+            return None
+        last_dt = dt
+
+        day_number = (dt + offset) // SECONDS_PER_DAY
+        bucket = buckets.get(day_number)
+        if bucket is None:
+            bucket = buckets[day_number] = ([], [], [], [], [])
+        main = item['main']
+        bucket[0].append(main['temp'])
+        bucket[1].append(main['humidity'])
+        bucket[2].append(item['wind']['speed'])
+        bucket[3].append(item.get('pop', 0))
+        bucket[4].append(item['weather'][0]['description'])
+    return buckets
+
+
+def daily_summary_python(data, days=5, local_days=False, units='imperial', extended=False):
+    items = data.get('list', [])
+    offset = _day_offset(data, local_days)
+    buckets = _fill_buckets(items, offset)
+    if buckets is None:
+        buckets = _fill_buckets(sorted(items, key=lambda item: item['dt']), offset)
+
+    summary = []
+    for day_number in sorted(buckets)[:days]:
+        temps, humidities, winds, pops, conditions = buckets[day_number]
+        count = len(temps)
+        day = {
+            'date': date.fromordinal(EPOCH_ORDINAL + day_number).isoformat(),
+            'temp_min': min(temps),
+            'temp_max': max(temps),
+            'temp_avg': sum(temps) / count,
+            'condition': conditions[count // 2],
+            'humidity_avg': sum(humidities) / count,
+            'wind_speed_avg': sum(winds) / count,
+            'pop_max': max(pops) * 100
+        }
+        if extended:
+            ordered = sorted(temps)
+            for q in PERCENTILES:
+                day[f'temp_p{q}'] = _percentile(ordered, q)
+            day['dew_point_avg'] = _dew_point_avg(temps, humidities, units)
+        summary.append(day)
+
+    return summary
+
+
+def daily_summaries_python(payloads, days=5, local_days=False, units='imperial', extended=False):
+    return [daily_summary_python(data, days=days, local_days=local_days, units=units, extended=extended)
+            for data in payloads]
+
+
+def daily_summary(data, days=5, local_days=False, units='imperial', extended=False):
+    """Per-day min/max/avg temperature, humidity, wind and rain chance.
+
+    extended adds temperature percentiles (temp_p<q>) and the average dew point.
+    """
+    return daily_summary_python(data, days=days, local_days=local_days, units=units, extended=extended)
+
+
+def daily_summaries(payloads, days=5, local_days=False, units='imperial', extended=False):
+    """daily_summary for each of several forecasts; NumPy takes extended batches big enough to win"""
+    if extended and len(payloads) >= NUMPY_MIN_BATCH and load_numpy() is not None:
+        engine = daily_summaries_numpy
+    else:
+        engine = daily_summaries_python
+    return engine(payloads, days=days, local_days=local_days, units=units, extended=extended)
@@ -0,0 +1,210 @@
+"""Timing spans and log-level gating shared by the Lambdas and the dashboard.
+
+Code on the hot path wraps the work it wants timed:
+
+    with instrumentation.span('store_in_rds'):
+        ...
+
+or decorates a function with @instrumentation.timed('fetch_weather'). Every
+span lands in the process-wide `metrics` registry, which keeps a cumulative
+histogram per span name and label set. The Lambdas write the span timings
+since their last flush as CloudWatch Embedded Metric Format lines at the end of
+each invocation (flush_emf). The dashboard serves the histograms in
+Prometheus text format at /metrics (prometheus_text).
+
+METRICS_SAMPLE_RATE (0-1, default 1) is the fraction of spans that are
+timed. A skipped span costs one random() call, though its errors are still
+counted. LOG_LEVEL (DEBUG, INFO, WARNING or ERROR; default INFO) gates every
+informational print: per-item detail and payload dumps go under
+`if log_enabled('DEBUG'):`, per-request progress under
+`if log_enabled('INFO'):`, so a disabled line never builds its message.
+Errors are printed unconditionally.
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+LOG_LEVEL = LOG_LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LOG_LEVELS['INFO'])
+
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1'))
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'WeatherDashboard')
+
+# Histogram bucket upper bounds in seconds, for /metrics
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# CloudWatch accepts at most 100 values per metric in one EMF document. Raw
+# values waiting for flush_emf are capped per series so a process that never
+# flushes (the dashboard) holds a bounded amount.
+EMF_MAX_VALUES = 100
+PENDING_MAX_VALUES = 1000
+EMF_UNITS = {'Duration': 'Milliseconds', 'Errors': 'Count'}
+
+
+def log_enabled(level):
+    """Whether messages at `level` pass LOG_LEVEL"""
+    return LOG_LEVELS[level] >= LOG_LEVEL
+
+
+class _Series:
+    """Histogram and error count of one span name + label set"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.pending = []
+        self.pending_errors = 0
+
+
+class Metrics:
+    """Thread-safe registry of span timings"""
+
+    def __init__(self, sample_rate=METRICS_SAMPLE_RATE, namespace=METRICS_NAMESPACE):
+        self.sample_rate = sample_rate
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def sampled(self):
+        """Whether to time the next span, per sample_rate"""
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def _get(self, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    def observe(self, name, seconds, error=False, **labels):
+        """Record one span of `seconds`"""
+        with self._lock:
+            series = self._get(name, labels)
+            series.buckets[bisect_left(BUCKETS, seconds)] += 1
+            series.count += 1
+            series.sum += seconds
+            if len(series.pending) < PENDING_MAX_VALUES:
+                series.pending.append(seconds * 1000)
+            if error:
+                series.errors += 1
+                series.pending_errors += 1
+
+    def count_error(self, name, **labels):
+        with self._lock:
+            series = self._get(name, labels)
+            series.errors += 1
+            series.pending_errors += 1
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the block as span `name`; exceptions count as errors and propagate"""
+        if not self.sampled():
+            try:
+                yield
+            except BaseException:
+                self.count_error(name, **labels)
+                raise
+            return
+
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, error, **labels)
+
+    def flush_emf(self, service):
+        """Print the spans recorded since the last flush as EMF lines and forget them"""
+        with self._lock:
+            drained = []
+            for (name, labels), series in self._series.items():
+                if series.pending or series.pending_errors:
+                    drained.append((name, labels, series.pending, series.pending_errors))
+                    series.pending, series.pending_errors = [], 0
+
+        timestamp = int(time.time() * 1000)
+        for name, labels, values, errors in drained:
+            dimensions = ['Service', 'Span'] + [key for key, _ in labels]
+            # One document per EMF_MAX_VALUES durations; errors go on the first. A
+            # series with only errors (all its spans sampled out) has no Duration.
+            for start in range(0, max(len(values), 1), EMF_MAX_VALUES):
+                chunk = values[start:start + EMF_MAX_VALUES]
+                names = (['Duration'] if chunk else []) + ['Errors']
+                document = {
+                    '_aws': {
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [{
+                            'Namespace': self.namespace,
+                            'Dimensions': [dimensions],
+                            'Metrics': [{'Name': metric, 'Unit': EMF_UNITS[metric]} for metric in names]
+                        }]
+                    },
+                    'Service': service,
+                    'Span': name,
+                    'Errors': errors if start == 0 else 0
+                }
+                if chunk:
+                    document['Duration'] = [round(value, 3) for value in chunk]
+                document.update(labels)
+                print(json.dumps(document))
+
+    def prometheus_text(self, prefix='weather'):
+        """Every series as Prometheus histograms, `<prefix>_<span>_seconds`, plus error counters"""
+        with self._lock:
+            snapshot = [(name, labels, list(series.buckets), series.count, series.sum, series.errors)
+                        for (name, labels), series in sorted(self._series.items())]
+
+        lines = []
+        for name in sorted({name for name, *_ in snapshot}):
+            series = [entry for entry in snapshot if entry[0] == name]
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for _, labels, buckets, count, total, _ in series:
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+                    cumulative += bucket
+                    lines.append(f"{metric}_bucket{_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(labels)} {total}")
+                lines.append(f"{metric}_count{_labels(labels)} {count}")
+
+            lines.append(f"# TYPE {prefix}_{name}_errors_total counter")
+            for _, labels, _, _, _, errors in series:
+                lines.append(f"{prefix}_{name}_errors_total{_labels(labels)} {errors}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+metrics = Metrics()
+
+
+def span(name, **labels):
+    """metrics.span on the process-wide registry"""
+    return metrics.span(name, **labels)
+
+
+def timed(name):
+    """Decorator timing every call of a function as span `name`"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,23 @@
+"""NumPy, imported the first time a vectorized path is worth taking.
+
+alert_rules and forecast_aggregation only switch to NumPy for batches big
+enough to amortize its per-call overhead, so a cold start that only sees
+small batches shouldn't pay for the import. load_numpy() imports it once per
+process, remembering a failed import too, and every caller shares the result.
+"""
+_numpy = None
+_loaded = False
+
+
+def load_numpy():
+    """The numpy module, imported on first call; None when it isn't installed"""
+    global _numpy, _loaded
+
+    if not _loaded:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+        _loaded = True
+    return _numpy
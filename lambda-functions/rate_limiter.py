@@ -0,0 +1,143 @@
+import email.utils
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import urllib3
+
+# Statuses worth retrying: throttling and transient upstream failures
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no request token becomes available within the caller's max wait"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until `tokens` are available; returns False if that would take longer than `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                else:
+                    wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds`, e.g. after the upstream answered 429"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class RetryBudget:
+    """Caps the total number of retries spent across one run or invocation"""
+
+    def __init__(self, retries):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def spend(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def request_with_retries(http, method, url, bucket=None, budget=None, max_attempts=3,
+                         base_delay=0.5, max_delay=8.0, max_retry_after=30.0, max_wait=None, **kwargs):
+    """http.request() behind a token bucket, retrying throttled/transient failures.
+
+    Honours Retry-After (and pauses the shared bucket on 429), backs off with
+    jitter otherwise, and stops when `max_attempts` or the shared `budget` is
+    exhausted or the server asks us to wait longer than `max_retry_after`.
+    Returns the last response, or re-raises the last connection/timeout error.
+    Raises RateLimitExceeded if a token isn't available within `max_wait`.
+    """
+    attempt = 0
+    path = urlparse(url).path  # never log the query string, it carries the API key
+
+    while True:
+        if bucket is not None and not bucket.acquire(timeout=max_wait):
+            raise RateLimitExceeded(f"No request token available for {path} within {max_wait}s")
+
+        error = None
+        response = None
+        try:
+            response = http.request(method, url, retries=False, **kwargs)
+        except urllib3.exceptions.HTTPError as e:
+            error = e
+
+        if response is not None and response.status not in RETRY_STATUSES:
+            return response
+
+        attempt += 1
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+
+        if (attempt >= max_attempts
+                or (retry_after is not None and retry_after > max_retry_after)
+                or (budget is not None and not budget.spend())):
+            if error is not None:
+                raise error
+            return response
+
+        delay = retry_after if retry_after is not None else backoff_delay(attempt, base_delay, max_delay)
+        if response is not None and response.status == 429 and bucket is not None:
+            bucket.pause(delay)
+
+        reason = f"status {response.status}" if response is not None else type(error).__name__
+        print(f"Retrying {method} {path} in {delay:.2f}s after {reason} (attempt {attempt + 1}/{max_attempts})")
+        time.sleep(delay)
@@ -0,0 +1,274 @@
+"""Batched raw-weather archive: one compressed object per collection run.
+
+Each run writes `<prefix>/runs/YYYY/MM/DD/<run_id>.<format>` holding one
+record per city ({"city", "fetched_at", "data"}) plus a
+`<run_id>.manifest.json` index. The run_id is the run's start time to the
+microsecond plus a random suffix, so keys sort by start time and two runs
+never share one. Formats:
+
+- ndjson.gz  newline-delimited JSON in independently gzipped blocks (default)
+- ndjson.zst the same with zstandard blocks (needs the `zstandard` package)
+- parquet    a single columnar table (needs `pyarrow`)
+
+For the block formats the manifest records each block's byte offset and length
+and each city's block and line, so one city can be read back with a ranged GET.
+"""
+import gzip
+import io
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import instrumentation
+
+FORMATS = ('ndjson.gz', 'ndjson.zst', 'parquet')
+
+
+class S3Backend:
+    """Archive storage in an S3 bucket.
+
+    The client is created on first use (by client_factory, or boto3 by
+    default), so a run that never writes doesn't import boto3.
+    """
+
+    def __init__(self, bucket, client=None, client_factory=None):
+        self.bucket = bucket
+        self._client = client
+        self._client_factory = client_factory
+
+    @property
+    def client(self):
+        if self._client is None:
+            if self._client_factory is not None:
+                self._client = self._client_factory()
+            else:
+                import boto3
+                self._client = boto3.client('s3')
+        return self._client
+
+    def put(self, key, body, content_type='application/octet-stream'):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+
+    def get(self, key, start=None, length=None):
+        kwargs = {'Bucket': self.bucket, 'Key': key}
+        if start is not None:
+            kwargs['Range'] = f"bytes={start}-{start + length - 1}"
+        return self.client.get_object(**kwargs)['Body'].read()
+
+    def list(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key']
+
+
+class LocalBackend:
+    """Archive storage in a local directory, for offline runs and tests"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key, body, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body if isinstance(body, bytes) else body.encode('utf-8'))
+
+    def get(self, key, start=None, length=None):
+        with open(self._path(key), 'rb') as f:
+            if start is None:
+                return f.read()
+            f.seek(start)
+            return f.read(length)
+
+    def list(self, prefix):
+        # Walk in sorted order so keys come back lexicographically, like S3 listings
+        base = self._path(prefix.rstrip('/'))
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                rel = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                yield rel.replace(os.sep, '/')
+
+
+def _compress(payload, fmt):
+    if fmt == 'ndjson.gz':
+        return gzip.compress(payload)
+    import zstandard
+    return zstandard.ZstdCompressor().compress(payload)
+
+
+def _decompress(payload, fmt):
+    if fmt == 'ndjson.gz':
+        return gzip.decompress(payload)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompress(payload)
+
+
+class RawArchiveWriter:
+    """Buffers one run's raw API responses and writes them as a single archive object"""
+
+    def __init__(self, backend, prefix='raw-weather-data', fmt='ndjson.gz', block_size=100):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown raw archive format: {fmt}")
+        self.backend = backend
+        self.prefix = prefix
+        self.fmt = fmt
+        self.block_size = block_size
+        self.started_at = datetime.now()
+        # Runs starting in the same second (a retry, an overlapping schedule)
+        # must not overwrite each other's archive
+        self.run_id = f"{self.started_at:%Y%m%d_%H%M%S_%f}_{uuid.uuid4().hex[:8]}"
+        self._records = []
+        self._lock = threading.Lock()
+
+    def add(self, city, data, fetched_at=None):
+        """Buffer one city's raw response (thread-safe)"""
+        record = {'city': city, 'fetched_at': (fetched_at or datetime.now()).isoformat(), 'data': data}
+        with self._lock:
+            self._records.append(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def flush(self):
+        """Write the buffered records and their manifest; returns the data key, or None if empty"""
+        with self._lock:
+            records, self._records = self._records, []
+
+        if not records:
+            return None
+
+        base = f"{self.prefix}/runs/{self.started_at:%Y/%m/%d}/{self.run_id}"
+        key = f"{base}.{self.fmt}"
+
+        if self.fmt == 'parquet':
+            body, manifest = self._encode_parquet(records)
+        else:
+            body, manifest = self._encode_blocks(records)
+
+        manifest.update({
+            'key': key,
+            'format': self.fmt,
+            'run_id': self.run_id,
+            'run_started_at': self.started_at.isoformat(),
+            'records': len(records),
+            'bytes': len(body)
+        })
+
+        # Data first: a manifest must never point at an object that isn't there
+        self.backend.put(key, body)
+        self.backend.put(f"{base}.manifest.json", json.dumps(manifest), 'application/json')
+        if instrumentation.log_enabled('INFO'):
+            print(f"Stored {len(records)} raw records in {key} ({len(body)} bytes)")
+        return key
+
+    def _encode_blocks(self, records):
+        out = io.BytesIO()
+        blocks = []
+        cities = {}
+
+        for start in range(0, len(records), self.block_size):
+            block = records[start:start + self.block_size]
+            payload = ''.join(json.dumps(record) + '\n' for record in block).encode('utf-8')
+            compressed = _compress(payload, self.fmt)
+
+            for line, record in enumerate(block):
+                cities[record['city']] = [len(blocks), line]
+            blocks.append([out.tell(), len(compressed)])
+            out.write(compressed)
+
+        return out.getvalue(), {'blocks': blocks, 'cities': cities}
+
+    def _encode_parquet(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            'city': [record['city'] for record in records],
+            'fetched_at': [record['fetched_at'] for record in records],
+            'data': [json.dumps(record['data']) for record in records]
+        })
+        out = io.BytesIO()
+        pq.write_table(table, out, compression='zstd')
+        return out.getvalue(), {'cities': {record['city']: [0, row] for row, record in enumerate(records)}}
+
+
+def load_manifest(backend, key):
+    """Manifest for an archive data key"""
+    base = key.rsplit('.', 2 if key.endswith(('.ndjson.gz', '.ndjson.zst')) else 1)[0]
+    return json.loads(backend.get(f"{base}.manifest.json"))
+
+
+def iter_records(backend, key, manifest=None, on_error=None):
+    """Stream the records of one archive, one decompressed block at a time.
+
+    An undecodable record or block raises, unless on_error is given: then it
+    is called with the exception and the record (or block) is skipped.
+    """
+    manifest = manifest or load_manifest(backend, key)
+
+    if manifest['format'] == 'parquet':
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(io.BytesIO(backend.get(key)))
+        for batch in parquet.iter_batches():
+            for row in batch.to_pylist():
+                try:
+                    data = json.loads(row['data'])
+                except ValueError as e:
+                    if on_error is None:
+                        raise
+                    on_error(e)
+                    continue
+                yield {'city': row['city'], 'fetched_at': row['fetched_at'], 'data': data}
+        return
+
+    for offset, length in manifest['blocks']:
+        try:
+            lines = _decompress(backend.get(key, offset, length), manifest['format']).decode('utf-8').splitlines()
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(e)
+            continue
+        for line in lines:
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+                continue
+            yield record
+
+
+def read_city(backend, key, city, manifest=None):
+    """Fetch a single city's record using the manifest (one ranged read for block formats)"""
+    manifest = manifest or load_manifest(backend, key)
+    position = manifest['cities'].get(city)
+    if position is None:
+        return None
+
+    if manifest['format'] == 'parquet':
+        for index, record in enumerate(iter_records(backend, key, manifest)):
+            if index == position[1]:
+                return record
+        return None
+
+    block, line = position
+    offset, length = manifest['blocks'][block]
+    payload = _decompress(backend.get(key, offset, length), manifest['format'])
+    return json.loads(payload.decode('utf-8').splitlines()[line])
+
+
+def list_archives(backend, prefix='raw-weather-data'):
+    """Data keys of every batched archive under prefix, oldest first"""
+    keys = [key for key in backend.list(f"{prefix}/runs/") if key.endswith(tuple(f".{fmt}" for fmt in FORMATS))]
+    return sorted(keys)
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+READING_COLUMNS = (
+    'city', 'timestamp', 'temperature_f', 'feels_like', 'humidity', 'pressure',
+    'wind_speed', 'visibility', 'condition', 'latitude', 'longitude'
+)
+
+def process_weather_data(data, timestamp=None):
+    """Turn a raw OpenWeatherMap response into a weather_readings row.
+
+    `timestamp` is when the response was fetched; the collector archives the
+    same value so replaying the archive reproduces the row's (city, timestamp).
+    """
+    return {
+        'city': data['name'],
+        'timestamp': timestamp or datetime.now(),
+        'temperature_f': round(data['main']['temp'], 2),
+        'feels_like': round(data['main']['feels_like'], 2),
+        'humidity': data['main']['humidity'],
+        'pressure': data['main']['pressure'],
+        'wind_speed': round(data['wind']['speed'], 2),
+        'visibility': data.get('visibility', 0),
+        'condition': data['weather'][0]['description'],
+        'latitude': data['coord']['lat'],
+        'longitude': data['coord']['lon']
+    }
+
+# Postgres channel notified whenever latest_weather changes; the dashboard
+# LISTENs on it to push updates to open browsers
+WEATHER_UPDATES_CHANNEL = 'weather_updates'
+
+def notify_weather_updates(cursor, count):
+    """Queue a NOTIFY for `count` new readings; Postgres delivers it when the transaction commits"""
+    cursor.execute("SELECT pg_notify(%s, %s)", (WEATHER_UPDATES_CHANNEL, str(count)))
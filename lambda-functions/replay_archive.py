@@ -0,0 +1,349 @@
+"""Rebuild weather_readings by replaying the raw-weather archive.
+
+Streams archived API responses, re-parses them with process_weather_data in a
+process pool and bulk-loads the rows with COPY into a staging table followed by
+an upsert on (city, timestamp), so replaying the same data twice is harmless.
+
+Units of work are one batched run archive (raw_archive.py) or one city-day of
+legacy per-response objects (`<prefix>/<city>/<YYYYmmdd_HHMMSS>.json`). Each
+unit is checkpointed in the same transaction as its rows, so an interrupted
+replay resumes where it stopped. Only a bounded number of units is in flight
+at once, which keeps memory flat however much history there is.
+
+Legacy objects only carry a second-resolution timestamp in their key, so their
+rows can't line up with the rows originally collected from them; use
+--truncate to rebuild rather than merge when the archive predates fetched_at.
+
+    python replay_archive.py --bucket weather-data-bucket
+    python replay_archive.py --local-dir /data/archive --truncate --workers 8
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+
+import psycopg2
+
+import schema_migrations
+from city_names import normalize_city_key
+from raw_archive import LocalBackend, S3Backend, iter_records, list_archives
+from readings import READING_COLUMNS, notify_weather_updates, process_weather_data
+
+LOAD_COLUMNS = ('city_key',) + READING_COLUMNS
+LEGACY_TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 10.0
+
+
+def make_backend(source):
+    kind, location = source
+    return LocalBackend(location) if kind == 'local' else S3Backend(location)
+
+
+def iter_units(backend, prefix):
+    """Yield (unit_id, kind, keys): batched run archives first, then legacy city-days.
+
+    Relies on listings coming back in key order (S3 and LocalBackend both do),
+    so each city-day's legacy objects are contiguous and can be grouped
+    without holding the whole listing in memory.
+    """
+    for key in list_archives(backend, prefix):
+        yield key, 'run', [key]
+
+    current, keys = None, []
+    for key in backend.list(f"{prefix}/"):
+        parts = key[len(prefix) + 1:].split('/')
+        if len(parts) != 2 or parts[0] == 'runs' or not parts[1].endswith('.json'):
+            continue
+
+        unit_id = f"{prefix}/{parts[0]}/{parts[1][:8]}"
+        if unit_id != current and keys:
+            yield current, 'legacy', keys
+            keys = []
+        current = unit_id
+        keys.append(key)
+
+    if keys:
+        yield current, 'legacy', keys
+
+
+_backend = None
+
+
+def _init_worker(source):
+    global _backend
+    _backend = make_backend(source)
+
+
+def _iter_unit_responses(kind, keys, on_error):
+    """Decoders of one unit's responses, each returning (raw response, fetched_at).
+
+    Decoding is left to the caller so a corrupt record fails inside its own
+    try; run archives report undecodable lines to on_error and skip them.
+    """
+    if kind == 'run':
+        for record in iter_records(_backend, keys[0], on_error=on_error):
+            yield lambda record=record: (record['data'], datetime.fromisoformat(record['fetched_at']))
+        return
+
+    for key in keys:
+        stamp = key.rsplit('/', 1)[1][:-len('.json')]
+        yield lambda key=key, stamp=stamp: (
+            json.loads(_backend.get(key)), datetime.strptime(stamp, LEGACY_TIMESTAMP_FORMAT)
+        )
+
+
+def parse_unit(unit):
+    """Worker: parse one unit into CSV rows ready for COPY.
+
+    Returns (unit_id, csv_text, records, errors, oldest timestamp or None).
+    Corrupt or unparseable responses are counted in errors and skipped.
+    """
+    unit_id, kind, keys = unit
+    out = io.StringIO()
+    writer = csv.writer(out)
+    records = errors = 0
+    oldest = None
+
+    def skip(e):
+        nonlocal errors
+        errors += 1
+        if errors <= 3:
+            print(f"Skipping unparseable response in {unit_id}: {type(e).__name__}: {str(e)}")
+
+    for decode in _iter_unit_responses(kind, keys, skip):
+        try:
+            data, fetched_at = decode()
+            reading = process_weather_data(data, fetched_at)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            skip(e)
+            continue
+
+        writer.writerow([normalize_city_key(reading['city'])] + [reading[column] for column in READING_COLUMNS])
+        records += 1
+        if oldest is None or fetched_at < oldest:
+            oldest = fetched_at
+
+    return unit_id, out.getvalue(), records, errors, oldest
+
+
+class ReplayLoader:
+    """Buffers parsed units and loads them with COPY + upsert, checkpointing each unit"""
+
+    def __init__(self, conn, batch_rows=50000):
+        self.conn = conn
+        self.batch_rows = batch_rows
+        self.partitions_from = None
+
+        self._chunks = []
+        self._units = []
+        self._rows = 0
+        self._oldest = None
+
+        self.records = 0
+        self.errors = 0
+        self.units = 0
+        self.upserted = 0
+
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS replay_checkpoints (
+                unit VARCHAR(500) PRIMARY KEY,
+                records INTEGER NOT NULL,
+                replayed_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TEMP TABLE replay_staging ON COMMIT DELETE ROWS AS
+            SELECT {', '.join(LOAD_COLUMNS)} FROM weather_readings WITH NO DATA
+        """)
+        conn.commit()
+
+    def completed_units(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT unit FROM replay_checkpoints")
+        done = {row[0] for row in cursor.fetchall()}
+        self.conn.commit()
+        return done
+
+    def reset(self):
+        """Start over: empty weather_readings and forget every checkpoint"""
+        cursor = self.conn.cursor()
+        cursor.execute("TRUNCATE weather_readings, replay_checkpoints")
+        self.conn.commit()
+        print("Truncated weather_readings and replay checkpoints")
+
+    def add(self, result):
+        unit_id, rows, records, errors, oldest = result
+        self._chunks.append(rows)
+        self._units.append((unit_id, records))
+        self._rows += records
+        self.errors += errors
+        if oldest is not None and (self._oldest is None or oldest < self._oldest):
+            self._oldest = oldest
+
+        if self._rows >= self.batch_rows:
+            self.flush()
+
+    def _ensure_partitions(self, cursor):
+        # Old history needs its monthly partitions before it's inserted,
+        # otherwise it piles up in the default partition
+        if self._oldest is None:
+            return
+        month = date(self._oldest.year, self._oldest.month, 1)
+        if self.partitions_from is None or month < self.partitions_from:
+            schema_migrations.create_partitions(cursor, first_month=month)
+            self.partitions_from = month
+
+    def flush(self):
+        if not self._units:
+            return
+
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in LOAD_COLUMNS
+                            if column not in ('city', 'timestamp'))
+        cursor = self.conn.cursor()
+        try:
+            self._ensure_partitions(cursor)
+            cursor.copy_expert(
+                f"COPY replay_staging ({', '.join(LOAD_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                io.StringIO(''.join(self._chunks))
+            )
+            # DISTINCT ON: one INSERT can't upsert the same key twice
+            cursor.execute(f"""
+                INSERT INTO weather_readings ({', '.join(LOAD_COLUMNS)})
+                SELECT DISTINCT ON (city, timestamp) {', '.join(LOAD_COLUMNS)}
+                FROM replay_staging
+                ORDER BY city, timestamp
+                ON CONFLICT (city, timestamp) DO UPDATE SET {updates}
+            """)
+            upserted = cursor.rowcount
+            cursor.executemany(
+                "INSERT INTO replay_checkpoints (unit, records) VALUES (%s, %s) "
+                "ON CONFLICT (unit) DO UPDATE SET records = EXCLUDED.records, replayed_at = NOW()",
+                self._units
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        self.records += self._rows
+        self.units += len(self._units)
+        self.upserted += upserted
+        self._chunks, self._units, self._rows, self._oldest = [], [], 0, None
+
+    def rebuild_latest_weather(self):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("TRUNCATE latest_weather")
+            cursor.execute(f"""
+                INSERT INTO latest_weather ({', '.join(LOAD_COLUMNS)})
+                SELECT DISTINCT ON (city_key) {', '.join(LOAD_COLUMNS)}
+                FROM weather_readings
+                ORDER BY city_key, timestamp DESC
+            """)
+            count = cursor.rowcount
+            notify_weather_updates(cursor, count)
+            self.conn.commit()
+            return count
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def replay(conn, source, prefix='raw-weather-data', workers=None, batch_rows=50000,
+           truncate=False, rebuild_latest=True):
+    """Replay every unchecked unit under prefix; returns the loader with its counters"""
+    schema_migrations.migrate(conn)
+    loader = ReplayLoader(conn, batch_rows)
+    if truncate:
+        loader.reset()
+    done = loader.completed_units()
+
+    workers = workers or os.cpu_count() or 1
+    started = time.monotonic()
+    last_report = started
+    skipped = 0
+
+    def report(label):
+        elapsed = time.monotonic() - started
+        rate = loader.records / elapsed if elapsed else 0.0
+        print(f"{label}: {loader.units} units, {loader.records} records, {loader.errors} unparseable, "
+              f"{skipped} units already done, {elapsed:.1f}s, {rate:.0f} records/sec")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(source,)) as pool:
+        pending = set()
+
+        def collect(futures):
+            nonlocal last_report
+            for future in futures:
+                loader.add(future.result())
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                report('Progress')
+
+        for unit in iter_units(make_backend(source), prefix):
+            if unit[0] in done:
+                skipped += 1
+                continue
+            pending.add(pool.submit(parse_unit, unit))
+            # Bound the units in flight so memory doesn't grow with the archive
+            if len(pending) >= workers * 4:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+
+        collect(wait(pending).done)
+
+    loader.flush()
+    report('Replay complete')
+    print(f"Upserted {loader.upserted} rows into weather_readings")
+
+    if rebuild_latest:
+        print(f"Rebuilt latest_weather with {loader.rebuild_latest_weather()} cities")
+    return loader
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild weather_readings from the raw archive')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help='S3 bucket holding the archive')
+    source.add_argument('--local-dir', help='Local directory holding the archive')
+    parser.add_argument('--prefix', default='raw-weather-data')
+    parser.add_argument('--workers', type=int, default=None, help='Parser processes (default: CPU count)')
+    parser.add_argument('--batch-rows', type=int, default=50000, help='Rows per COPY/commit')
+    parser.add_argument('--truncate', action='store_true',
+                        help='Empty weather_readings and the checkpoints before replaying')
+    parser.add_argument('--skip-latest', action='store_true', help="Don't rebuild latest_weather afterwards")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.environ['DB_HOST'],
+        database=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD']
+    )
+    try:
+        replay(
+            conn,
+            ('s3', args.bucket) if args.bucket else ('local', args.local_dir),
+            prefix=args.prefix.rstrip('/'),
+            workers=args.workers,
+            batch_rows=args.batch_rows,
+            truncate=args.truncate,
+            rebuild_latest=not args.skip_latest
+        )
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
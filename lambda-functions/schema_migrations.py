@@ -0,0 +1,392 @@
+"""Versioned schema migrations and partition maintenance for the weather database.
+
+weather_readings is range-partitioned by month on `timestamp`. Monthly
+partitions are created ahead of time by maintain_partitions(), and retention
+drops whole partitions instead of running DELETE.
+
+Migrations run from the collector too, so each one must stay quick; moving the
+rows of the pre-partitioning table is left to the CLI (migrate or backfill),
+which does it in batches of --batch-rows.
+
+    python schema_migrations.py migrate [--batch-rows 50000]
+    python schema_migrations.py backfill [--batch-rows 50000]
+    python schema_migrations.py maintain [--months-ahead 3] [--retention-months 24]
+"""
+import argparse
+import os
+import re
+from datetime import date
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from city_names import normalize_city_key
+
+# Arbitrary constant so concurrent collectors serialize on the migration
+MIGRATION_LOCK_ID = 482113
+
+PARTITION_NAME = re.compile(r'^weather_readings_p(\d{4})_(\d{2})$')
+
+
+def _create_base_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS weather_readings (
+            id SERIAL PRIMARY KEY,
+            city VARCHAR(100) NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            temperature_f FLOAT,
+            feels_like FLOAT,
+            humidity FLOAT,
+            pressure FLOAT,
+            wind_speed FLOAT,
+            visibility FLOAT,
+            condition VARCHAR(200),
+            latitude FLOAT,
+            longitude FLOAT,
+            CONSTRAINT unique_city_timestamp UNIQUE(city, timestamp)
+        )
+    """)
+
+    # Newest reading per city, keyed by normalize_city_key, so the dashboard
+    # doesn't have to window-sort the whole history to find it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS latest_weather (
+            city_key VARCHAR(100) PRIMARY KEY,
+            city VARCHAR(100) NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            temperature_f FLOAT,
+            feels_like FLOAT,
+            humidity FLOAT,
+            pressure FLOAT,
+            wind_speed FLOAT,
+            visibility FLOAT,
+            condition VARCHAR(200),
+            latitude FLOAT,
+            longitude FLOAT
+        )
+    """)
+
+
+def _partition_readings(cursor):
+    """Rebuild weather_readings as a monthly range-partitioned table with a city_key column.
+
+    Only swaps the tables: the old rows stay in weather_readings_legacy until
+    backfill_legacy_readings moves them, in batches, from the CLI. Copying them
+    here could outlast the collector's Lambda timeout on a large table.
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'weather_readings'::regclass")
+    if cursor.fetchone()[0] == 'p':
+        return
+
+    cursor.execute("ALTER TABLE weather_readings RENAME TO weather_readings_legacy")
+    cursor.execute("ALTER TABLE weather_readings_legacy RENAME CONSTRAINT unique_city_timestamp TO unique_city_timestamp_legacy")
+    cursor.execute("ALTER TABLE weather_readings_legacy RENAME CONSTRAINT weather_readings_pkey TO weather_readings_legacy_pkey")
+    # Keep the id sequence (and so existing ids) when the legacy table is dropped
+    cursor.execute("ALTER SEQUENCE weather_readings_id_seq OWNED BY NONE")
+
+    cursor.execute("""
+        CREATE TABLE weather_readings (
+            id BIGINT NOT NULL DEFAULT nextval('weather_readings_id_seq'),
+            city VARCHAR(100) NOT NULL,
+            city_key VARCHAR(100) NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            temperature_f FLOAT,
+            feels_like FLOAT,
+            humidity FLOAT,
+            pressure FLOAT,
+            wind_speed FLOAT,
+            visibility FLOAT,
+            condition VARCHAR(200),
+            latitude FLOAT,
+            longitude FLOAT,
+            PRIMARY KEY (id, timestamp),
+            CONSTRAINT unique_city_timestamp UNIQUE (city, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    cursor.execute("ALTER SEQUENCE weather_readings_id_seq OWNED BY weather_readings.id")
+    cursor.execute("CREATE TABLE weather_readings_default PARTITION OF weather_readings DEFAULT")
+    create_partitions(cursor)
+    print("Old readings are in weather_readings_legacy; run `python schema_migrations.py backfill` to move them")
+
+
+def backfill_legacy_readings(conn, batch_rows=50000):
+    """Move rows from weather_readings_legacy into weather_readings, one committed batch at a time.
+
+    Safe to interrupt and rerun: each batch deletes what it copies in the same
+    transaction. Drops the legacy table once it is empty. Returns rows moved.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass('weather_readings_legacy')")
+        if cursor.fetchone()[0] is None:
+            return 0
+
+        cursor.execute("SELECT MIN(timestamp) FROM weather_readings_legacy")
+        oldest = cursor.fetchone()[0]
+        if oldest:
+            create_partitions(cursor, first_month=date(oldest.year, oldest.month, 1))
+
+        # city_key uses the same Python normalization as the collector, so compute
+        # it once per distinct spelling and join it in rather than per row
+        cursor.execute("SELECT DISTINCT city FROM weather_readings_legacy")
+        keys = [(city, normalize_city_key(city)) for (city,) in cursor.fetchall()]
+        conn.commit()
+
+        moved = 0
+        while True:
+            cursor.execute("CREATE TEMP TABLE city_keys (city VARCHAR(100), city_key VARCHAR(100)) ON COMMIT DROP")
+            if keys:
+                execute_values(cursor, "INSERT INTO city_keys (city, city_key) VALUES %s", keys)
+            cursor.execute("""
+                WITH batch AS (
+                    DELETE FROM weather_readings_legacy
+                    WHERE id IN (SELECT id FROM weather_readings_legacy ORDER BY id LIMIT %s)
+                    RETURNING *
+                )
+                INSERT INTO weather_readings
+                    (id, city, city_key, timestamp, temperature_f, feels_like, humidity, pressure,
+                     wind_speed, visibility, condition, latitude, longitude)
+                SELECT
+                    b.id, b.city, k.city_key, b.timestamp, b.temperature_f, b.feels_like, b.humidity, b.pressure,
+                    b.wind_speed, b.visibility, b.condition, b.latitude, b.longitude
+                FROM batch b
+                JOIN city_keys k ON k.city = b.city
+                ON CONFLICT (city, timestamp) DO NOTHING
+            """, (batch_rows,))
+            moved += cursor.rowcount
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM weather_readings_legacy)")
+            remaining = cursor.fetchone()[0]
+            conn.commit()
+            if not remaining:
+                break
+            print(f"Moved {moved} legacy readings so far")
+
+        cursor.execute("DROP TABLE weather_readings_legacy")
+        conn.commit()
+        print(f"Moved {moved} legacy readings into partitioned weather_readings")
+        return moved
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _add_access_path_indexes(cursor):
+    # Trends and coordinate lookups: one city's readings in time order
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_weather_readings_city_key_timestamp
+        ON weather_readings (city_key, timestamp DESC)
+    """)
+    # Retention and time-window scans across all cities
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_weather_readings_timestamp
+        ON weather_readings (timestamp)
+    """)
+
+
+def _create_alert_state(cursor):
+    # One row per city: what alert_rules.py needs to evaluate the next reading
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alert_state (
+            city_key VARCHAR(100) PRIMARY KEY,
+            state JSONB NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def _create_alert_notifications(cursor):
+    # One row per city and alert type: when alert_dispatch.py last notified it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alert_notifications (
+            city_key VARCHAR(100) NOT NULL,
+            alert_type VARCHAR(100) NOT NULL,
+            active BOOLEAN NOT NULL,
+            notified_at TIMESTAMP,
+            last_seen TIMESTAMP NOT NULL,
+            PRIMARY KEY (city_key, alert_type)
+        )
+    """)
+
+
+# (version, description, function). Append only; never edit an applied migration.
+MIGRATIONS = [
+    (1, 'base weather_readings and latest_weather tables', _create_base_tables),
+    (2, 'monthly range partitions and city_key on weather_readings', _partition_readings),
+    (3, 'indexes for dashboard access paths', _add_access_path_indexes),
+    (4, 'alert_state for incremental alert rules', _create_alert_state),
+    (5, 'alert_notifications for alert deduplication', _create_alert_notifications),
+]
+
+
+def migrate(conn):
+    """Apply pending migrations in one transaction; returns the versions applied"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        """)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        newly_applied = []
+        for version, description, apply in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f"Applying migration {version}: {description}")
+            apply(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            newly_applied.append(version)
+
+        conn.commit()
+        return newly_applied
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_partitions(cursor, first_month=None, months_ahead=3):
+    """Create monthly partitions from first_month (default: this month) to months_ahead from now"""
+    today = date.today()
+    current = date(today.year, today.month, 1)
+    month = min(first_month or current, current)
+    last = _add_months(current, months_ahead)
+    existing = {partition_month for _, partition_month in list_partitions(cursor)}
+
+    while month <= last:
+        if month not in existing:
+            _create_partition(cursor, month)
+        month = _add_months(month, 1)
+
+
+def _create_partition(cursor, month):
+    """Create one month's partition, first moving that month's rows out of the default partition.
+
+    Postgres refuses to create a partition whose range already has rows in
+    the default partition, so those are stranded there until the default is
+    detached; they are re-inserted through the parent once the month exists.
+    """
+    upper = _add_months(month, 1)
+    cursor.execute("SELECT to_regclass('weather_readings_default')")
+    stranded = False
+    if cursor.fetchone()[0] is not None:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM weather_readings_default WHERE timestamp >= %s AND timestamp < %s)",
+            (month, upper)
+        )
+        stranded = cursor.fetchone()[0]
+
+    if stranded:
+        cursor.execute("ALTER TABLE weather_readings DETACH PARTITION weather_readings_default")
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS weather_readings_p{month.year:04d}_{month.month:02d}
+        PARTITION OF weather_readings
+        FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')
+    """)
+
+    if stranded:
+        cursor.execute("""
+            WITH stranded AS (
+                DELETE FROM weather_readings_default
+                WHERE timestamp >= %s AND timestamp < %s
+                RETURNING *
+            )
+            INSERT INTO weather_readings SELECT * FROM stranded
+        """, (month, upper))
+        print(f"Moved {cursor.rowcount} readings for {month:%Y-%m} out of the default partition")
+        cursor.execute("ALTER TABLE weather_readings ATTACH PARTITION weather_readings_default DEFAULT")
+
+
+def list_partitions(cursor):
+    """Monthly partitions of weather_readings as (name, first day of month)"""
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'weather_readings'
+    """)
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_expired_partitions(cursor, retention_months):
+    """Drop monthly partitions whose whole month is older than the retention window"""
+    today = date.today()
+    cutoff = _add_months(date(today.year, today.month, 1), -retention_months)
+
+    dropped = []
+    for name, month in list_partitions(cursor):
+        if _add_months(month, 1) <= cutoff:
+            cursor.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+
+    if dropped:
+        print(f"Dropped {len(dropped)} expired partitions: {', '.join(dropped)}")
+    return dropped
+
+
+def maintain_partitions(conn, months_ahead=3, retention_months=None):
+    """Create upcoming partitions and apply the retention policy in one transaction"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        create_partitions(cursor, months_ahead=months_ahead)
+        dropped = drop_expired_partitions(cursor, retention_months) if retention_months else []
+        conn.commit()
+        return dropped
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weather database schema management')
+    parser.add_argument('command', choices=['migrate', 'maintain', 'backfill'])
+    parser.add_argument('--months-ahead', type=int, default=3)
+    parser.add_argument('--retention-months', type=int, default=None)
+    parser.add_argument('--batch-rows', type=int, default=50000, help='legacy rows moved per transaction')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.environ['DB_HOST'],
+        database=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD']
+    )
+    try:
+        applied = migrate(conn)
+        print(f"Applied migrations: {applied or 'none'}")
+        if args.command in ('migrate', 'backfill'):
+            backfill_legacy_readings(conn, args.batch_rows)
+        if args.command == 'maintain':
+            maintain_partitions(conn, args.months_ahead, args.retention_months)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""One Postgres connection kept open across warm Lambda invocations.
+
+A Lambda container handles one invocation at a time, so a pool is overkill,
+but reconnecting (TCP + TLS + auth against RDS) on every invocation is the
+largest fixed cost after the cold start itself. WarmConnection opens the
+connection on first use and hands the same one out until it breaks.
+
+A frozen container can be thawed minutes later to find its connection closed
+by RDS or a NAT idle timeout, so a connection idle for more than
+healthcheck_idle seconds is pinged with SELECT 1 before reuse and replaced if
+that fails.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class WarmConnection:
+    """Lazily opened connection reused while healthy; connection() serializes its users"""
+
+    def __init__(self, connect, healthcheck_idle=30.0):
+        self.connect = connect
+        self.healthcheck_idle = healthcheck_idle
+
+        self._conn = None
+        self._used_at = None
+        self._lock = threading.Lock()
+        self.stats = {'connects': 0, 'reuses': 0, 'healthchecks': 0, 'discarded': 0}
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+
+        if time.monotonic() - self._used_at < self.healthcheck_idle:
+            return True
+
+        self.stats['healthchecks'] += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            # The ping opened a transaction; don't leave it idle in one
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self):
+        conn, self._conn = self._conn, None
+        self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _get(self):
+        if self._conn is not None:
+            if self._is_healthy(self._conn):
+                self.stats['reuses'] += 1
+                return self._conn
+            self._discard()
+
+        self._conn = self.connect()
+        self.stats['connects'] += 1
+        return self._conn
+
+    @contextmanager
+    def connection(self):
+        """The warm connection for one unit of work. Not reentrant.
+
+        Uncommitted work is rolled back on exit, and a connection that failed
+        at the connection level (or was closed) is dropped so the next caller
+        reconnects.
+        """
+        with self._lock:
+            conn = self._get()
+            try:
+                yield conn
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    self._discard()
+                raise
+            finally:
+                self._used_at = time.monotonic()
+                if self._conn is conn:
+                    self._release(conn)
+
+    def _release(self, conn):
+        if conn.closed:
+            self._discard()
+            return
+        try:
+            # A transaction left open would hold its locks while the container is
+            # frozen (0 is psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+            if conn.get_transaction_status() != 0:
+                conn.rollback()
+        except Exception:
+            self._discard()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,13 +1,67 @@
 import json
-import boto3
 import os
+import sys
+import threading
+import time
 import urllib3
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 import psycopg2
+from psycopg2.extras import execute_values
 
-s3_client = boto3.client('s3')
-sns_client = boto3.client('sns')
-http = urllib3.PoolManager()
+import alert_dispatch
+import alert_rules
+import instrumentation
+import schema_migrations
+from city_names import normalize_city_key
+from rate_limiter import RetryBudget, TokenBucket, request_with_retries
+from raw_archive import LocalBackend, RawArchiveWriter, S3Backend
+from readings import READING_COLUMNS, notify_weather_updates, process_weather_data
+from warm_connection import WarmConnection
+
+# Number of cities collected in parallel and the wall-clock budget for one city
+MAX_WORKERS = int(os.environ.get('COLLECTOR_MAX_WORKERS', '16'))
+CITY_TIMEOUT_SECONDS = float(os.environ.get('CITY_TIMEOUT_SECONDS', '15'))
+OPENWEATHER_BASE_URL = os.environ.get('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org')
+
+# 'city' requests /weather?q= once per city. 'group' resolves cities to
+# OpenWeatherMap IDs once (cached in S3) and fetches them GROUP_CHUNK_SIZE at
+# a time through the multi-city /group endpoint.
+COLLECTION_MODE = os.environ.get('COLLECTION_MODE', 'city')
+GROUP_CHUNK_SIZE = int(os.environ.get('GROUP_CHUNK_SIZE', '20'))
+CITY_IDS_KEY = 'config/openweather-city-ids.json'
+
+# Client-side rate limit sized to the OpenWeatherMap plan, plus retry settings.
+# RETRY_BUDGET caps retries across a whole run so an outage can't eat the Lambda timeout.
+OPENWEATHER_RATE_PER_MINUTE = float(os.environ.get('OPENWEATHER_RATE_PER_MINUTE', '60'))
+OPENWEATHER_BURST = float(os.environ.get('OPENWEATHER_BURST', '60'))
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BUDGET = int(os.environ.get('RETRY_BUDGET', '50'))
+
+openweather_bucket = TokenBucket(OPENWEATHER_RATE_PER_MINUTE / 60.0, OPENWEATHER_BURST)
+
+# Raw responses are archived as one compressed object per run (see raw_archive.py).
+# RAW_ARCHIVE_DIR switches to a local directory instead of S3 for offline runs.
+RAW_ARCHIVE_FORMAT = os.environ.get('RAW_ARCHIVE_FORMAT', 'ndjson.gz')
+RAW_ARCHIVE_DIR = os.environ.get('RAW_ARCHIVE_DIR')
+
+# Same rules the dashboard's /api/alerts evaluates (ALERT_RULES overrides the defaults)
+alert_engine = alert_rules.AlertEngine(alert_rules.rules_from_env())
+
+# Alert notifications are deduplicated per city+type (see alert_dispatch.py) and
+# routed by ALERT_ROUTES; ALERT_OUTBOX writes them to a local NDJSON file instead of SNS
+ALERT_COOLDOWN_SECONDS = int(os.environ.get('ALERT_COOLDOWN_SECONDS', '21600'))
+ALERT_CLEAR_AFTER_SECONDS = int(os.environ.get('ALERT_CLEAR_AFTER_SECONDS', '3600'))
+ALERT_REMIND_AFTER_SECONDS = int(os.environ.get('ALERT_REMIND_AFTER_SECONDS', '0'))
+ALERT_OUTBOX = os.environ.get('ALERT_OUTBOX')
+alert_dispatcher = None
+
+# boto3 and its clients are created on first use: importing boto3 and building
+# a client is a few hundred ms of cold start that runs without S3 or SNS
+# (RAW_ARCHIVE_DIR, ALERT_OUTBOX, no alerts due) never need
+_aws_clients = {}
+_aws_clients_lock = threading.Lock()
+http = urllib3.PoolManager(maxsize=MAX_WORKERS)
 
 API_KEY = os.environ['OPENWEATHER_API_KEY']
 DB_HOST = os.environ['DB_HOST']
@@ -31,52 +85,249 @@ CITIES = [
 ]
 
 def lambda_handler(event, context):
-    print("Starting weather data collection for 10 cities...")
-    results = []
+    # Span timings from this invocation go to CloudWatch as EMF log lines
+    try:
+        with instrumentation.span('invocation'):
+            return collect_weather(context)
+    finally:
+        instrumentation.metrics.flush_emf('weather-data-collector')
+
+class CollectionRun:
+    """What one invocation's fetch threads share: its raw archive and retry budget.
+
+    Workers get their run passed in rather than reading module globals, so a
+    thread still running after its invocation's deadline (the executor isn't
+    waited for) can only touch its own, already flushed run, never the next
+    invocation's in a warm container.
+    """
+
+    def __init__(self):
+        self.raw_archive = new_raw_archive()
+        self.retry_budget = RetryBudget(RETRY_BUDGET)
+
+def collect_weather(context):
+    cities = [city.strip() for city in CITIES]
+    run = CollectionRun()
+    if instrumentation.log_enabled('INFO'):
+        print(f"Starting weather data collection for {len(cities)} cities...")
+    results = [None] * len(cities)
     alerts = []
-    
-    for city in CITIES:
-        try:
-            weather_data = fetch_weather(city.strip())
-            
-            if weather_data:
-                store_raw_data_s3(city.strip(), weather_data)
-                processed = process_weather_data(weather_data)
-                store_in_rds(processed)
-                
-                alert = check_alerts(processed)
-                if alert:
-                    alerts.extend(alert)
-                
-                results.append({
-                    'city': city.strip(),
-                    'status': 'success',
-                    'temperature': processed['temperature_f']
-                })
-            
-        except Exception as e:
-            print(f"Error processing {city}: {str(e)}")
-            results.append({
-                'city': city.strip(),
+    readings = []
+
+    deadline = get_run_deadline(context)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(cities))))
+    if COLLECTION_MODE == 'group':
+        futures = submit_group_collection(executor, run, cities)
+    else:
+        futures = [executor.submit(collect_city, run, city) for city in cities]
+
+    try:
+        for index, (city, future) in enumerate(zip(cities, futures)):
+            try:
+                processed = future.result(timeout=max(0, deadline - time.monotonic()))
+
+                if processed:
+                    readings.append((index, processed))
+
+            except FutureTimeoutError:
+                future.cancel()
+                print(f"Timed out processing {city}")
+                results[index] = {
+                    'city': city,
+                    'status': 'error',
+                    'error': 'Timed out before the collection run deadline'
+                }
+            except Exception as e:
+                print(f"Error processing {city}: {str(e)}")
+                results[index] = {
+                    'city': city,
+                    'status': 'error',
+                    'error': str(e)
+                }
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if COLLECTION_MODE == 'group':
+        save_city_ids()
+
+    # The raw archive is a replay source, not the system of record, so a failed
+    # upload is logged rather than failing every city's reading
+    try:
+        with instrumentation.span('raw_archive_flush'):
+            run.raw_archive.flush()
+    except Exception as e:
+        print(f"Error storing raw archive: {str(e)}")
+
+    try:
+        alerts = store_in_rds([processed for _, processed in readings])
+    except Exception as e:
+        for index, _ in readings:
+            results[index] = {
+                'city': cities[index],
                 'status': 'error',
                 'error': str(e)
-            })
-    
-    if alerts:
-        send_alerts(alerts)
-    
+            }
+        readings = []
+
+    for index, processed in readings:
+        results[index] = {
+            'city': cities[index],
+            'status': 'success',
+            'temperature': processed['temperature_f']
+        }
+
+    # Cities the API had no data for are left out, as before
+    results = [result for result in results if result]
+
+    notified = send_alerts(alerts, [processed['city'] for _, processed in readings])
+
     return {
         'statusCode': 200,
         'body': json.dumps({
-            'message': f'Weather data collection completed for {len(CITIES)} cities',
+            'message': f'Weather data collection completed for {len(cities)} cities',
             'results': results,
-            'alerts': len(alerts)
+            'alerts': len(alerts),
+            'notified': notified
         })
     }
 
-def fetch_weather(city):
-    url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid={API_KEY}&units=imperial"
-    response = http.request("GET", url, timeout=urllib3.Timeout(connect=5.0, read=10.0))
+def get_run_deadline(context):
+    """Monotonic deadline for the whole run, leaving headroom before Lambda kills us"""
+    remaining_ms = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        remaining_ms = context.get_remaining_time_in_millis()
+
+    if remaining_ms is None:
+        return time.monotonic() + CITY_TIMEOUT_SECONDS * max(1, len(CITIES))
+
+    return time.monotonic() + max(0, remaining_ms / 1000.0 - 5.0)
+
+def collect_city(run, city):
+    """Fetch and archive one city. Returns the processed reading, or None on API errors"""
+    weather_data = fetch_weather(city, run.retry_budget)
+
+    if not weather_data:
+        return None
+
+    if COLLECTION_MODE == 'group' and 'id' in weather_data:
+        remember_city_id(city, weather_data['id'])
+
+    fetched_at = datetime.now()
+    store_raw_data_s3(run, city, weather_data, fetched_at)
+    return process_weather_data(weather_data, fetched_at)
+
+_city_ids = None
+_city_ids_dirty = False
+_city_ids_lock = threading.Lock()
+
+def load_city_ids():
+    """City name -> OpenWeatherMap ID, read from S3 once per container"""
+    global _city_ids
+
+    if _city_ids is None:
+        try:
+            obj = get_aws_client('s3').get_object(Bucket=S3_BUCKET, Key=CITY_IDS_KEY)
+            _city_ids = json.loads(obj['Body'].read().decode('utf-8'))
+        except Exception as e:
+            if instrumentation.log_enabled('INFO'):
+                print(f"No cached city IDs ({str(e)}), resolving by name")
+            _city_ids = {}
+    return _city_ids
+
+def remember_city_id(city, city_id):
+    global _city_ids_dirty
+
+    with _city_ids_lock:
+        if load_city_ids().get(city) != city_id:
+            _city_ids[city] = city_id
+            _city_ids_dirty = True
+
+def save_city_ids():
+    """Persist newly resolved city IDs so later runs can use the group endpoint"""
+    global _city_ids_dirty
+
+    with _city_ids_lock:
+        if not _city_ids_dirty:
+            return
+        body = json.dumps(_city_ids, sort_keys=True)
+        _city_ids_dirty = False
+
+    try:
+        get_aws_client('s3').put_object(Bucket=S3_BUCKET, Key=CITY_IDS_KEY, Body=body, ContentType='application/json')
+        if instrumentation.log_enabled('INFO'):
+            print(f"Saved city ID mapping to S3: {CITY_IDS_KEY}")
+    except Exception as e:
+        print(f"Error saving city IDs: {str(e)}")
+
+class CityChunkFuture:
+    """Future-like view of one city's reading inside a group chunk's result"""
+
+    def __init__(self, future, city):
+        self.future = future
+        self.city = city
+
+    def result(self, timeout=None):
+        value = self.future.result(timeout=timeout)[self.city]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def cancel(self):
+        return self.future.cancel()
+
+def submit_group_collection(executor, run, cities):
+    """Submit group-endpoint chunks for resolved cities and single requests for the rest.
+    Returns one future per city, in order"""
+    city_ids = load_city_ids()
+    resolved = [city for city in cities if city in city_ids]
+    futures = {}
+
+    for start in range(0, len(resolved), GROUP_CHUNK_SIZE):
+        chunk = [(city, city_ids[city]) for city in resolved[start:start + GROUP_CHUNK_SIZE]]
+        future = executor.submit(collect_group, run, chunk)
+        for city, _ in chunk:
+            futures[city] = CityChunkFuture(future, city)
+
+    for city in cities:
+        if city not in futures:
+            futures[city] = executor.submit(collect_city, run, city)
+
+    return [futures[city] for city in cities]
+
+def collect_group(run, chunk):
+    """Fetch a chunk of (city, id) pairs in one request and fan the results out per city"""
+    by_id = {item['id']: item for item in fetch_weather_group([city_id for _, city_id in chunk], run.retry_budget)}
+
+    collected = {}
+    for city, city_id in chunk:
+        try:
+            weather_data = by_id.get(city_id)
+            if weather_data is None:
+                # Stale or unknown ID: fall back to a lookup by name, which re-resolves it
+                collected[city] = collect_city(run, city)
+                continue
+
+            fetched_at = datetime.now()
+            store_raw_data_s3(run, city, weather_data, fetched_at)
+            collected[city] = process_weather_data(weather_data, fetched_at)
+        except Exception as e:
+            collected[city] = e
+    return collected
+
+@instrumentation.timed('fetch_weather_group')
+def fetch_weather_group(city_ids, budget):
+    url = f"{OPENWEATHER_BASE_URL}/data/2.5/group?id={','.join(str(city_id) for city_id in city_ids)}&appid={API_KEY}&units=imperial"
+    response = fetch_openweather(url, budget)
+
+    if response.status == 200:
+        return json.loads(response.data.decode('utf-8')).get('list', [])
+
+    raise Exception(f"Group API error for {len(city_ids)} cities: {response.status}")
+
+@instrumentation.timed('fetch_weather')
+def fetch_weather(city, budget):
+    url = f"{OPENWEATHER_BASE_URL}/data/2.5/weather?q={city}&appid={API_KEY}&units=imperial"
+    response = fetch_openweather(url, budget)
     
     if response.status == 200:
         return json.loads(response.data.decode('utf-8'))
@@ -84,116 +335,197 @@ def fetch_weather(city):
         print(f"API Error for {city}: {response.status}")
         return None
 
-def store_raw_data_s3(city, data):
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    key = f"raw-weather-data/{city}/{timestamp}.json"
-    
-    s3_client.put_object(
-        Bucket=S3_BUCKET,
-        Key=key,
-        Body=json.dumps(data),
-        ContentType='application/json'
+def fetch_openweather(url, budget):
+    """GET an OpenWeatherMap URL through the shared rate limiter and the run's retry budget"""
+    return request_with_retries(
+        http, "GET", url,
+        bucket=openweather_bucket,
+        budget=budget,
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        timeout=urllib3.Timeout(connect=5.0, read=10.0, total=CITY_TIMEOUT_SECONDS)
     )
-    print(f"Stored raw data in S3: {key}")
 
-def process_weather_data(data):
-    return {
-        'city': data['name'],
-        'timestamp': datetime.now(),
-        'temperature_f': round(data['main']['temp'], 2),
-        'feels_like': round(data['main']['feels_like'], 2),
-        'humidity': data['main']['humidity'],
-        'pressure': data['main']['pressure'],
-        'wind_speed': round(data['wind']['speed'], 2),
-        'visibility': data.get('visibility', 0),
-        'condition': data['weather'][0]['description'],
-        'latitude': data['coord']['lat'],
-        'longitude': data['coord']['lon']
-    }
+def new_raw_archive():
+    # The S3 client (and boto3) is only loaded once a non-empty archive is flushed
+    if RAW_ARCHIVE_DIR:
+        backend = LocalBackend(RAW_ARCHIVE_DIR)
+    else:
+        backend = S3Backend(S3_BUCKET, client_factory=lambda: get_aws_client('s3'))
+    return RawArchiveWriter(backend, fmt=RAW_ARCHIVE_FORMAT)
 
-def store_in_rds(data):
-    conn = None
+@instrumentation.timed('store_raw_data_s3')
+def store_raw_data_s3(run, city, data, fetched_at=None):
+    """Buffer a raw API response in the run's archive; written once per run by lambda_handler"""
+    run.raw_archive.add(city, data, fetched_at)
+
+# Months of monthly partitions kept ahead of now, and how many months of
+# history to keep (unset keeps everything)
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', '3'))
+READINGS_RETENTION_MONTHS = int(os.environ['READINGS_RETENTION_MONTHS']) if os.environ.get('READINGS_RETENTION_MONTHS') else None
+
+# Set once the schema has been migrated by this (warm) container
+_schema_ready = False
+
+def ensure_schema(conn):
+    """Apply pending migrations and partition maintenance once per container instead of on every write"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    schema_migrations.migrate(conn)
+
+    # A missed maintenance run only matters months from now, so don't fail the write for it
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS weather_readings (
-                id SERIAL PRIMARY KEY,
-                city VARCHAR(100) NOT NULL,
-                timestamp TIMESTAMP NOT NULL,
-                temperature_f FLOAT,
-                feels_like FLOAT,
-                humidity FLOAT,
-                pressure FLOAT,
-                wind_speed FLOAT,
-                visibility FLOAT,
-                condition VARCHAR(200),
-                latitude FLOAT,
-                longitude FLOAT,
-                CONSTRAINT unique_city_timestamp UNIQUE(city, timestamp)
-            )
-        """)
-        
-        cursor.execute("""
-            INSERT INTO weather_readings 
-            (city, timestamp, temperature_f, feels_like, humidity, pressure, 
-             wind_speed, visibility, condition, latitude, longitude)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (city, timestamp) DO NOTHING
-        """, (
-            data['city'],
-            data['timestamp'],
-            data['temperature_f'],
-            data['feels_like'],
-            data['humidity'],
-            data['pressure'],
-            data['wind_speed'],
-            data['visibility'],
-            data['condition'],
-            data['latitude'],
-            data['longitude']
-        ))
-        
-        conn.commit()
-        print(f"Stored data in RDS for {data['city']}")
-        
+        schema_migrations.maintain_partitions(conn, PARTITION_MONTHS_AHEAD, READINGS_RETENTION_MONTHS)
     except Exception as e:
+        print(f"Partition maintenance failed: {str(e)}")
+
+    _schema_ready = True
+
+def get_aws_client(service):
+    """boto3 client for service, created once per container"""
+    with _aws_clients_lock:
+        if service not in _aws_clients:
+            import boto3
+            _aws_clients[service] = boto3.client(service)
+        return _aws_clients[service]
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD
+    )
+
+# Reused across warm invocations; pinged before reuse after DB_HEALTHCHECK_IDLE seconds
+db = WarmConnection(get_db_connection, healthcheck_idle=float(os.environ.get('DB_HEALTHCHECK_IDLE', '30')))
+
+def upsert_latest_weather(cursor, readings):
+    """Move latest_weather forward to the newest of `readings` for each city"""
+    newest = {}
+    for data in readings:
+        key = normalize_city_key(data['city'])
+        if key not in newest or data['timestamp'] > newest[key]['timestamp']:
+            newest[key] = data
+
+    if not newest:
+        return 0
+
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in READING_COLUMNS)
+    execute_values(cursor, f"""
+        INSERT INTO latest_weather (city_key, {', '.join(READING_COLUMNS)})
+        VALUES %s
+        ON CONFLICT (city_key) DO UPDATE SET {updates}
+        WHERE latest_weather.timestamp <= EXCLUDED.timestamp
+    """, [(key,) + tuple(data[column] for column in READING_COLUMNS) for key, data in newest.items()],
+        page_size=len(newest))
+    notify_weather_updates(cursor, len(newest))
+    return len(newest)
+
+@instrumentation.timed('store_in_rds')
+def store_in_rds(readings):
+    """Write all readings from a run in one multi-row INSERT inside a single transaction.
+
+    Alert rules are evaluated in the same transaction, so their stored state
+    never runs ahead of or behind the readings. Returns the active alerts.
+    """
+    global _schema_ready
+
+    if not readings:
+        return []
+
+    try:
+        with db.connection() as conn:
+            ensure_schema(conn)
+            cursor = conn.cursor()
+
+            execute_values(cursor, f"""
+                INSERT INTO weather_readings (city_key, {', '.join(READING_COLUMNS)})
+                VALUES %s
+                ON CONFLICT (city, timestamp) DO NOTHING
+            """, [(normalize_city_key(data['city']),) + tuple(data[column] for column in READING_COLUMNS)
+                  for data in readings],
+                page_size=len(readings))
+            upsert_latest_weather(cursor, readings)
+            alerts = alert_rules.evaluate_and_store(cursor, alert_engine, readings)
+
+            conn.commit()
+            if instrumentation.log_enabled('INFO'):
+                print(f"Stored {len(readings)} readings in RDS")
+            return alerts
+
+    except Exception as e:
+        # db.connection() has already rolled back (or dropped a broken connection)
         print(f"Database error: {str(e)}")
+        _schema_ready = False
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def check_alerts(data):
-    alerts = []
-    
-    if data['temperature_f'] > 95:
-        alerts.append(f"🔥 HEAT ALERT: {data['city']} - {data['temperature_f']}°F")
-    
-    if data['temperature_f'] < 20:
-        alerts.append(f"❄️ COLD ALERT: {data['city']} - {data['temperature_f']}°F")
-    
-    if data['wind_speed'] > 50:
-        alerts.append(f"💨 HIGH WIND ALERT: {data['city']} - {data['wind_speed']} mph")
-    
-    return alerts if alerts else None
+def rebuild_latest_weather():
+    """Backfill latest_weather from the full weather_readings history"""
+    global _schema_ready
 
-def send_alerts(alerts):
-    message = "⚠️ WEATHER ALERTS ⚠️\n\n" + "\n".join(alerts)
-    
     try:
-        sns_client.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Subject='Weather Alert Notification',
-            Message=message
+        with db.connection() as conn:
+            ensure_schema(conn)
+            cursor = conn.cursor()
+
+            # DISTINCT ON walks the (city_key, timestamp DESC) index
+            cursor.execute(f"""
+                SELECT DISTINCT ON (city_key) {', '.join(READING_COLUMNS)}
+                FROM weather_readings
+                ORDER BY city_key, timestamp DESC
+            """)
+            readings = [dict(zip(READING_COLUMNS, row)) for row in cursor.fetchall()]
+
+            cursor.execute("TRUNCATE latest_weather")
+            count = upsert_latest_weather(cursor, readings)
+
+            conn.commit()
+            if instrumentation.log_enabled('INFO'):
+                print(f"Rebuilt latest_weather with {count} cities")
+            return count
+
+    except Exception as e:
+        print(f"Database error: {str(e)}")
+        _schema_ready = False
+        raise
+
+def get_alert_dispatcher():
+    global alert_dispatcher
+
+    if alert_dispatcher is None:
+        publisher = (alert_dispatch.LocalPublisher(ALERT_OUTBOX) if ALERT_OUTBOX
+                     else alert_dispatch.SnsPublisher(get_aws_client('sns')))
+        alert_dispatcher = alert_dispatch.AlertDispatcher(
+            publisher,
+            alert_dispatch.load_routes(os.environ.get('ALERT_ROUTES'), SNS_TOPIC_ARN),
+            cooldown=ALERT_COOLDOWN_SECONDS,
+            clear_after=ALERT_CLEAR_AFTER_SECONDS,
+            remind_after=ALERT_REMIND_AFTER_SECONDS
         )
-        print(f"Sent {len(alerts)} alerts via SNS")
+    return alert_dispatcher
+
+@instrumentation.timed('send_alerts')
+def send_alerts(alerts, cities):
+    """Notify the alerts that are due for the cities stored this run. Returns how many were notified"""
+    if not cities:
+        return 0
+
+    try:
+        with db.connection() as conn:
+            stats = get_alert_dispatcher().dispatch(conn, alerts, {normalize_city_key(city) for city in cities})
+        if instrumentation.log_enabled('INFO'):
+            print(f"Sent {stats['notified']} alerts in {stats['messages']} messages "
+                  f"({stats['publish_calls']} publish calls, {stats['suppressed']} already notified)")
+        return stats['notified']
     except Exception as e:
-        print(f"Error sending SNS alerts: {str(e)}")
\ No newline at end of file
+        print(f"Error sending alerts: {str(e)}")
+        return 0
+
+if __name__ == '__main__':
+    if '--rebuild-latest' in sys.argv[1:]:
+        rebuild_latest_weather()
+    else:
+        print("Usage: python weather-data-collector.py --rebuild-latest")
@@ -1,25 +1,209 @@
 import json
 import os
+import threading
+import time
 import urllib3
 import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode, unquote
 
+from city_names import normalize_city_key
+from forecast_aggregation import daily_summaries, daily_summary, hourly_forecast
+import instrumentation
+from rate_limiter import RateLimitExceeded, RetryBudget, TokenBucket, request_with_retries
+from warm_connection import WarmConnection
+
 DB_CONFIG = {
-    'host': 'weather-db.c8dk46wws5y8.us-east-1.rds.amazonaws.com',
-    'database': 'weatherdb',
-    'user': 'postgres',
-    'password': 'Santander1210'
+    'host': os.environ.get('DB_HOST', 'weather-db.c8dk46wws5y8.us-east-1.rds.amazonaws.com'),
+    'database': os.environ.get('DB_NAME', 'weatherdb'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'Santander1210')
 }
 
 OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY')
-OPENWEATHER_FORECAST_URL = 'https://api.openweathermap.org/data/2.5/forecast'
+OPENWEATHER_BASE_URL = os.environ.get('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org')
+OPENWEATHER_FORECAST_URL = f'{OPENWEATHER_BASE_URL}/data/2.5/forecast'
+
+# Batch requests fetch up to FORECAST_MAX_WORKERS upstream forecasts at once
+# and accept at most FORECAST_BATCH_MAX_CITIES cities
+FORECAST_MAX_WORKERS = int(os.environ.get('FORECAST_MAX_WORKERS', '8'))
+FORECAST_BATCH_MAX_CITIES = int(os.environ.get('FORECAST_BATCH_MAX_CITIES', '50'))
+
+http = urllib3.PoolManager(maxsize=FORECAST_MAX_WORKERS)
+
+# Shared with the collector's plan; each invocation gets its own small retry budget
+OPENWEATHER_RATE_PER_MINUTE = float(os.environ.get('OPENWEATHER_RATE_PER_MINUTE', '60'))
+OPENWEATHER_BURST = float(os.environ.get('OPENWEATHER_BURST', '60'))
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BUDGET = int(os.environ.get('RETRY_BUDGET', '3'))
+
+openweather_bucket = TokenBucket(OPENWEATHER_RATE_PER_MINUTE / 60.0, OPENWEATHER_BURST)
 
-http = urllib3.PoolManager()
+# Upstream forecasts move in 3-hour steps, so cached entries expire at the next
+# step boundary. 'memory' keeps them for the life of a warm container; 's3' or
+# 'postgres' additionally share them across containers.
+FORECAST_STEP_SECONDS = 3 * 60 * 60
+FORECAST_CACHE_BACKEND = os.environ.get('FORECAST_CACHE_BACKEND', 'memory')
+FORECAST_CACHE_BUCKET = os.environ.get('FORECAST_CACHE_BUCKET')
+
+_forecast_cache = {}
+_forecast_cache_lock = threading.Lock()
+_forecast_cache_table_ready = False
+forecast_cache_stats = {'hits': 0, 'misses': 0, 'persistent_hits': 0, 'stores': 0, 'errors': 0}
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
 
 def get_db_connection():
     """Create database connection"""
     return psycopg2.connect(**DB_CONFIG)
 
+# Opened on first use and reused across warm invocations
+db = WarmConnection(get_db_connection, healthcheck_idle=float(os.environ.get('DB_HEALTHCHECK_IDLE', '30')))
+
+def db_connection():
+    """A connection for one unit of work. Hosts that import this module (the
+    dashboard's local forecast mode) replace this with their own pool."""
+    return db.connection()
+
+def get_s3_client():
+    """boto3 S3 client for the forecast cache, imported and created on first use"""
+    global _s3_client
+
+    with _s3_client_lock:
+        if _s3_client is None:
+            import boto3
+            _s3_client = boto3.client('s3')
+        return _s3_client
+
+def forecast_cache_key(lat, lon, units):
+    """Cache key for a forecast; coordinates are rounded so float noise doesn't split entries"""
+    return f"{float(lat):.4f},{float(lon):.4f},{units}"
+
+def forecast_cache_expiry(now=None):
+    """Epoch seconds of the next upstream forecast step"""
+    now = time.time() if now is None else now
+    return (int(now) // FORECAST_STEP_SECONDS + 1) * FORECAST_STEP_SECONDS
+
+def _count(stat):
+    with _forecast_cache_lock:
+        forecast_cache_stats[stat] += 1
+
+def get_cached_forecast(key):
+    """Return cached upstream forecast data for key, or None"""
+    now = time.time()
+
+    with _forecast_cache_lock:
+        entry = _forecast_cache.get(key)
+        if entry and entry['expires_at'] > now:
+            forecast_cache_stats['hits'] += 1
+            return entry['data']
+
+    entry = None
+    if FORECAST_CACHE_BACKEND != 'memory':
+        try:
+            entry = load_persistent_forecast(key)
+        except Exception as e:
+            print(f"Forecast cache read failed ({FORECAST_CACHE_BACKEND}): {str(e)}")
+            _count('errors')
+
+    if entry and entry['expires_at'] > now:
+        with _forecast_cache_lock:
+            _forecast_cache[key] = entry
+            forecast_cache_stats['persistent_hits'] += 1
+        return entry['data']
+
+    _count('misses')
+    return None
+
+def put_cached_forecast(key, data):
+    """Store upstream forecast data until the next forecast step"""
+    entry = {'expires_at': forecast_cache_expiry(), 'data': data}
+
+    with _forecast_cache_lock:
+        for stale_key in [k for k, v in _forecast_cache.items() if v['expires_at'] <= time.time()]:
+            del _forecast_cache[stale_key]
+        _forecast_cache[key] = entry
+        forecast_cache_stats['stores'] += 1
+
+    if FORECAST_CACHE_BACKEND != 'memory':
+        try:
+            store_persistent_forecast(key, entry)
+        except Exception as e:
+            print(f"Forecast cache write failed ({FORECAST_CACHE_BACKEND}): {str(e)}")
+            _count('errors')
+
+def _forecast_cache_s3_key(key):
+    return f"forecast-cache/{key}.json"
+
+def load_persistent_forecast(key):
+    """Read a shared cache entry from the configured persistent backend"""
+    if FORECAST_CACHE_BACKEND == 's3':
+        try:
+            obj = get_s3_client().get_object(Bucket=FORECAST_CACHE_BUCKET, Key=_forecast_cache_s3_key(key))
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(obj['Body'].read().decode('utf-8'))
+
+    if FORECAST_CACHE_BACKEND == 'postgres':
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            ensure_forecast_cache_table(cursor)
+            conn.commit()
+            cursor.execute(
+                "SELECT expires_at, payload FROM forecast_cache WHERE cache_key = %s",
+                (key,)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+        return {'expires_at': row[0], 'data': json.loads(row[1])} if row else None
+
+    raise ValueError(f"Unknown FORECAST_CACHE_BACKEND: {FORECAST_CACHE_BACKEND}")
+
+def store_persistent_forecast(key, entry):
+    """Write a cache entry to the configured persistent backend"""
+    if FORECAST_CACHE_BACKEND == 's3':
+        get_s3_client().put_object(
+            Bucket=FORECAST_CACHE_BUCKET,
+            Key=_forecast_cache_s3_key(key),
+            Body=json.dumps(entry),
+            ContentType='application/json'
+        )
+        return
+
+    if FORECAST_CACHE_BACKEND == 'postgres':
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            ensure_forecast_cache_table(cursor)
+            cursor.execute("""
+                INSERT INTO forecast_cache (cache_key, expires_at, payload)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE
+                SET expires_at = EXCLUDED.expires_at, payload = EXCLUDED.payload
+            """, (key, entry['expires_at'], json.dumps(entry['data'])))
+            conn.commit()
+            cursor.close()
+        return
+
+    raise ValueError(f"Unknown FORECAST_CACHE_BACKEND: {FORECAST_CACHE_BACKEND}")
+
+def ensure_forecast_cache_table(cursor):
+    global _forecast_cache_table_ready
+
+    if _forecast_cache_table_ready:
+        return
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_cache (
+            cache_key VARCHAR(100) PRIMARY KEY,
+            expires_at DOUBLE PRECISION NOT NULL,
+            payload TEXT NOT NULL
+        )
+    """)
+    _forecast_cache_table_ready = True
+
 def normalize_city_name(city):
     """Normalize city names to handle encoding issues"""
     if not city:
@@ -31,80 +215,194 @@ def normalize_city_name(city):
     
     return city
 
+FALLBACK_COORDINATES = {
+    'Tokyo': (35.6762, 139.6503),
+    'Mumbai': (19.0760, 72.8777),
+    'London': (51.5074, -0.1278),
+    'Sydney': (-33.8688, 151.2093),
+    'New York': (40.7128, -74.0060),
+    'Paris': (48.8566, 2.3522),
+    'Dubai': (25.2048, 55.2708),
+    'Singapore': (1.3521, 103.8198),
+    'Toronto': (43.6532, -79.3832),
+    'São Paulo': (-23.5505, -46.6333),
+    'Sao Paulo': (-23.5505, -46.6333)
+}
+
+# Coordinates keyed by normalize_city_key, loaded once per warm container and
+# fully reloaded after COORDINATE_INDEX_TTL seconds. Cities missing from the
+# index get one single-row lookup; misses are remembered for
+# COORDINATE_MISS_TTL seconds so unknown names don't hit the DB every request.
+COORDINATE_INDEX_TTL = float(os.environ.get('COORDINATE_INDEX_TTL', '3600'))
+COORDINATE_MISS_TTL = float(os.environ.get('COORDINATE_MISS_TTL', '300'))
+
+_coordinate_index = {}
+_coordinate_index_loaded_at = None
+_coordinate_misses = {}
+_coordinate_lock = threading.Lock()
+
+def load_coordinate_index():
+    """(Re)build the coordinate index from latest_weather plus the fallback table"""
+    global _coordinate_index, _coordinate_index_loaded_at
+
+    index = {normalize_city_key(city): coords for city, coords in FALLBACK_COORDINATES.items()}
+
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT city_key, latitude, longitude
+                FROM latest_weather
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            """)
+            for city_key, lat, lon in cursor.fetchall():
+                index[city_key] = (lat, lon)
+            cursor.close()
+    except Exception as e:
+        print(f"Could not load coordinates from DB, using fallback only: {str(e)}")
+
+    with _coordinate_lock:
+        _coordinate_index = index
+        _coordinate_index_loaded_at = time.monotonic()
+        _coordinate_misses.clear()
+
+    if instrumentation.log_enabled('INFO'):
+        print(f"Loaded coordinate index with {len(index)} cities")
+
+def lookup_cities_coordinates(city_keys):
+    """One primary key lookup for every city the index hasn't seen yet"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT city_key, latitude, longitude
+            FROM latest_weather
+            WHERE city_key = ANY(%s) AND latitude IS NOT NULL AND longitude IS NOT NULL
+        """, (list(city_keys),))
+        found = {city_key: (lat, lon) for city_key, lat, lon in cursor.fetchall()}
+        cursor.close()
+        return found
+
+@instrumentation.timed('get_city_coordinates')
+def get_cities_coordinates(city_names):
+    """Coordinates for several cities in one pass over the index, with one DB query for the misses"""
+    if (_coordinate_index_loaded_at is None
+            or time.monotonic() - _coordinate_index_loaded_at > COORDINATE_INDEX_TTL):
+        load_coordinate_index()
+
+    coordinates = {}
+    missing = {}
+    for city_name in city_names:
+        city_key = normalize_city_key(normalize_city_name(city_name))
+        coords = _coordinate_index.get(city_key)
+        if coords:
+            coordinates[city_name] = coords
+            continue
+
+        with _coordinate_lock:
+            missed_at = _coordinate_misses.get(city_key)
+        if missed_at is not None and time.monotonic() - missed_at < COORDINATE_MISS_TTL:
+            continue
+        missing.setdefault(city_key, []).append(city_name)
+
+    if not missing:
+        return coordinates
+
+    try:
+        found = lookup_cities_coordinates(missing)
+    except Exception as e:
+        print(f"Coordinate lookup failed for {', '.join(missing)}: {str(e)}")
+        found = {}
+
+    with _coordinate_lock:
+        for city_key in missing:
+            if city_key in found:
+                _coordinate_index[city_key] = found[city_key]
+            else:
+                _coordinate_misses[city_key] = time.monotonic()
+
+    for city_key, names in missing.items():
+        if city_key in found:
+            if instrumentation.log_enabled('DEBUG'):
+                print(f"Found coordinates in DB for {city_key}: {found[city_key]}")
+            for city_name in names:
+                coordinates[city_name] = found[city_key]
+        else:
+            if instrumentation.log_enabled('DEBUG'):
+                print(f"No coordinates found for {city_key}")
+
+    return coordinates
+
 def get_city_coordinates(city_name):
-    """Get coordinates for a city from database with fallback"""
-    
-    FALLBACK_COORDINATES = {
-        'Tokyo': (35.6762, 139.6503),
-        'Mumbai': (19.0760, 72.8777),
-        'London': (51.5074, -0.1278),
-        'Sydney': (-33.8688, 151.2093),
-        'New York': (40.7128, -74.0060),
-        'Paris': (48.8566, 2.3522),
-        'Dubai': (25.2048, 55.2708),
-        'Singapore': (1.3521, 103.8198),
-        'Toronto': (43.6532, -79.3832),
-        'São Paulo': (-23.5505, -46.6333),
-        'Sao Paulo': (-23.5505, -46.6333)
+    """Get coordinates for a city from the in-memory index with incremental DB refresh"""
+    return get_cities_coordinates([city_name]).get(city_name, (None, None))
+
+class ForecastError(Exception):
+    """Upstream forecast failure with a message that is safe to return to clients"""
+
+def describe_forecast_error(e):
+    """Client-facing message for a failed upstream forecast"""
+    if isinstance(e, ForecastError):
+        return str(e)
+    if isinstance(e, RateLimitExceeded):
+        return 'Forecast rate limit reached - try again shortly'
+    if isinstance(e, urllib3.exceptions.TimeoutError):
+        return 'Request timeout - API did not respond in time'
+    if isinstance(e, urllib3.exceptions.HTTPError):
+        return f'HTTP error: {str(e)}'
+    if isinstance(e, json.JSONDecodeError):
+        return f'Failed to parse API response: {str(e)}'
+    return f'Error: {str(e)}'
+
+def get_forecast_data(lat, lon, units, budget):
+    """Raw upstream forecast for a location, from the cache when possible"""
+    cache_key = forecast_cache_key(lat, lon, units)
+    data = get_cached_forecast(cache_key)
+    if data is not None:
+        return data
+
+    params = {
+        'lat': str(lat),
+        'lon': str(lon),
+        'appid': OPENWEATHER_API_KEY,
+        'units': units,
+        'cnt': '40'
     }
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    city_normalized = normalize_city_name(city_name)
-    
-    query = """
-        SELECT DISTINCT latitude, longitude
-        FROM weather_readings
-        WHERE city = %s AND latitude IS NOT NULL AND longitude IS NOT NULL
-        LIMIT 1
-    """
-    
-    cursor.execute(query, (city_normalized,))
-    result = cursor.fetchone()
-    
-    if not result and 'paulo' in city_normalized.lower():
-        query = """
-            SELECT DISTINCT latitude, longitude
-            FROM weather_readings
-            WHERE city LIKE %s AND latitude IS NOT NULL AND longitude IS NOT NULL
-            LIMIT 1
-        """
-        cursor.execute(query, ('%Paulo%',))
-        result = cursor.fetchone()
-    
-    if not result:
-        query = """
-            SELECT DISTINCT latitude, longitude
-            FROM weather_readings
-            WHERE LOWER(city) = LOWER(%s) AND latitude IS NOT NULL AND longitude IS NOT NULL
-            LIMIT 1
-        """
-        cursor.execute(query, (city_normalized,))
-        result = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
-    
-    if result:
-        print(f"Found coordinates in DB for {city_normalized}: {result}")
-        return result
-    
-    if city_normalized in FALLBACK_COORDINATES:
-        coords = FALLBACK_COORDINATES[city_normalized]
-        print(f"Using fallback coordinates for {city_normalized}: {coords}")
-        return coords
-    
-    for known_city, coords in FALLBACK_COORDINATES.items():
-        if known_city.lower() == city_normalized.lower():
-            print(f"Using fallback coordinates for {city_normalized} (matched {known_city}): {coords}")
-            return coords
-    
-    print(f"No coordinates found for {city_normalized}")
-    return (None, None)
 
-def fetch_weather_forecast(city_name):
-    """Fetch 5-day weather forecast from OpenWeatherMap API"""
+    url = f"{OPENWEATHER_FORECAST_URL}?{urlencode(params)}"
+
+    with instrumentation.span('forecast_upstream'):
+        response = request_with_retries(
+            http, 'GET', url,
+            bucket=openweather_bucket,
+            budget=budget,
+            max_attempts=RETRY_MAX_ATTEMPTS,
+            max_retry_after=5.0,
+            max_wait=5.0,
+            timeout=10.0
+        )
+
+    if response.status == 401:
+        raise ForecastError('Invalid API key - check your OpenWeatherMap API key')
+
+    if response.status != 200:
+        raise ForecastError(f'API request failed with status {response.status}')
+
+    data = json.loads(response.data.decode('utf-8'))
+    put_cached_forecast(cache_key, data)
+    return data
+
+def forecast_options(params):
+    """fetch_weather_forecast(s) options from query parameters: ?days=local and ?stats=extended"""
+    params = params or {}
+    return {'local_days': params.get('days') == 'local', 'extended': params.get('stats') == 'extended'}
+
+def fetch_weather_forecast(city_name, local_days=False, extended=False):
+    """Fetch 5-day weather forecast from OpenWeatherMap API
+
+    Daily summaries use UTC dates unless local_days is set, in which case days
+    follow the city's own midnight. extended adds temperature percentiles and
+    dew point to each day.
+    """
     try:
         if not OPENWEATHER_API_KEY:
             return {'error': 'OpenWeatherMap API key not configured'}
@@ -114,83 +412,137 @@ def fetch_weather_forecast(city_name):
         if not lat or not lon:
             return {'error': f'City coordinates not found for: {city_name}'}
         
-        params = {
-            'lat': str(lat),
-            'lon': str(lon),
-            'appid': OPENWEATHER_API_KEY,
-            'units': 'imperial',
-            'cnt': '40'
-        }
-        
-        url = f"{OPENWEATHER_FORECAST_URL}?{urlencode(params)}"
-        
-        response = http.request('GET', url, timeout=10.0)
-        
-        if response.status == 401:
-            return {'error': 'Invalid API key - check your OpenWeatherMap API key'}
-        
-        if response.status != 200:
-            return {'error': f'API request failed with status {response.status}'}
-        
-        data = json.loads(response.data.decode('utf-8'))
-        
-        forecast_list = []
-        for item in data.get('list', []):
-            forecast_list.append({
-                'timestamp': item['dt_txt'],
-                'temperature': item['main']['temp'],
-                'feels_like': item['main']['feels_like'],
-                'temp_min': item['main']['temp_min'],
-                'temp_max': item['main']['temp_max'],
-                'humidity': item['main']['humidity'],
-                'pressure': item['main']['pressure'],
-                'condition': item['weather'][0]['description'],
-                'wind_speed': item['wind']['speed'],
-                'pop': item.get('pop', 0) * 100
-            })
-        
-        daily_forecast = {}
-        for item in forecast_list:
-            date = item['timestamp'].split()[0]
-            if date not in daily_forecast:
-                daily_forecast[date] = []
-            daily_forecast[date].append(item)
-        
-        daily_summary = []
-        for date, items in sorted(daily_forecast.items()):
-            temps = [i['temperature'] for i in items]
-            daily_summary.append({
-                'date': date,
-                'temp_min': min(temps),
-                'temp_max': max(temps),
-                'temp_avg': sum(temps) / len(temps),
-                'condition': items[len(items)//2]['condition'],
-                'humidity_avg': sum(i['humidity'] for i in items) / len(items),
-                'wind_speed_avg': sum(i['wind_speed'] for i in items) / len(items),
-                'pop_max': max(i['pop'] for i in items)
-            })
+        units = 'imperial'
+        data = get_forecast_data(lat, lon, units, RetryBudget(RETRY_BUDGET))
         
         return {
             'city': city_name,
-            'hourly': forecast_list[:24],
-            'daily': daily_summary[:5]
+            'hourly': hourly_forecast(data, 24),
+            'daily': daily_summary(data, days=5, local_days=local_days, units=units, extended=extended)
         }
         
-    except urllib3.exceptions.HTTPError as e:
-        return {'error': f'HTTP error: {str(e)}'}
-    except urllib3.exceptions.TimeoutError:
-        return {'error': 'Request timeout - API did not respond in time'}
-    except json.JSONDecodeError as e:
-        return {'error': f'Failed to parse API response: {str(e)}'}
+    except (ForecastError, RateLimitExceeded, urllib3.exceptions.HTTPError, json.JSONDecodeError) as e:
+        return {'error': describe_forecast_error(e)}
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         return {'error': f'Error: {str(e)}', 'trace': error_trace}
 
+def fetch_weather_forecasts(city_names, local_days=False, extended=False):
+    """Forecasts for several cities: one coordinate pass, concurrent upstream fetches, one aggregation pass.
+
+    Cities that fail are reported under 'errors' without failing the rest.
+    """
+    if not OPENWEATHER_API_KEY:
+        return {'error': 'OpenWeatherMap API key not configured'}
+
+    units = 'imperial'
+    coordinates = get_cities_coordinates(city_names)
+    forecasts = {}
+    errors = {}
+
+    # Cities that resolve to the same location share one upstream request
+    locations = {}
+    for city_name in city_names:
+        lat, lon = coordinates.get(city_name, (None, None))
+        if not lat or not lon:
+            errors[city_name] = f'City coordinates not found for: {city_name}'
+            continue
+        locations.setdefault(forecast_cache_key(lat, lon, units), (lat, lon, []))[2].append(city_name)
+
+    payloads = {}
+    if locations:
+        budget = RetryBudget(RETRY_BUDGET)
+        with ThreadPoolExecutor(max_workers=min(FORECAST_MAX_WORKERS, len(locations))) as executor:
+            futures = {
+                key: executor.submit(get_forecast_data, lat, lon, units, budget)
+                for key, (lat, lon, _) in locations.items()
+            }
+        for key, future in futures.items():
+            try:
+                payloads[key] = future.result()
+            except Exception as e:
+                for city_name in locations[key][2]:
+                    errors[city_name] = describe_forecast_error(e)
+
+    keys = list(payloads)
+    summaries = daily_summaries([payloads[key] for key in keys], days=5, local_days=local_days, units=units,
+                                extended=extended)
+    for key, daily in zip(keys, summaries):
+        hourly = hourly_forecast(payloads[key], 24)
+        for city_name in locations[key][2]:
+            forecasts[city_name] = {'city': city_name, 'hourly': hourly, 'daily': daily}
+
+    return {
+        'forecasts': {city_name: forecasts[city_name] for city_name in city_names if city_name in forecasts},
+        'errors': errors
+    }
+
+def get_requested_cities(event):
+    """City list for a batch request, or None.
+
+    Cities come from ?cities=a,b or a JSON body whose "cities" is a list of
+    names or the same comma-separated string; raises ValueError when the
+    body's "cities" is anything else.
+    """
+    cities = (event.get('queryStringParameters') or {}).get('cities')
+    if not cities and event.get('body'):
+        try:
+            body = json.loads(event['body'])
+        except ValueError:
+            body = None
+        cities = body.get('cities') if isinstance(body, dict) else None
+
+    if not cities:
+        return None
+
+    if isinstance(cities, str):
+        cities = cities.split(',')
+    elif not isinstance(cities, list) or not all(isinstance(city, str) for city in cities):
+        raise ValueError('cities must be a list of city names or a comma-separated string')
+
+    names = [normalize_city_name(city.strip()) for city in cities if city.strip()]
+    return list(dict.fromkeys(names))
+
+def batch_forecast_response(cities, event):
+    """API Gateway response for a multi-city request; per-city errors still return 200"""
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    if len(cities) > FORECAST_BATCH_MAX_CITIES:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'At most {FORECAST_BATCH_MAX_CITIES} cities per request'})
+        }
+
+    if instrumentation.log_enabled('INFO'):
+        print(f"Processing batch forecast request for {len(cities)} cities")
+    forecast_data = fetch_weather_forecasts(cities, **forecast_options(event.get('queryStringParameters')))
+
+    if 'error' in forecast_data:
+        print(f"Error in batch forecast: {forecast_data['error']}")
+        return {'statusCode': 500, 'headers': headers, 'body': json.dumps(forecast_data)}
+
+    if instrumentation.log_enabled('INFO'):
+        print(f"Fetched {len(forecast_data['forecasts'])}/{len(cities)} forecasts "
+              f"(cache stats: {forecast_cache_stats})")
+    return {'statusCode': 200, 'headers': headers, 'body': json.dumps(forecast_data)}
+
 def lambda_handler(event, context):
     """Lambda handler for forecast requests"""
-    
-    print(f"Event received: {json.dumps(event)}")
+    try:
+        with instrumentation.span('invocation'):
+            return handle_forecast_request(event)
+    finally:
+        instrumentation.metrics.flush_emf('weather-forecast-api')
+
+def handle_forecast_request(event):
+    # The full API Gateway event is large; only serialize it when someone asked for it
+    if instrumentation.log_enabled('DEBUG'):
+        print(f"Event received: {json.dumps(event)}")
     
     if event.get('httpMethod') == 'OPTIONS':
         return {
@@ -203,21 +555,38 @@ def lambda_handler(event, context):
             'body': ''
         }
     
+    try:
+        cities = get_requested_cities(event)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)})
+        }
+    if cities:
+        return batch_forecast_response(cities, event)
+    
     city = None
     
     if event.get('pathParameters'):
         city = event['pathParameters'].get('city')
-        print(f"City from path parameters: {city}")
+        if instrumentation.log_enabled('DEBUG'):
+            print(f"City from path parameters: {city}")
     
     if not city and event.get('queryStringParameters'):
         city = event['queryStringParameters'].get('city')
-        print(f"City from query parameters: {city}")
+        if instrumentation.log_enabled('DEBUG'):
+            print(f"City from query parameters: {city}")
     
     if not city and event.get('body'):
         try:
             body = json.loads(event['body'])
             city = body.get('city')
-            print(f"City from body: {city}")
+            if instrumentation.log_enabled('DEBUG'):
+                print(f"City from body: {city}")
         except:
             pass
     
@@ -235,12 +604,14 @@ def lambda_handler(event, context):
             })
         }
     
-    print(f"Processing forecast request for city: {city}")
+    if instrumentation.log_enabled('INFO'):
+        print(f"Processing forecast request for city: {city}")
     
     city = normalize_city_name(city)
-    print(f"Normalized city name: {city}")
+    if instrumentation.log_enabled('DEBUG'):
+        print(f"Normalized city name: {city}")
     
-    forecast_data = fetch_weather_forecast(city)
+    forecast_data = fetch_weather_forecast(city, **forecast_options(event.get('queryStringParameters')))
     
     if 'error' in forecast_data:
         print(f"Error in forecast: {forecast_data['error']}")
@@ -253,7 +624,8 @@ def lambda_handler(event, context):
             'body': json.dumps(forecast_data)
         }
     
-    print(f"Successfully fetched forecast for {city}")
+    if instrumentation.log_enabled('INFO'):
+        print(f"Successfully fetched forecast for {city} (cache stats: {forecast_cache_stats})")
     
     return {
         'statusCode': 200,
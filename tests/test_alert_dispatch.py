@@ -0,0 +1,73 @@
+"""AlertDispatcher episode handling, with alert_notifications held in memory."""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'lambda-functions'))
+
+from alert_dispatch import AlertDispatcher, LocalPublisher  # noqa: E402
+
+HOUR = timedelta(hours=1)
+START = datetime(2026, 1, 1)
+
+
+class FakeConnection:
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def make_dispatcher(**settings):
+    """Dispatcher whose notification records live in its `records` dict instead of Postgres"""
+    dispatcher = AlertDispatcher(LocalPublisher(), [{'topic': 'alerts', 'types': None, 'cities': None}], **settings)
+    dispatcher.records = {}
+    dispatcher._load = lambda cursor, city_keys: {
+        key: dict(record) for key, record in dispatcher.records.items() if key[0] in city_keys}
+    dispatcher._save = lambda cursor, updates: dispatcher.records.update(updates)
+    return dispatcher
+
+
+def heat_alert():
+    return {'type': 'heat', 'city': 'Phoenix', 'city_key': 'phoenix', 'value': 112.0,
+            'icon': '🔥', 'title': 'Heat Alert', 'unit': '°F', 'message': 'Heat Alert in Phoenix'}
+
+
+def run(dispatcher, firing, at):
+    return dispatcher.dispatch(FakeConnection(), [heat_alert()] if firing else [], {'phoenix'}, now=START + at)
+
+
+def test_refire_inside_cooldown_is_notified_once_cooldown_passes():
+    dispatcher = make_dispatcher(cooldown=6 * 3600, clear_after=3600)
+
+    assert run(dispatcher, True, 0 * HOUR)['notified'] == 1
+    # Stops firing long enough to clear, then fires again inside the cooldown
+    run(dispatcher, False, 2 * HOUR)
+    assert run(dispatcher, True, 3 * HOUR)['notified'] == 0
+    assert run(dispatcher, True, 5 * HOUR)['notified'] == 0
+    # Still firing once the cooldown since the first notification has passed
+    assert run(dispatcher, True, 7 * HOUR)['notified'] == 1
+    assert run(dispatcher, True, 8 * HOUR)['notified'] == 0
+    assert len(dispatcher.publisher.batches) == 2
+
+
+def test_active_episode_is_not_renotified_after_cooldown():
+    dispatcher = make_dispatcher(cooldown=6 * 3600, clear_after=3600)
+
+    assert run(dispatcher, True, 0 * HOUR)['notified'] == 1
+    for hour in range(1, 13):
+        assert run(dispatcher, True, hour * HOUR)['notified'] == 0
+
+
+def test_active_episode_is_reminded_every_remind_after():
+    dispatcher = make_dispatcher(cooldown=6 * 3600, clear_after=3600, remind_after=4 * 3600)
+
+    notified = [run(dispatcher, True, hour * HOUR)['notified'] for hour in range(0, 9)]
+    assert notified == [1, 0, 0, 0, 1, 0, 0, 0, 1]
@@ -0,0 +1,60 @@
+"""UpdateBroadcaster watcher lifecycle, polling a fake cache instead of Postgres."""
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'flask-app'))
+
+from live_updates import UpdateBroadcaster  # noqa: E402
+
+
+class FakeCache:
+    def __init__(self, readings):
+        self.readings = readings
+
+    def invalidate(self):
+        pass
+
+    def get(self):
+        return SimpleNamespace(value=list(self.readings), etag='etag')
+
+
+def watcher_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'live-updates']
+
+
+def test_watcher_stops_with_last_subscriber_and_restarts_on_next():
+    cache = FakeCache([{'city': 'Phoenix', 'temperature': 100}])
+    broadcaster = UpdateBroadcaster(cache, {}, 'weather_updates', source='poll', poll_interval=0.05)
+    events = []
+
+    broadcaster.subscribe(events.append)
+    first = broadcaster._thread
+    assert first.is_alive() and broadcaster.stats()['watching']
+
+    broadcaster.unsubscribe(events.append)
+    first.join(timeout=2)
+    assert not first.is_alive() and not broadcaster.stats()['watching']
+    assert watcher_threads() == []
+
+    received = threading.Event()
+    broadcaster.subscribe(lambda event: received.set())
+    assert broadcaster._thread is not first and broadcaster._thread.is_alive()
+    cache.readings = [{'city': 'Phoenix', 'temperature': 101}]
+    assert received.wait(timeout=2)
+
+
+def test_dropping_failed_last_subscriber_stops_watcher():
+    cache = FakeCache([{'city': 'Phoenix', 'temperature': 100}])
+    broadcaster = UpdateBroadcaster(cache, {}, 'weather_updates', source='poll', poll_interval=0.05)
+
+    def broken(event):
+        raise RuntimeError('client went away')
+
+    broadcaster.subscribe(broken)
+    watcher = broadcaster._thread
+    cache.readings = [{'city': 'Phoenix', 'temperature': 101}]
+    watcher.join(timeout=2)
+    assert not watcher.is_alive()
+    assert broadcaster.stats()['subscribers'] == 0